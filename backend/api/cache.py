@@ -0,0 +1,73 @@
+import time
+
+from django.core.cache import cache
+
+STATS_KEY = 'stats:{name}'
+# Результаты single-flight: значение из кеша, вычислено запросом,
+# дождались вычисления другого запроса, не дождались и вычислили сами.
+SINGLE_FLIGHT_RESULTS = ('hit', 'computed', 'coalesced', 'fallback')
+SINGLE_FLIGHT_NAMESPACES = ('catalog', 'history_info')
+# Время жизни блокировки вычисления и ожидание результата в секундах.
+SINGLE_FLIGHT_LOCK_TIMEOUT = 10
+SINGLE_FLIGHT_WAIT = 5
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+
+def incr_stat(name):
+    """Увеличивает счетчик статистики в общем кеше."""
+    key = STATS_KEY.format(name=name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_stats(names):
+    """Возвращает значения счетчиков статистики по именам."""
+    values = cache.get_many([STATS_KEY.format(name=name) for name in names])
+    return {name: values.get(STATS_KEY.format(name=name), 0) for name in names}
+
+
+def reset_stats(names):
+    """Обнуляет счетчики статистики."""
+    cache.delete_many([STATS_KEY.format(name=name) for name in names])
+
+
+def single_flight(key, compute, timeout, namespace):
+    """
+    Возвращает значение из кеша или вычисляет его через compute().
+
+    Из одновременных промахов по одному ключу вычисление выполняет
+    только запрос, первым захвативший блокировку в кеше (cache.add),
+    остальные ждут появления значения до SINGLE_FLIGHT_WAIT секунд.
+    Если вычисление завершилось ошибкой или не уложилось в ожидание,
+    ожидающий запрос вычисляет значение сам. Результаты учитываются
+    в счетчиках single_flight:<namespace>:<результат>.
+    """
+    value = cache.get(key)
+    if value is not None:
+        incr_stat(f'single_flight:{namespace}:hit')
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, True, SINGLE_FLIGHT_LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        incr_stat(f'single_flight:{namespace}:computed')
+        return value
+
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        values = cache.get_many([key, lock_key])
+        if key in values:
+            incr_stat(f'single_flight:{namespace}:coalesced')
+            return values[key]
+        if lock_key not in values:
+            break
+    incr_stat(f'single_flight:{namespace}:fallback')
+    return compute()
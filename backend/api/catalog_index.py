@@ -0,0 +1,143 @@
+import threading
+from array import array
+from bisect import bisect_left
+
+from subscriptions.models import get_catalog_version, get_tariffs_version
+
+# Верхняя граница диапазона строк с общим префиксом.
+PREFIX_END = chr(0x10FFFF)
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class CatalogIndex:
+    """
+    Индекс каталога в памяти процесса: сериализованные элементы каталога
+    и колонки для фильтрации и сортировки без SQL.
+
+    Элементы передаются в порядке сортировки по имени в базе, поэтому
+    ранг имени совпадает с сортировкой по правилам сравнения строк базы.
+    Хранит:
+    - ids, popular_rate, popularity_score, name_rank: колонки в массивах
+      array;
+    - categories: слаг категории -> позиции сервисов;
+    - prefix_names, prefix_positions: имена в верхнем регистре,
+      отсортированные для поиска по префиксу, и их позиции.
+    """
+
+    def __init__(self, version, items):
+        self.version = version
+        self.items = tuple(items)
+        self.ids = array('q', (item['id'] for item in self.items))
+        self.popular_rate = array(
+            'q', (item['popular_rate'] for item in self.items)
+        )
+        self.popularity_score = array(
+            'q', (item['popularity_score'] for item in self.items)
+        )
+        # Одинаковые имена получают одинаковый ранг.
+        self.name_rank = array('q')
+        rank = 0
+        for position, item in enumerate(self.items):
+            if position and item['name'] != self.items[position - 1]['name']:
+                rank = position
+            self.name_rank.append(rank)
+
+        categories = {}
+        for position, item in enumerate(self.items):
+            for category in item['categories']:
+                categories.setdefault(category['slug'], array('q')).append(
+                    position
+                )
+        self.categories = categories
+
+        names = sorted(
+            (item['name'].upper(), position)
+            for position, item in enumerate(self.items)
+        )
+        self.prefix_names = [name for name, _ in names]
+        self.prefix_positions = array('q', (position for _, position in names))
+
+    def find_prefix(self, prefix):
+        """Возвращает позиции сервисов, имя которых начинается с prefix."""
+        prefix = prefix.upper()
+        start = bisect_left(self.prefix_names, prefix)
+        end = bisect_left(self.prefix_names, prefix + PREFIX_END, start)
+        return self.prefix_positions[start:end]
+
+    def get_column(self, field):
+        """Возвращает колонку для сортировки по полю field."""
+        if field == 'name':
+            return self.name_rank
+        return getattr(self, field)
+
+    def get_sort_key(self, ordering):
+        """
+        Возвращает функцию ключа сортировки позиций по полям ordering
+        (ordering_fields SubscriptionViewSet, с минусом - по убыванию).
+        Равные значения упорядочиваются по id.
+        """
+        columns = []
+        for field in ordering:
+            column = self.get_column(field.lstrip('-'))
+            columns.append((column, -1 if field.startswith('-') else 1))
+        ids = self.ids
+
+        def sort_key(position):
+            return tuple(
+                sign * column[position] for column, sign in columns
+            ) + (ids[position],)
+
+        return sort_key
+
+    def query(
+        self,
+        ordering,
+        name=None,
+        category=None,
+        favorite_ids=None,
+        is_favorite=None,
+    ):
+        """
+        Возвращает элементы каталога с фильтрами SubscriptionFilter
+        (префикс имени без учета регистра, слаг категории, избранное)
+        в порядке ordering.
+        """
+        if category:
+            positions = self.categories.get(category, ())
+        else:
+            positions = range(len(self.items))
+        if name:
+            matches = set(self.find_prefix(name))
+            positions = [
+                position for position in positions if position in matches
+            ]
+        if is_favorite is not None and favorite_ids is not None:
+            positions = [
+                position
+                for position in positions
+                if (self.ids[position] in favorite_ids) == is_favorite
+            ]
+        return [
+            self.items[position]
+            for position in sorted(positions, key=self.get_sort_key(ordering))
+        ]
+
+
+def get_catalog_index(load_items):
+    """
+    Возвращает индекс каталога текущего процесса. Индекс строится заново
+    функцией load_items, если изменилась версия каталога или тарифов.
+    Версия читается до загрузки элементов, поэтому изменение во время
+    построения приведет к повторному построению при следующем запросе.
+    """
+    global _index
+    version = (get_catalog_version(), get_tariffs_version())
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = CatalogIndex(version, load_items())
+        return _index
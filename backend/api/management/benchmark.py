@@ -0,0 +1,147 @@
+import json
+import os
+import statistics
+import subprocess
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+from subscriptions.models import CategorySubscription, Subscription, Tariff
+from subscriptions.services import bulk_create_with_ids
+
+BATCH_SIZE = 1000
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Создает временную тестовую базу для бенчмарка и удаляет ее по выходу.
+
+    Задачи Celery публикуются в брокер в памяти процесса, поэтому
+    бенчмарку не нужен Redis. Celery отдает приоритет этим переменным
+    окружения над настройками Django. Кеш на время бенчмарка хранится
+    в памяти процесса.
+    """
+    os.environ['CELERY_BROKER_URL'] = 'memory://'
+    os.environ['CELERY_RESULT_BACKEND'] = 'cache+memory://'
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True
+    )
+    try:
+        with override_settings(CACHES=LOCMEM_CACHES):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def seed_catalog(rnd, count):
+    """
+    Создает каталог из count сервисов с категориями и четырьмя тарифами.
+
+    Возвращает:
+    - tuple: Список сервисов и словарь тарифов по id сервиса.
+    """
+    categories = bulk_create_with_ids(
+        CategorySubscription,
+        [
+            CategorySubscription(name=f'Категория {i}', slug=f'cat-{i}')
+            for i in range(10)
+        ],
+        BATCH_SIZE,
+    )
+    subscriptions = bulk_create_with_ids(
+        Subscription,
+        [
+            Subscription(
+                name=f'Сервис {i}',
+                title='Подписка',
+                description='Описание сервиса',
+                logo='logo.png',
+                cashback=rnd.randint(1, 20),
+                popular_rate=rnd.randint(0, 100),
+            )
+            for i in range(count)
+        ],
+        BATCH_SIZE,
+    )
+    through = Subscription.categories.through
+    through.objects.bulk_create(
+        [
+            through(
+                subscription_id=subscription.id,
+                categorysubscription_id=category.id,
+            )
+            for subscription in subscriptions
+            for category in rnd.sample(categories, 2)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    tariffs = []
+    for subscription in subscriptions:
+        for period in (1, 3, 6, 12):
+            tariff = Tariff(
+                subscription=subscription,
+                period=period,
+                price=rnd.randint(10, 100) * 10,
+                discount=rnd.choice((0, 5, 10, 20)),
+            )
+            tariff.fill_derived_fields()
+            tariffs.append(tariff)
+    subscription_tariffs = defaultdict(list)
+    for tariff in bulk_create_with_ids(Tariff, tariffs, BATCH_SIZE):
+        subscription_tariffs[tariff.subscription_id].append(tariff)
+    return subscriptions, subscription_tariffs
+
+
+def latency_stats(durations):
+    """Возвращает перцентили p50/p95/p99 в миллисекундах."""
+    cuts = statistics.quantiles(durations, n=100)
+    return {
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p95_ms': round(cuts[94] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+    }
+
+
+def get_commit():
+    """Возвращает текущий коммит git или None вне репозитория."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(path, params, results):
+    """Сохраняет результаты бенчмарка в JSON вместе с коммитом."""
+    report = {
+        'commit': get_commit(),
+        'created_at': timezone.now().isoformat(),
+        'params': params,
+        'vendor': connection.vendor,
+        'results': results,
+    }
+    Path(path).write_text(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def read_results(path):
+    """Читает результаты предыдущего запуска для сравнения."""
+    if not path:
+        return {}
+    return json.loads(Path(path).read_text())['results']
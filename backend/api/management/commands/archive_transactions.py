@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from subscriptions.models import Transaction, TransactionArchive
+
+from api.v1.services import get_archive_boundary
+
+ARCHIVE_FIELDS = (
+    'id',
+    'user_id',
+    'order_id',
+    'transaction_type',
+    'transaction_date',
+    'amount',
+    'status',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит завершенные транзакции закрытых месяцев '
+        'из основной таблицы в архив.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество транзакций, переносимых за одну операцию.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только подсчитать транзакции для переноса.',
+        )
+
+    def handle(self, *args, **options):
+        boundary = get_archive_boundary()
+        closed = Transaction.objects.filter(
+            transaction_date__lt=boundary
+        ).exclude(status='PENDING')
+
+        if options['dry_run']:
+            self.stdout.write(
+                f'Транзакций до {boundary:%Y-%m-%d} для переноса в архив: '
+                f'{closed.count()}'
+            )
+            return
+
+        batch_size = options['batch_size']
+        moved = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    closed.select_for_update()
+                    .order_by('id')
+                    .values(*ARCHIVE_FIELDS)[:batch_size]
+                )
+                if not rows:
+                    break
+                TransactionArchive.objects.bulk_create(
+                    [TransactionArchive(**row) for row in rows],
+                    ignore_conflicts=True,
+                )
+                Transaction.objects.filter(
+                    id__in=[row['id'] for row in rows]
+                ).delete()
+            moved += len(rows)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Перенесено в архив транзакций до {boundary:%Y-%m-%d}: '
+                f'{moved}'
+            )
+        )
@@ -0,0 +1,345 @@
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from subscriptions.models import SubscriptionUserOrder, Transaction
+from subscriptions.services import bulk_create_with_ids
+
+from api.management.benchmark import (
+    benchmark_database,
+    latency_stats,
+    read_results,
+    seed_catalog,
+    write_report,
+)
+from api.v1.tasks import cancel_subscription_order
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+# Доли сценариев в трафике, близкие к поведению мобильного клиента.
+TRAFFIC_MIX = {
+    'catalog': 30,
+    'retrieve': 10,
+    'tariffs': 10,
+    'my': 10,
+    'history': 15,
+    'history_info': 10,
+    'order': 5,
+    'cancel': 5,
+    'resume': 5,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный бенчмарк API на отдельной тестовой базе: заполняет '
+        'синтетические данные, воспроизводит смесь запросов и сохраняет '
+        'req/s, перцентили времени ответа и число SQL-запросов в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--subscriptions', type=int, default=50)
+        parser.add_argument(
+            '--transactions',
+            type=int,
+            default=30,
+            help='Количество транзакций на пользователя.',
+        )
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            default='benchmark.json',
+            help='Файл для сохранения результатов.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Файл с предыдущими результатами для сравнения.',
+        )
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            rnd = random.Random(options['seed'])
+            self.seed(rnd, options)
+            results = self.replay(rnd, options['requests'])
+
+        write_report(
+            options['output'],
+            {
+                name: options[name]
+                for name in (
+                    'users',
+                    'subscriptions',
+                    'transactions',
+                    'requests',
+                    'seed',
+                )
+            },
+            results,
+        )
+        self.print_report(results, options['compare'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Результаты сохранены в {options["output"]}')
+        )
+
+    def seed(self, rnd, options):
+        """Заполняет тестовую базу синтетическими данными."""
+        now = timezone.now()
+        subscriptions, self.tariffs = seed_catalog(
+            rnd, options['subscriptions']
+        )
+
+        self.users = bulk_create_with_ids(
+            User,
+            [
+                User(username=f'bench{i}', balance=10**9)
+                for i in range(options['users'])
+            ],
+            BATCH_SIZE,
+        )
+        orders = []
+        for user in self.users:
+            for subscription in rnd.sample(subscriptions, 3):
+                tariff = rnd.choice(self.tariffs[subscription.id])
+                orders.append(
+                    SubscriptionUserOrder(
+                        user=user,
+                        subscription=subscription,
+                        tariff=tariff,
+                        name=user.username,
+                        phone_number='+79990000000',
+                        email='bench@example.com',
+                        due_date=now + relativedelta(months=tariff.period),
+                        pay_status=rnd.random() < 0.8,
+                    )
+                )
+        orders = bulk_create_with_ids(
+            SubscriptionUserOrder, orders, BATCH_SIZE
+        )
+        user_orders = defaultdict(list)
+        for order in orders:
+            user_orders[order.user_id].append(order)
+
+        transactions = []
+        for user in self.users:
+            for i in range(options['transactions']):
+                order = rnd.choice(user_orders[user.id])
+                transactions.append(
+                    Transaction(
+                        user=user,
+                        order=order,
+                        amount=order.tariff.price_per_period,
+                        transaction_type=rnd.choice(('DEBIT', 'CASHBACK')),
+                        transaction_date=now - relativedelta(days=i * 10),
+                        status='PAID',
+                    )
+                )
+            for order in user_orders[user.id]:
+                if order.pay_status:
+                    transactions.append(
+                        Transaction(
+                            user=user,
+                            order=order,
+                            amount=order.tariff.price_per_period,
+                            transaction_type='DEBIT',
+                            transaction_date=order.due_date,
+                            status='PENDING',
+                        )
+                    )
+        Transaction.objects.bulk_create(transactions, batch_size=BATCH_SIZE)
+
+        self.subscriptions = subscriptions
+        self.paid = [order for order in orders if order.pay_status]
+        self.unpaid = [order for order in orders if not order.pay_status]
+        ordered = {(order.user_id, order.subscription_id) for order in orders}
+        self.free = [
+            (user, subscription)
+            for user in self.users
+            for subscription in subscriptions
+            if (user.id, subscription.id) not in ordered
+        ]
+        rnd.shuffle(self.free)
+
+    def replay(self, rnd, requests):
+        """Воспроизводит смесь запросов и собирает метрики по сценариям."""
+        client = APIClient()
+        scenarios = list(TRAFFIC_MIX)
+        weights = list(TRAFFIC_MIX.values())
+        timings = defaultdict(list)
+        queries = defaultdict(list)
+        statuses = defaultdict(lambda: defaultdict(int))
+
+        for _ in range(requests):
+            scenario = rnd.choices(scenarios, weights)[0]
+            request = getattr(self, f'request_{scenario}')(rnd)
+            if request is None:
+                continue
+            user, method, url, data, order = request
+            client.force_authenticate(user)
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = getattr(client, method)(url, data, format='json')
+                elapsed = time.perf_counter() - start
+            timings[scenario].append(elapsed)
+            queries[scenario].append(len(context.captured_queries))
+            statuses[scenario][response.status_code] += 1
+            if response.status_code < 400:
+                self.after_request(scenario, user, url, order)
+
+        results = {}
+        for scenario in scenarios + ['total']:
+            if scenario == 'total':
+                durations = [t for values in timings.values() for t in values]
+                counts = [q for values in queries.values() for q in values]
+                codes = defaultdict(int)
+                for values in statuses.values():
+                    for code, count in values.items():
+                        codes[code] += count
+            else:
+                durations = timings[scenario]
+                counts = queries[scenario]
+                codes = statuses[scenario]
+            if len(durations) < 2:
+                continue
+            results[scenario] = {
+                'requests': len(durations),
+                'rps': round(len(durations) / sum(durations), 1),
+                **latency_stats(durations),
+                'queries_per_request': round(statistics.mean(counts), 1),
+                'statuses': {str(code): n for code, n in codes.items()},
+            }
+        return results
+
+    def request_catalog(self, rnd):
+        return (
+            rnd.choice(self.users),
+            'get',
+            '/api/v1/subscriptions/',
+            {},
+            None,
+        )
+
+    def request_retrieve(self, rnd):
+        subscription = rnd.choice(self.subscriptions)
+        return (
+            rnd.choice(self.users),
+            'get',
+            f'/api/v1/subscriptions/{subscription.id}/',
+            {},
+            None,
+        )
+
+    def request_tariffs(self, rnd):
+        subscription = rnd.choice(self.subscriptions)
+        return (
+            rnd.choice(self.users),
+            'get',
+            f'/api/v1/subscriptions/{subscription.id}/tariffs/',
+            {},
+            None,
+        )
+
+    def request_my(self, rnd):
+        return (
+            rnd.choice(self.users),
+            'get',
+            '/api/v1/subscriptions/my/',
+            {},
+            None,
+        )
+
+    def request_history(self, rnd):
+        return rnd.choice(self.users), 'get', '/api/v1/history/', {}, None
+
+    def request_history_info(self, rnd):
+        return rnd.choice(self.users), 'get', '/api/v1/history/info/', {}, None
+
+    def request_order(self, rnd):
+        if not self.free:
+            return None
+        user, subscription = self.free.pop()
+        tariff = rnd.choice(self.tariffs[subscription.id])
+        return (
+            user,
+            'post',
+            f'/api/v1/subscriptions/{subscription.id}/order/',
+            {
+                'name': user.username,
+                'phone_number': '+79990000000',
+                'email': 'bench@example.com',
+                'tariff': tariff.id,
+            },
+            None,
+        )
+
+    def request_cancel(self, rnd):
+        if not self.paid:
+            return None
+        order = self.paid.pop(rnd.randrange(len(self.paid)))
+        return (
+            order.user,
+            'delete',
+            f'/api/v1/subscriptions/{order.subscription_id}/cancel/',
+            {},
+            order,
+        )
+
+    def request_resume(self, rnd):
+        if not self.unpaid:
+            return None
+        order = self.unpaid.pop(rnd.randrange(len(self.unpaid)))
+        return (
+            order.user,
+            'post',
+            f'/api/v1/subscriptions/{order.subscription_id}/resume_order/',
+            {},
+            order,
+        )
+
+    def after_request(self, scenario, user, url, order):
+        """
+        Возвращает заказы в пулы сценариев. Отмена завершается так же,
+        как это сделала бы отложенная задача cancel_subscription_order.
+        """
+        if scenario == 'order':
+            subscription_id = int(url.split('/')[-3])
+            self.paid.append(
+                SubscriptionUserOrder.objects.get(
+                    user=user, subscription_id=subscription_id
+                )
+            )
+        elif scenario == 'cancel':
+            cancel_subscription_order(order.id)
+            self.unpaid.append(order)
+        elif scenario == 'resume':
+            self.paid.append(order)
+
+    def print_report(self, results, compare):
+        previous = read_results(compare)
+        for scenario, metrics in results.items():
+            line = (
+                f'{scenario:>13}: {metrics["rps"]:>8} req/s  '
+                f'p50 {metrics["p50_ms"]:>7} ms  '
+                f'p95 {metrics["p95_ms"]:>7} ms  '
+                f'p99 {metrics["p99_ms"]:>7} ms  '
+                f'{metrics["queries_per_request"]:>6} SQL/req'
+            )
+            if scenario in previous:
+                before = previous[scenario]
+                line += (
+                    f'  (p95 {before["p95_ms"]} ms, '
+                    f'p99 {before["p99_ms"]} ms, '
+                    f'{before["queries_per_request"]} SQL/req)'
+                )
+            self.stdout.write(line)
@@ -0,0 +1,237 @@
+import io
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from subscriptions.models import SubscriptionUserOrder, Transaction
+
+from api.management.benchmark import (
+    benchmark_database,
+    latency_stats,
+    read_results,
+    seed_catalog,
+    write_report,
+)
+from api.v1.tasks import next_bank_transaction, pay_cashback
+
+# Пути списания, которые сравнивает бенчмарк: название -> метод команды.
+PATHS = {
+    'per_order': 'charge_per_order',
+}
+
+
+class StatementTimer:
+    """
+    Считает SQL-запросы соединения и время запросов, которые берут
+    блокировки строк (UPDATE, DELETE и SELECT ... FOR UPDATE). Время
+    таких запросов включает ожидание чужих блокировок.
+    """
+
+    LOCKING_PREFIXES = ('UPDATE', 'DELETE')
+
+    def __init__(self):
+        self.queries = 0
+        self.lock_seconds = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        statement = sql.lstrip().upper()
+        if not (
+            statement.startswith(self.LOCKING_PREFIXES)
+            or 'FOR UPDATE' in statement
+        ):
+            with self._lock:
+                self.queries += 1
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.queries += 1
+                self.lock_seconds += time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк биллинга на отдельной тестовой базе: выполняет задачи '
+        'списания и выплаты кешбека по синтетическим заказам и сохраняет '
+        'заказы/с, SQL-запросы на списание и время блокировок в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--subscriptions', type=int, default=50)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help=(
+                'Количество потоков, выполняющих списания. На SQLite '
+                'параллельная запись упирается в блокировку базы.'
+            ),
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            choices=tuple(PATHS),
+            help='Путь списания для замера, по умолчанию все.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            default='benchmark_billing.json',
+            help='Файл для сохранения результатов.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Файл с предыдущими результатами для сравнения.',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers должен быть больше нуля.')
+        results = {}
+        # Каждый путь замеряется на свежей базе с теми же данными.
+        for name in options['path'] or PATHS:
+            with benchmark_database():
+                self.seed(options)
+                results[name] = self.measure_charges(
+                    getattr(self, PATHS[name]), options['workers']
+                )
+                results[f'{name}_cashback'] = self.measure_cashback()
+
+        write_report(
+            options['output'],
+            {
+                name: options[name]
+                for name in ('users', 'subscriptions', 'workers', 'seed')
+            },
+            results,
+        )
+        self.print_report(results, options['compare'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Результаты сохранены в {options["output"]}')
+        )
+
+    def seed(self, options):
+        """Заполняет тестовую базу каталогом, заказами и историей."""
+        seed_catalog(random.Random(options['seed']), options['subscriptions'])
+        call_command(
+            'generate_data',
+            users=options['users'],
+            history_months=1,
+            seed=options['seed'],
+            stdout=io.StringIO(),
+        )
+
+    def measure_charges(self, charge, workers):
+        """Выполняет списания по всем оплаченным заказам и замеряет их."""
+        order_ids = list(
+            SubscriptionUserOrder.objects.filter(pay_status=True)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        if not order_ids:
+            raise CommandError('В тестовой базе нет оплаченных заказов.')
+        chunks = [order_ids[i::workers] for i in range(workers)]
+        timer = StatementTimer()
+        durations = []
+
+        def run(ids):
+            with connection.execute_wrapper(timer):
+                try:
+                    durations.extend(charge(ids))
+                finally:
+                    if workers > 1:
+                        connection.close()
+
+        start = time.perf_counter()
+        if workers == 1:
+            run(order_ids)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(run, chunks))
+        elapsed = time.perf_counter() - start
+
+        # При ошибке списания задача снимает заказ с оплаты.
+        failed = SubscriptionUserOrder.objects.filter(
+            id__in=order_ids, pay_status=False
+        ).count()
+        result = {
+            'orders': len(order_ids),
+            'failed': failed,
+            'orders_per_sec': round(len(order_ids) / elapsed, 1),
+            'queries_per_order': round(timer.queries / len(order_ids), 1),
+            'lock_ms_per_order': round(
+                timer.lock_seconds * 1000 / len(order_ids), 3
+            ),
+            'seconds': round(elapsed, 3),
+        }
+        if len(durations) > 1:
+            result.update(latency_stats(durations))
+        return result
+
+    def charge_per_order(self, order_ids):
+        """
+        Текущий путь: отдельная задача next_bank_transaction на каждый
+        заказ. Задача выполняется синхронно, следующее списание
+        публикуется в брокер в памяти.
+
+        Возвращает:
+        - list: Время выполнения каждой задачи в секундах.
+        """
+        durations = []
+        for order_id in order_ids:
+            start = time.perf_counter()
+            next_bank_transaction.apply(args=[order_id])
+            durations.append(time.perf_counter() - start)
+        return durations
+
+    def measure_cashback(self):
+        """Выполняет выплату всего накопленного кешбека и замеряет ее."""
+        pending = Transaction.objects.filter(
+            transaction_type='CASHBACK', status='PENDING'
+        )
+        users = pending.values('user').distinct().count()
+        timer = StatementTimer()
+        with connection.execute_wrapper(timer):
+            start = time.perf_counter()
+            pay_cashback.apply()
+            elapsed = time.perf_counter() - start
+        return {
+            'users': users,
+            'left_pending': pending.count(),
+            'users_per_sec': round(users / elapsed, 1),
+            'queries_per_user': round(timer.queries / max(users, 1), 1),
+            'lock_ms_per_user': round(
+                timer.lock_seconds * 1000 / max(users, 1), 3
+            ),
+            'seconds': round(elapsed, 3),
+        }
+
+    def print_report(self, results, compare):
+        previous = read_results(compare)
+        for name, metrics in results.items():
+            if 'orders' in metrics:
+                line = (
+                    f'{name:>20}: {metrics["orders_per_sec"]:>8} orders/s  '
+                    f'{metrics["queries_per_order"]:>6} SQL/order  '
+                    f'lock {metrics["lock_ms_per_order"]:>7} ms/order  '
+                    f'failed {metrics["failed"]}'
+                )
+                key = 'orders_per_sec'
+            else:
+                line = (
+                    f'{name:>20}: {metrics["users_per_sec"]:>8} users/s  '
+                    f'{metrics["queries_per_user"]:>6} SQL/user  '
+                    f'lock {metrics["lock_ms_per_user"]:>7} ms/user'
+                )
+                key = 'users_per_sec'
+            if name in previous:
+                line += f'  (было {previous[name][key]})'
+            self.stdout.write(line)
@@ -0,0 +1,146 @@
+import gzip
+import io
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.management.benchmark import (
+    benchmark_database,
+    read_results,
+    seed_catalog,
+    write_report,
+)
+from api.middleware import BROTLI_QUALITY, brotli
+from api.renderers import FastJSONRenderer
+from api.v1.views import HistoryViewSet, SubscriptionViewSet
+
+User = get_user_model()
+
+RENDERERS = {
+    'json': JSONRenderer,
+    'orjson': FastJSONRenderer,
+}
+VIEWS = {
+    'subscriptions': (SubscriptionViewSet, '/api/v1/subscriptions/'),
+    'history': (HistoryViewSet, '/api/v1/history/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк ответов SubscriptionViewSet.list и HistoryViewSet.list '
+        'на отдельной тестовой базе: время рендеринга JSON стандартным '
+        'рендерером и orjson и размер ответа без сжатия, с gzip и brotli.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscriptions', type=int, default=200)
+        parser.add_argument(
+            '--history-months',
+            type=int,
+            default=24,
+            help='Глубина истории пользователя в месяцах.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Количество повторов рендеринга каждого ответа.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            default='benchmark_render.json',
+            help='Файл для сохранения результатов.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Файл с предыдущими результатами для сравнения.',
+        )
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self.seed(options)
+            results = {
+                name: self.measure(viewset, url, options['repeat'])
+                for name, (viewset, url) in VIEWS.items()
+            }
+
+        write_report(
+            options['output'],
+            {
+                name: options[name]
+                for name in (
+                    'subscriptions',
+                    'history_months',
+                    'repeat',
+                    'seed',
+                )
+            },
+            results,
+        )
+        self.print_report(results, options['compare'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Результаты сохранены в {options["output"]}')
+        )
+
+    def seed(self, options):
+        """Заполняет тестовую базу каталогом и историей пользователя."""
+        seed_catalog(random.Random(options['seed']), options['subscriptions'])
+        call_command(
+            'generate_data',
+            users=1,
+            favorites=10,
+            history_months=options['history_months'],
+            seed=options['seed'],
+            prefix='render',
+            stdout=io.StringIO(),
+        )
+        self.user = User.objects.get()
+
+    def measure(self, viewset, url, repeat):
+        """Замеряет рендеринг и размер ответа списка."""
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=self.user)
+        data = viewset.as_view({'get': 'list'})(request).data
+
+        result = {'items': len(data)}
+        for name, renderer_class in RENDERERS.items():
+            renderer = renderer_class()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                content = renderer.render(data, 'application/json')
+            result[f'{name}_render_ms'] = round(
+                (time.perf_counter() - start) * 1000 / repeat, 3
+            )
+        result['bytes'] = len(content)
+        result['gzip_bytes'] = len(gzip.compress(content, compresslevel=5))
+        if brotli is not None:
+            result['brotli_bytes'] = len(
+                brotli.compress(content, quality=BROTLI_QUALITY)
+            )
+        return result
+
+    def print_report(self, results, compare):
+        previous = read_results(compare)
+        for name, metrics in results.items():
+            line = (
+                f'{name:>13}: {metrics["items"]:>6} items  '
+                f'json {metrics["json_render_ms"]:>8} ms  '
+                f'orjson {metrics["orjson_render_ms"]:>8} ms  '
+                f'{metrics["bytes"]:>9} B  '
+                f'gzip {metrics["gzip_bytes"]:>8} B  '
+                f'br {metrics.get("brotli_bytes", "-"):>8} B'
+            )
+            if name in previous:
+                before = previous[name]
+                line += (
+                    f'  (orjson {before["orjson_render_ms"]} ms, '
+                    f'gzip {before["gzip_bytes"]} B)'
+                )
+            self.stdout.write(line)
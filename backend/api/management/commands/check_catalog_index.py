@@ -0,0 +1,138 @@
+import itertools
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from subscriptions.models import CategorySubscription, Subscription
+
+from api.v1.views import SubscriptionViewSet
+
+User = get_user_model()
+
+ORDERINGS = (
+    None,
+    'name',
+    '-name',
+    'popular_rate',
+    '-popular_rate',
+    '-popular_rate,name',
+    '-popularity_score',
+    '-popularity_score,-popular_rate',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает список каталога из индекса в памяти процесса с '
+        'запросами через базу на наборе фильтров и сортировок и выводит '
+        'расхождения и среднее время ответа обоих вариантов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Id пользователя для проверки фильтра по избранному.',
+        )
+        parser.add_argument(
+            '--prefixes',
+            type=int,
+            default=20,
+            help='Количество проверяемых префиксов имен.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько расхождений вывести.',
+        )
+
+    def handle(self, *args, **options):
+        self.factory = APIRequestFactory()
+        self.user = None
+        if options['user']:
+            self.user = User.objects.get(id=options['user'])
+
+        mismatches = []
+        timings = {'index': 0.0, 'orm': 0.0}
+        cases = list(self.get_cases(options['prefixes']))
+        for params in cases:
+            index_ids = self.run('index', params, timings)
+            orm_ids = self.run('orm', params, timings)
+            if index_ids != orm_ids:
+                mismatches.append((params, index_ids, orm_ids))
+
+        for name, total in timings.items():
+            self.stdout.write(
+                f'{name:>5}: {total / len(cases) * 1e6:>10.1f} мкс на запрос'
+            )
+        if not mismatches:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Расхождений нет, проверено запросов: {len(cases)}'
+                )
+            )
+            return
+        self.stdout.write(
+            self.style.ERROR(f'Расхождений: {len(mismatches)} из {len(cases)}')
+        )
+        for params, index_ids, orm_ids in mismatches[: options['limit']]:
+            self.stdout.write(
+                f'  {params}: индекс {index_ids[:10]}, база {orm_ids[:10]}'
+            )
+
+    def get_cases(self, prefix_count):
+        """Возвращает наборы параметров запроса для проверки."""
+        # Префиксы в нижнем регистре: фильтр дополнительно ищет их с
+        # заглавной буквы, поэтому результат не зависит от того, умеет ли
+        # база сравнивать без учета регистра не-ASCII символы.
+        names = Subscription.objects.values_list('name', flat=True)
+        prefixes = sorted(
+            {name[:length].lower() for name in names for length in (1, 2)}
+            - {''}
+        )[:prefix_count]
+        categories = [None] + list(
+            CategorySubscription.objects.values_list('slug', flat=True)
+        )
+        favorites = (None, 'true', 'false') if self.user else (None,)
+        for ordering, name, category, is_favorite in itertools.product(
+            ORDERINGS, [None] + prefixes, categories, favorites
+        ):
+            params = {
+                'ordering': ordering,
+                'name': name,
+                'category': category,
+                'is_favorite': is_favorite,
+            }
+            yield {key: value for key, value in params.items() if value}
+
+    def get_view(self, params):
+        request = Request(self.factory.get('/api/v1/subscriptions/', params))
+        if self.user:
+            request.user = self.user
+        view = SubscriptionViewSet(
+            action='list', request=request, args=(), kwargs={}
+        )
+        view.format_kwarg = None
+        return view
+
+    def run(self, path, params, timings):
+        """Возвращает id сервисов ответа через индекс или через базу."""
+        view = self.get_view(params)
+        start = time.perf_counter()
+        if path == 'index':
+            ids = [
+                item['id'] for item in view.list_from_index(view.request).data
+            ]
+        else:
+            queryset = view.filter_queryset(view.get_queryset())
+            # Равные значения сортировки индекс упорядочивает по id.
+            ids = list(
+                queryset.order_by(*queryset.query.order_by, 'id').values_list(
+                    'id', flat=True
+                )
+            )
+        timings[path] += time.perf_counter() - start
+        return ids
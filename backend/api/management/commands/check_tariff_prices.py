@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from subscriptions.models import TARIFF_DERIVED_FIELDS, Tariff
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет вычисляемые поля тарифов (цена в месяц, цена за период, '
+        'слаг) и при необходимости пересчитывает их одним запросом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Пересчитать устаревшие значения.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько расхождений вывести.',
+        )
+
+    def handle(self, *args, **options):
+        drifted = Tariff.objects.drifted()
+        total = drifted.count()
+        if not total:
+            self.stdout.write(
+                self.style.SUCCESS('Расхождений в тарифах не найдено')
+            )
+            return
+
+        self.stdout.write(f'Тарифов с устаревшими значениями: {total}')
+        fields = ['id', *TARIFF_DERIVED_FIELDS]
+        fields += [f'expected_{name}' for name in TARIFF_DERIVED_FIELDS]
+        for row in drifted.values(*fields)[: options['limit']]:
+            changes = ', '.join(
+                f'{name}: {row[name]} -> {row[f"expected_{name}"]}'
+                for name in TARIFF_DERIVED_FIELDS
+                if row[name] != row[f'expected_{name}']
+            )
+            self.stdout.write(f'  тариф {row["id"]}: {changes}')
+
+        if options['fix']:
+            updated = Tariff.objects.filter(
+                id__in=drifted.values('id')
+            ).recalculate_prices()
+            self.stdout.write(
+                self.style.SUCCESS(f'Пересчитано тарифов: {updated}')
+            )
@@ -0,0 +1,71 @@
+import csv
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.v1.services import get_charges_forecast, get_forecast_months
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогнозирует списания всех пользователей по месяцам для '
+        'планирования нагрузки биллинга: сумма, количество списаний и '
+        'пользователей со списаниями в каждом месяце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=settings.FORECAST_MONTHS,
+            help='Горизонт прогноза в месяцах, начиная с текущего.',
+        )
+        parser.add_argument(
+            '--output',
+            help='CSV-файл для сохранения прогноза по пользователям.',
+        )
+
+    def handle(self, *args, **options):
+        months = get_forecast_months(options['months'])
+        start = time.perf_counter()
+        forecast = get_charges_forecast(options['months'])
+        elapsed = time.perf_counter() - start
+
+        totals = [[0, 0, 0] for _ in months]
+        for buckets in forecast.values():
+            for total, (amount, charges) in zip(totals, buckets):
+                total[0] += amount
+                total[1] += charges
+                total[2] += bool(charges)
+
+        self.stdout.write(
+            f'Пользователей с действующими подписками: {len(forecast)}, '
+            f'расчет: {elapsed:.2f} с'
+        )
+        for month, (amount, charges, users) in zip(months, totals):
+            self.stdout.write(
+                f'{month:%Y-%m}: {amount:>12} руб.  '
+                f'{charges:>8} списаний  {users:>8} пользователей'
+            )
+        peak_month, peak = max(zip(months, totals), key=lambda row: row[1][1])
+        self.stdout.write(
+            f'Пиковый месяц по количеству списаний: {peak_month:%Y-%m} '
+            f'({peak[1]})'
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(('user_id', 'month', 'amount', 'charges'))
+                for user_id, buckets in forecast.items():
+                    for month, (amount, charges) in zip(months, buckets):
+                        if charges:
+                            writer.writerow(
+                                (user_id, f'{month:%Y-%m}', amount, charges)
+                            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Прогноз по пользователям сохранен в {options["output"]}'
+                )
+            )
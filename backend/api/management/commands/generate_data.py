@@ -0,0 +1,266 @@
+import random
+from collections import defaultdict
+from itertools import accumulate
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from subscriptions.models import (
+    IsFavoriteSubscription,
+    Subscription,
+    SubscriptionUserOrder,
+    Tariff,
+    Transaction,
+)
+from subscriptions.services import bulk_create_with_ids
+
+from api.v1.services import get_cashback_transactions_period
+
+User = get_user_model()
+
+INSERT_BATCH_SIZE = 5000
+# Распределение количества подписок у пользователя.
+ORDERS_PER_USER_WEIGHTS = {0: 10, 1: 25, 2: 25, 3: 20, 4: 10, 5: 6, 6: 4}
+# Доли выбираемых периодов тарифа.
+PERIOD_WEIGHTS = {1: 55, 3: 20, 6: 10, 12: 15}
+PAID_SHARE = 0.85
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетических пользователей, заказы, избранное и '
+        'историю транзакций пачками с ограниченным расходом памяти. '
+        'Результат детерминирован для одного seed и даты запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=5,
+            help='Максимум сервисов в избранном у пользователя.',
+        )
+        parser.add_argument(
+            '--history-months',
+            type=int,
+            default=12,
+            help='Глубина истории списаний в месяцах.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество пользователей, создаваемых за одну пачку.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix',
+            default='synthetic',
+            help='Префикс имен создаваемых пользователей.',
+        )
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        self.anchor = timezone.localtime().replace(
+            hour=12, minute=0, second=0, microsecond=0
+        )
+        self.cashback_start, _ = get_cashback_transactions_period()
+        self.history_months = options['history_months']
+        self.favorites = options['favorites']
+        self.load_catalog()
+
+        total = defaultdict(int)
+        batch_size = options['batch_size']
+        for offset in range(0, options['users'], batch_size):
+            count = min(batch_size, options['users'] - offset)
+            with transaction.atomic():
+                created = self.generate_batch(
+                    options['prefix'], options['seed'], offset, count
+                )
+            for name, value in created.items():
+                total[name] += value
+            self.stdout.write(
+                f'Пользователей: {offset + count}/{options["users"]}, '
+                f'транзакций: {total["transactions"]}'
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Создано пользователей: {total["users"]}, '
+                f'заказов: {total["orders"]}, '
+                f'избранных: {total["favorites"]}, '
+                f'транзакций: {total["transactions"]}'
+            )
+        )
+
+    def load_catalog(self):
+        """Загружает каталог и веса популярности сервисов."""
+        self.subscriptions = list(
+            Subscription.objects.order_by('id').values_list(
+                'id', 'cashback', 'popular_rate'
+            )
+        )
+        self.tariffs = defaultdict(dict)
+        for tariff in Tariff.objects.order_by('id').only(
+            'id', 'subscription_id', 'period', 'price_per_period'
+        ):
+            self.tariffs[tariff.subscription_id][tariff.period] = tariff
+        self.subscriptions = [
+            subscription
+            for subscription in self.subscriptions
+            if self.tariffs[subscription[0]]
+        ]
+        if not self.subscriptions:
+            raise CommandError(
+                'В каталоге нет сервисов с тарифами: сначала '
+                'импортируйте их командой import_catalog.'
+            )
+        # Квадрат рейтинга усиливает перекос в сторону популярных сервисов.
+        self.cum_weights = list(
+            accumulate((rate + 1) ** 2 for _, _, rate in self.subscriptions)
+        )
+
+    def sample_subscriptions(self, k):
+        """Выбирает k разных сервисов с учетом популярности."""
+        chosen = {}
+        while len(chosen) < k:
+            for subscription in self.rnd.choices(
+                self.subscriptions, cum_weights=self.cum_weights, k=k
+            ):
+                chosen.setdefault(subscription[0], subscription)
+                if len(chosen) == k:
+                    break
+        return list(chosen.values())
+
+    def generate_batch(self, prefix, seed, offset, count):
+        rnd = self.rnd
+        k_max = min(len(self.subscriptions), max(ORDERS_PER_USER_WEIGHTS))
+        users = bulk_create_with_ids(
+            User,
+            [
+                User(
+                    username=f'{prefix}{seed}_{offset + i}',
+                    password='!',
+                    first_name='Синтетический',
+                    middle_name='',
+                    last_name=f'Пользователь {offset + i}',
+                    balance=rnd.randint(0, 50000),
+                    date_joined=self.anchor,
+                )
+                for i in range(count)
+            ],
+            INSERT_BATCH_SIZE,
+        )
+
+        orders, favorites, plans = [], [], []
+        for user in users:
+            k = rnd.choices(
+                list(ORDERS_PER_USER_WEIGHTS),
+                list(ORDERS_PER_USER_WEIGHTS.values()),
+            )[0]
+            for sub_id, cashback, _ in self.sample_subscriptions(
+                min(k, k_max)
+            ):
+                order, plan = self.build_order(user, sub_id, cashback)
+                orders.append(order)
+                plans.append(plan)
+            for sub_id, _, _ in self.sample_subscriptions(
+                min(rnd.randint(0, self.favorites), len(self.subscriptions))
+            ):
+                favorites.append(
+                    IsFavoriteSubscription(
+                        user_id=user.id, subscription_id=sub_id
+                    )
+                )
+
+        bulk_create_with_ids(SubscriptionUserOrder, orders, INSERT_BATCH_SIZE)
+        IsFavoriteSubscription.objects.bulk_create(
+            favorites, batch_size=INSERT_BATCH_SIZE
+        )
+
+        transactions = []
+        created_transactions = 0
+        for order, plan in zip(orders, plans):
+            transactions.extend(self.build_transactions(order, *plan))
+            if len(transactions) >= INSERT_BATCH_SIZE:
+                Transaction.objects.bulk_create(transactions)
+                created_transactions += len(transactions)
+                transactions = []
+        Transaction.objects.bulk_create(transactions)
+        created_transactions += len(transactions)
+
+        return {
+            'users': len(users),
+            'orders': len(orders),
+            'favorites': len(favorites),
+            'transactions': created_transactions,
+        }
+
+    def build_order(self, user, subscription_id, cashback):
+        """
+        Создает заказ и возвращает его вместе с ценой, процентом кешбека
+        и датами прошедших списаний.
+        """
+        rnd = self.rnd
+        tariffs = self.tariffs[subscription_id]
+        periods = [period for period in PERIOD_WEIGHTS if period in tariffs]
+        tariff = tariffs[
+            rnd.choices(periods, [PERIOD_WEIGHTS[p] for p in periods])[0]
+        ]
+        start = self.anchor - relativedelta(
+            months=rnd.randint(0, self.history_months),
+            days=rnd.randint(0, 27),
+        )
+        billing_dates = []
+        due_date = start
+        while due_date <= self.anchor:
+            billing_dates.append(due_date)
+            due_date += relativedelta(months=tariff.period)
+
+        pay_status = rnd.random() < PAID_SHARE
+        order = SubscriptionUserOrder(
+            user_id=user.id,
+            subscription_id=subscription_id,
+            tariff_id=tariff.id,
+            name=user.first_name,
+            phone_number='+7999' + f'{user.id:07d}'[-7:],
+            email=f'{user.username}@example.com',
+            due_date=due_date if pay_status else None,
+            pay_status=pay_status,
+            created_at=start,
+        )
+        return order, (tariff.price_per_period, cashback, billing_dates)
+
+    def build_transactions(self, order, price, cashback, billing_dates):
+        """Создает историю списаний и кешбека по заказу."""
+        for date in billing_dates:
+            yield Transaction(
+                user_id=order.user_id,
+                order_id=order.id,
+                amount=price,
+                transaction_type='DEBIT',
+                transaction_date=date,
+                status='PAID',
+            )
+            yield Transaction(
+                user_id=order.user_id,
+                order_id=order.id,
+                amount=price * cashback // 100,
+                transaction_type='CASHBACK',
+                transaction_date=date,
+                status=(
+                    'CREDITED' if date < self.cashback_start else 'PENDING'
+                ),
+            )
+        if order.pay_status:
+            yield Transaction(
+                user_id=order.user_id,
+                order_id=order.id,
+                amount=price,
+                transaction_type='DEBIT',
+                transaction_date=order.due_date,
+                status='PENDING',
+            )
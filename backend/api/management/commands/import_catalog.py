@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from subscriptions.services import (
+    CATALOG_FORMATS,
+    IMPORT_BATCH_SIZE,
+    import_catalog,
+    load_catalog,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует каталог сервисов подписок с тарифами, категориями '
+        'и баннерами из CSV или JSON файла.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalog', help='Путь к файлу каталога.')
+        parser.add_argument(
+            '--images',
+            default='.',
+            help='Каталог с логотипами и картинками баннеров.',
+        )
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=CATALOG_FORMATS,
+            help='Формат файла, по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        catalog = Path(options['catalog'])
+        images = Path(options['images'])
+        file_format = options['file_format'] or catalog.suffix.lstrip('.')
+        if file_format not in CATALOG_FORMATS:
+            raise CommandError(f'Неизвестный формат каталога: {catalog}')
+
+        with catalog.open(encoding='utf-8', newline='') as file:
+            records = load_catalog(file, file_format)
+        try:
+            result = import_catalog(
+                records,
+                lambda filename: (images / filename).read_bytes(),
+                batch_size=options['batch_size'],
+            )
+        except ValidationError as e:
+            raise CommandError(
+                'Ошибки в каталоге:\n' + '\n'.join(e.messages)
+            ) from e
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать картинку: {e}') from e
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Создано сервисов: {result["subscriptions"]}, '
+                f'тарифов: {result["tariffs"]}, '
+                f'баннеров: {result["banners"]}. '
+                f'Пропущено существующих и повторов: {result["skipped"]}'
+            )
+        )
@@ -0,0 +1,86 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Код, импортирующий то же, что загружает процесс при старте.
+TARGETS = {
+    'web': (
+        'from backend.wsgi import application; '
+        'from django.urls import get_resolver; '
+        'get_resolver().url_patterns'
+    ),
+    'worker': (
+        'import django; django.setup(); '
+        'from backend.celery import app; '
+        'app.loader.import_default_modules()'
+    ),
+}
+IMPORT_TIME_LINE = re.compile(
+    r'import time:\s+(?P<self>\d+) \|\s+\d+ \|\s*(?P<module>\S+)'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Профилирует импорт модулей при старте веб-процесса или воркера '
+        'Celery (python -X importtime) и выводит пакеты с наибольшим '
+        'собственным временем импорта.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'target', choices=tuple(TARGETS), nargs='?', default='web'
+        )
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument(
+            '--output',
+            help='Файл для сохранения полного вывода -X importtime.',
+        )
+
+    def handle(self, *args, **options):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'backend.settings'
+            ),
+        }
+        start = time.perf_counter()
+        process = subprocess.run(
+            [
+                sys.executable,
+                '-X',
+                'importtime',
+                '-c',
+                TARGETS[options['target']],
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        elapsed = time.perf_counter() - start
+        if process.returncode:
+            raise CommandError(process.stderr.strip().splitlines()[-1])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(process.stderr)
+
+        packages = defaultdict(int)
+        for match in IMPORT_TIME_LINE.finditer(process.stderr):
+            packages[match['module'].split('.')[0]] += int(match['self'])
+
+        self.stdout.write(
+            f'Запуск процесса {options["target"]}: {elapsed:.2f} с, '
+            f'импорт: {sum(packages.values()) / 10**6:.2f} с'
+        )
+        for package, self_time in sorted(
+            packages.items(), key=itemgetter(1), reverse=True
+        )[: options['top']]:
+            self.stdout.write(f'{self_time / 1000:>10.1f} ms  {package}')
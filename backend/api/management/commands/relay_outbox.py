@@ -0,0 +1,85 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.outbox import purge_sent_outbox, relay_outbox
+
+PURGE_INTERVAL = 3600
+# Наибольшая пауза между попытками после ошибок брокера или базы
+# в секундах.
+MAX_BACKOFF = 60
+
+logger = logging.getLogger('celery')
+
+
+class Command(BaseCommand):
+    help = (
+        'Ретранслятор исходящих задач: публикует в брокер задачи Celery, '
+        'записанные в исходящие вместе с изменениями в базе, пачками по '
+        'одному соединению с брокером и отмечает их опубликованными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.OUTBOX_BATCH_SIZE,
+            help='Количество задач, публикуемых за одну пачку.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.OUTBOX_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди в секундах.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Опубликовать все накопленные задачи и завершиться.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['once']:
+            start = time.perf_counter()
+            total = 0
+            while True:
+                sent = relay_outbox(batch_size)
+                total += sent
+                if sent < batch_size:
+                    break
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Опубликовано задач: {total}, время: {elapsed:.2f} с'
+                )
+            )
+            return
+
+        last_purge = 0
+        min_backoff = max(options['interval'], 1)
+        backoff = min_backoff
+        while True:
+            try:
+                if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                    purge_sent_outbox()
+                    last_purge = time.monotonic()
+                sent = relay_outbox(batch_size)
+            except Exception as e:
+                # Недоступный брокер или база не должны останавливать
+                # ретранслятор: пачка остается неопубликованной и
+                # отправляется следующей попыткой.
+                logger.error(
+                    f'Ошибка ретранслятора исходящих: {e}. '
+                    f'Повтор через {backoff:.0f} с'
+                )
+                close_old_connections()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            backoff = min_backoff
+            if sent < batch_size:
+                time.sleep(options['interval'])
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from rest_framework.settings import api_settings
+
+from api.cache import (
+    SINGLE_FLIGHT_NAMESPACES,
+    SINGLE_FLIGHT_RESULTS,
+    get_stats,
+    reset_stats,
+)
+
+THROTTLE_RESULTS = ('allowed', 'throttled')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит статистику ограничений частоты запросов по scope и '
+        'объединения одновременных запросов (single-flight) из общего '
+        'кеша всех процессов приложения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счетчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        throttle_names = [
+            f'throttle:{scope}:{result}'
+            for scope in api_settings.DEFAULT_THROTTLE_RATES
+            for result in THROTTLE_RESULTS
+        ]
+        single_flight_names = [
+            f'single_flight:{namespace}:{result}'
+            for namespace in SINGLE_FLIGHT_NAMESPACES
+            for result in SINGLE_FLIGHT_RESULTS
+        ]
+        stats = get_stats(throttle_names + single_flight_names)
+
+        self.stdout.write('Ограничения частоты запросов:')
+        for scope in api_settings.DEFAULT_THROTTLE_RATES:
+            allowed, throttled = (
+                stats[f'throttle:{scope}:{result}']
+                for result in THROTTLE_RESULTS
+            )
+            total = allowed + throttled
+            share = throttled / total * 100 if total else 0
+            self.stdout.write(
+                f'{scope:>14}: пропущено {allowed:>8}  '
+                f'отклонено {throttled:>8} ({share:.1f}%)'
+            )
+
+        self.stdout.write('Объединение запросов (single-flight):')
+        for namespace in SINGLE_FLIGHT_NAMESPACES:
+            counts = {
+                result: stats[f'single_flight:{namespace}:{result}']
+                for result in SINGLE_FLIGHT_RESULTS
+            }
+            self.stdout.write(
+                f'{namespace:>14}: '
+                + '  '.join(
+                    f'{result} {count:>8}' for result, count in counts.items()
+                )
+            )
+
+        if options['reset']:
+            reset_stats(throttle_names + single_flight_names)
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены'))
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from api.v1.services import RENEWAL_CHUNK_SIZE, send_renewal_reminders
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет напоминания о списаниях в ближайшие дни, '
+        'сгруппированные по пользователям, и выводит время отправки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.RENEWAL_REMINDER_DAYS,
+            help='За сколько дней до списания отправлять напоминание.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=RENEWAL_CHUNK_SIZE,
+            help='Количество пользователей в одной пачке.',
+        )
+        parser.add_argument(
+            '--backend',
+            default=settings.RENEWAL_NOTIFICATION_BACKEND,
+            help=(
+                'Бэкенд отправки, например api.notifications.ConsoleBackend.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = send_renewal_reminders(
+            options['days'],
+            options['chunk_size'],
+            import_string(options['backend'])(),
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Напоминания отправлены: пользователей {stats["users"]}, '
+                f'заказов {stats["orders"]}, не доставлено {stats["failed"]}, '
+                f'время: {elapsed:.2f} с'
+            )
+        )
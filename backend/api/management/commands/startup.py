@@ -0,0 +1,78 @@
+import hashlib
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+STAMP_FILE = settings.BASE_DIR / '.startup-stamp'
+FIXTURES = ('users.json',)
+
+
+class Command(BaseCommand):
+    help = (
+        'Подготавливает приложение к запуску в одном процессе: создает и '
+        'применяет миграции, собирает статику и загружает фикстуры. '
+        'Шаги пропускаются, если код и база не изменились с прошлого '
+        'запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Выполнить все шаги независимо от прошлого запуска.',
+        )
+
+    def handle(self, *args, **options):
+        fingerprint = self.get_fingerprint()
+        changed = options['force'] or (
+            not STAMP_FILE.exists() or STAMP_FILE.read_text() != fingerprint
+        )
+
+        if changed:
+            self.run_step('makemigrations', interactive=False)
+        migrated = self.has_unapplied_migrations()
+        if migrated:
+            self.run_step('migrate', interactive=False)
+        if changed:
+            self.run_step('collectstatic', interactive=False)
+        if changed or migrated:
+            self.run_step('loaddata', *FIXTURES)
+
+        STAMP_FILE.write_text(fingerprint)
+        if not changed and not migrated:
+            self.stdout.write('Изменений нет, подготовка пропущена')
+
+    def run_step(self, name, *args, **options):
+        start = time.perf_counter()
+        call_command(name, *args, verbosity=0, **options)
+        self.stdout.write(f'{name}: {time.perf_counter() - start:.2f} с')
+
+    @staticmethod
+    def has_unapplied_migrations():
+        executor = MigrationExecutor(connection)
+        return bool(
+            executor.migration_plan(executor.loader.graph.leaf_nodes())
+        )
+
+    @staticmethod
+    def get_fingerprint():
+        """
+        Возвращает хеш исходного кода, зависимостей и фикстур. Файлы
+        миграций не учитываются: они создаются при запуске.
+        """
+        digest = hashlib.md5()
+        base_dir = Path(settings.BASE_DIR)
+        paths = sorted(base_dir.glob('**/*.py')) + [
+            base_dir / name for name in ('requirements.txt',) + FIXTURES
+        ]
+        for path in paths:
+            if 'migrations' in path.parts or not path.exists():
+                continue
+            digest.update(str(path.relative_to(base_dir)).encode())
+            digest.update(path.read_bytes())
+        return digest.hexdigest()
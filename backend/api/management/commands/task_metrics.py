@@ -0,0 +1,136 @@
+import glob
+import json
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.task_metrics import (
+    DURATION_BUCKETS,
+    LAG_BUCKETS,
+    SNAPSHOT_FILE,
+    new_task_stats,
+)
+
+
+def bucket_percentile(buckets, bounds, quantile):
+    """
+    Возвращает верхнюю границу интервала гистограммы, в который попадает
+    квантиль, или None для пустой гистограммы.
+    """
+    total = sum(buckets)
+    if not total:
+        return None
+    cumulative = 0
+    for bound, count in zip(bounds + (float('inf'),), buckets):
+        cumulative += count
+        if cumulative >= quantile * total:
+            return bound
+    return float('inf')
+
+
+def format_seconds(value):
+    if value is None:
+        return '-'
+    if value == float('inf'):
+        return 'inf'
+    return f'{value * 1000:.0f} ms' if value < 1 else f'{value:.1f} s'
+
+
+class Command(BaseCommand):
+    help = (
+        'Объединяет снапшоты метрик задач Celery всех процессов воркеров '
+        'и выводит по каждой задаче количество запусков, результаты, '
+        'повторы, длительность и отставание от ETA.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Вывести объединенные метрики в формате JSON.',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help=(
+                'Удалить снапшоты после вывода. Работающие процессы '
+                'запишут свои метрики заново.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        tasks = defaultdict(new_task_stats)
+        paths = glob.glob(
+            os.path.join(
+                settings.TASK_METRICS_DIR, SNAPSHOT_FILE.format(pid='*')
+            )
+        )
+        for path in paths:
+            with open(path, encoding='utf-8') as file:
+                snapshot = json.load(file)
+            for name, values in snapshot['tasks'].items():
+                self.merge(tasks[name], values)
+        if options['reset']:
+            for path in paths:
+                os.remove(path)
+
+        if options['json']:
+            self.stdout.write(json.dumps(tasks, ensure_ascii=False))
+            return
+        if not tasks:
+            self.stdout.write('Снапшоты метрик задач не найдены')
+            return
+
+        for name, values in sorted(tasks.items()):
+            outcomes = ', '.join(
+                f'{outcome}: {count}'
+                for outcome, count in values['outcomes'].most_common()
+            )
+            self.stdout.write(
+                f'{name}\n'
+                f'  запусков {values["count"]}, повторов {values["retries"]}'
+                f' ({outcomes})\n'
+                '  длительность: среднее '
+                + format_seconds(values['duration_sum'] / values['count'])
+                + ', p50 <= '
+                + format_seconds(
+                    bucket_percentile(
+                        values['duration_buckets'], DURATION_BUCKETS, 0.5
+                    )
+                )
+                + ', p95 <= '
+                + format_seconds(
+                    bucket_percentile(
+                        values['duration_buckets'], DURATION_BUCKETS, 0.95
+                    )
+                )
+                + ', макс. '
+                + format_seconds(values['duration_max'])
+            )
+            if values['lag_count']:
+                self.stdout.write(
+                    '  отставание от ETA: среднее '
+                    + format_seconds(values['lag_sum'] / values['lag_count'])
+                    + ', p95 <= '
+                    + format_seconds(
+                        bucket_percentile(
+                            values['lag_buckets'], LAG_BUCKETS, 0.95
+                        )
+                    )
+                    + ', макс. '
+                    + format_seconds(values['lag_max'])
+                )
+
+    @staticmethod
+    def merge(total, values):
+        """Добавляет метрики задачи из снапшота к общим."""
+        for key in ('count', 'retries', 'duration_sum', 'lag_count'):
+            total[key] += values[key]
+        total['lag_sum'] += values['lag_sum']
+        for key in ('duration_max', 'lag_max'):
+            total[key] = max(total[key], values[key])
+        for key in ('duration_buckets', 'lag_buckets'):
+            total[key] = [a + b for a, b in zip(total[key], values[key])]
+        total['outcomes'] += Counter(values['outcomes'])
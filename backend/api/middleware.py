@@ -0,0 +1,77 @@
+import os
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.regex_helper import _lazy_re_compile
+
+from backend.profiling import profile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BROTLI_QUALITY = 5
+MIN_COMPRESS_LENGTH = 200
+
+re_accepts_brotli = _lazy_re_compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Сжимает ответы по заголовку Accept-Encoding запроса: brotli, если
+    клиент его поддерживает и установлен пакет brotli, иначе gzip.
+    Потоковые ответы сжимаются gzip.
+    """
+
+    def process_response(self, request, response):
+        if (
+            brotli is None
+            or response.streaming
+            or not re_accepts_brotli.search(
+                request.META.get('HTTP_ACCEPT_ENCODING', '')
+            )
+        ):
+            return super().process_response(request, response)
+        if len(response.content) < MIN_COMPRESS_LENGTH or response.has_header(
+            'Content-Encoding'
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(response.content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос с заголовком X-Profile, равным PROFILING_TOKEN,
+    и возвращает имя файлов профиля в заголовке X-Profile-File.
+    Подключается только при заданном PROFILING_TOKEN. Тело потоковых
+    ответов формируется после выхода из middleware и в профиль
+    не попадает.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.headers.get('X-Profile')
+        if not token or not constant_time_compare(
+            token, settings.PROFILING_TOKEN
+        ):
+            return self.get_response(request)
+        with profile('request', f'{request.method} {request.path}') as path:
+            response = self.get_response(request)
+        response['X-Profile-File'] = os.path.basename(path)
+        return response
@@ -0,0 +1,74 @@
+import json
+import sys
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def format_renewal_message(message):
+    """Возвращает текст напоминания о предстоящих списаниях."""
+    lines = [f'Напоминание о предстоящих списаниях ({message["email"]}):']
+    for order in message['orders']:
+        lines.append(
+            f'- {order["subscription"]}: {order["amount"]} руб. '
+            f'{order["due_date"]:%d.%m.%Y}'
+        )
+    return '\n'.join(lines)
+
+
+class BaseNotificationBackend:
+    """
+    Базовый бэкенд уведомлений. Сообщение - словарь с полями user_id,
+    email и orders (список заказов с полями order_id, subscription,
+    amount, due_date). Метод send вызывается из нескольких потоков и
+    возвращает True, если сообщение доставлено.
+    """
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, message):
+        raise NotImplementedError
+
+
+class ConsoleBackend(BaseNotificationBackend):
+    """Выводит уведомления в стандартный вывод."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        with self.lock:
+            self.stream.write(format_renewal_message(message) + '\n')
+        return True
+
+
+class FileBackend(BaseNotificationBackend):
+    """Дописывает уведомления в файл RENEWAL_NOTIFICATION_FILE (JSON Lines)."""
+
+    def __init__(self, path=None):
+        self.path = path or settings.RENEWAL_NOTIFICATION_FILE
+        self.lock = threading.Lock()
+        self.file = None
+
+    def open(self):
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self.file.close()
+
+    def send(self, message):
+        line = json.dumps(message, ensure_ascii=False, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+        return True
+
+
+def get_notification_backend():
+    """Возвращает бэкенд из настройки RENEWAL_NOTIFICATION_BACKEND."""
+    return import_string(settings.RENEWAL_NOTIFICATION_BACKEND)()
@@ -0,0 +1,98 @@
+import logging
+from datetime import timedelta
+
+from celery.utils import uuid
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from subscriptions.models import TaskOutbox
+
+from backend.celery import app as celery_app
+
+logger = logging.getLogger('celery')
+
+
+def build_task(task, args, eta=None, task_id=None):
+    """Возвращает несохраненную исходящую задачу Celery."""
+    return TaskOutbox(
+        task=task.name, args=args, eta=eta, task_id=task_id or uuid()
+    )
+
+
+def enqueue_task(task, args, eta=None, task_id=None):
+    """
+    Записывает задачу Celery в исходящие в текущей транзакции.
+
+    Задача публикуется в брокер командой relay_outbox только после
+    фиксации транзакции. Возвращает идентификатор задачи.
+    """
+    message = build_task(task, args, eta, task_id)
+    message.save(force_insert=True)
+    return message.task_id
+
+
+def relay_outbox(batch_size=None):
+    """
+    Публикует в брокер пачку неопубликованных задач и отмечает их
+    опубликованными.
+
+    Пачка выбирается с блокировкой строк (SKIP LOCKED), поэтому
+    несколько ретрансляторов не публикуют одни и те же задачи. Все
+    сообщения пачки отправляются через одно соединение с брокером,
+    отметка ставится одним UPDATE. Если процесс упадет между публикацией
+    и отметкой, задачи будут опубликованы повторно с теми же
+    идентификаторами: задачи должны быть идемпотентными.
+
+    Результаты задач никто не читает, поэтому задачи публикуются с
+    ignore_result: иначе бэкенд результатов Redis подписывает процесс
+    ретранслятора на канал результата каждой опубликованной задачи.
+
+    Возвращает количество опубликованных задач.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        batch = list(
+            TaskOutbox.objects.select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True)
+            .order_by('id')[:batch_size]
+        )
+        if not batch:
+            return 0
+        with celery_app.producer_or_acquire() as producer:
+            for message in batch:
+                celery_app.send_task(
+                    message.task,
+                    args=message.args,
+                    eta=message.eta,
+                    task_id=message.task_id,
+                    producer=producer,
+                    ignore_result=True,
+                )
+        TaskOutbox.objects.filter(
+            id__in=[message.id for message in batch]
+        ).update(sent_at=timezone.now())
+    logger.info(f'Опубликовано задач из исходящих: {len(batch)}')
+    return len(batch)
+
+
+def purge_sent_outbox():
+    """
+    Удаляет опубликованные задачи старше OUTBOX_RETENTION секунд.
+    Возвращает количество удаленных задач.
+    """
+    return TaskOutbox.objects.filter(
+        sent_at__lt=timezone.now()
+        - timedelta(seconds=settings.OUTBOX_RETENTION)
+    ).delete()[0]
+
+
+def cancel_outbox_task(task_id):
+    """
+    Удаляет из исходящих еще не опубликованную задачу. Возвращает True,
+    если задача не успела попасть в брокер.
+    """
+    return bool(
+        TaskOutbox.objects.filter(
+            task_id=task_id, sent_at__isnull=True
+        ).delete()[0]
+    )
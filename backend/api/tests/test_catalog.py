@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase
+from subscriptions.models import Subscription
+
+from api.v1.services import get_subscription_tariffs
+
+from .utils import create_subscription, create_user
+
+
+class CatalogPermissionTests(APITestCase):
+    """Каталог и категории доступны только авторизованным клиентам."""
+
+    def test_anonymous_requests_are_rejected(self):
+        subscription = create_subscription()
+        urls = (
+            '/api/v1/subscriptions/',
+            f'/api/v1/subscriptions/{subscription.id}/',
+            f'/api/v1/subscriptions/{subscription.id}/tariffs/',
+            '/api/v1/categories/',
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response.status_code, status.HTTP_401_UNAUTHORIZED
+                )
+
+
+class CatalogCacheTests(APITestCase):
+    """Кеш списка каталога сбрасывается при изменении каталога и цен."""
+
+    def setUp(self):
+        cache.clear()
+        self.subscription = create_subscription()
+        self.client.force_authenticate(create_user())
+
+    def get_catalog(self):
+        response = self.client.get('/api/v1/subscriptions/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_subscription_change(self):
+        self.get_catalog()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscription.name = 'Новое название'
+            self.subscription.save()
+        self.assertEqual(self.get_catalog()[0]['name'], 'Новое название')
+
+    def test_tariff_change(self):
+        self.get_catalog()
+        tariff = self.subscription.tariffs.get(period=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            tariff.price = 100
+            tariff.discount = 0
+            tariff.save()
+        self.assertEqual(self.get_catalog()[0]['min_price'], 100)
+
+
+class SubscriptionTariffsCacheTests(APITestCase):
+    """Удаление сервиса сбрасывает кеш его тарифов."""
+
+    def setUp(self):
+        cache.clear()
+        self.subscription = create_subscription()
+
+    def test_instance_delete(self):
+        subscription_id = self.subscription.id
+        self.assertEqual(
+            len(get_subscription_tariffs([subscription_id])[subscription_id]),
+            3,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscription.delete()
+        self.assertEqual(get_subscription_tariffs([subscription_id]), {})
+
+    def test_queryset_delete(self):
+        subscription_id = self.subscription.id
+        get_subscription_tariffs([subscription_id])
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.filter(id=subscription_id).delete()
+        self.assertEqual(get_subscription_tariffs([subscription_id]), {})
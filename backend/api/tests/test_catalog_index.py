@@ -0,0 +1,130 @@
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from subscriptions.models import IsFavoriteSubscription, Subscription
+
+from api.catalog_index import CatalogIndex
+
+from .utils import create_category, create_subscription, create_user
+
+CATALOG_URL = '/api/v1/subscriptions/'
+
+
+class CatalogIndexTests(APITestCase):
+    """Список каталога из индекса в памяти совпадает с выдачей из базы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cinema = create_category()
+        music = create_category('Музыка', 'music')
+        cls.subscriptions = [
+            create_subscription(name, popular_rate=rate, category=category)
+            for name, rate, category in (
+                ('Кино Плюс', 40, cinema),
+                ('кинопоиск', 10, cinema),
+                ('Музыка', 30, music),
+                ('Apple Music', 20, music),
+            )
+        ]
+        for score, subscription in enumerate(cls.subscriptions):
+            Subscription.objects.filter(id=subscription.id).update(
+                popularity_score=score * 10 + 5
+            )
+        IsFavoriteSubscription.objects.create(
+            user=cls.user, subscription=cls.subscriptions[2]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def get_catalog(self, params=None, index=True):
+        with override_settings(CATALOG_INDEX=index):
+            response = self.client.get(CATALOG_URL, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_matches_database(self):
+        # Префиксы имени в нижнем регистре: SQLite сравнивает без учета
+        # регистра только ASCII, а фильтр дополнительно ищет префикс
+        # с заглавной буквы.
+        cases = [
+            {},
+            {'category': 'kino'},
+            {'category': 'music', 'name': 'м'},
+            {'category': 'unknown'},
+            {'name': 'ки'},
+            {'name': 'a'},
+            {'name': 'zz'},
+            {'is_favorite': 'true'},
+            {'is_favorite': 'false', 'ordering': 'name'},
+        ]
+        cases += [
+            {'ordering': ordering}
+            for ordering in (
+                'name',
+                '-name',
+                'popular_rate',
+                '-popular_rate',
+                '-popularity_score',
+                'popularity_score,name',
+            )
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                self.assertEqual(
+                    self.get_catalog(params),
+                    self.get_catalog(params, index=False),
+                )
+
+    def test_name_prefix_ignores_case(self):
+        items = [
+            {
+                'id': number,
+                'name': name,
+                'popular_rate': 0,
+                'popularity_score': 0,
+                'categories': [],
+            }
+            for number, name in enumerate(('Кино Плюс', 'кинопоиск', 'Музыка'))
+        ]
+        index = CatalogIndex(None, items)
+        for prefix in ('ки', 'Ки', 'КИНО'):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(
+                    [item['id'] for item in index.query((), name=prefix)],
+                    [0, 1],
+                )
+
+    def test_index_does_not_query_database(self):
+        self.get_catalog()
+        with self.assertNumQueries(0):
+            self.get_catalog({'name': 'ки', 'ordering': '-popular_rate'})
+
+    def test_subscription_change_rebuilds_index(self):
+        self.get_catalog()
+        subscription = self.subscriptions[3]
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription.name = 'Яндекс Музыка'
+            subscription.save()
+        names = [item['name'] for item in self.get_catalog({'name': 'я'})]
+        self.assertEqual(names, ['Яндекс Музыка'])
+
+    def test_category_change_rebuilds_index(self):
+        self.get_catalog()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscriptions[2].categories.clear()
+        ids = [item['id'] for item in self.get_catalog({'category': 'music'})]
+        self.assertEqual(ids, [self.subscriptions[3].id])
+
+    def test_tariff_change_rebuilds_index(self):
+        self.get_catalog()
+        tariff = self.subscriptions[0].tariffs.get(period=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            tariff.price = 100
+            tariff.discount = 0
+            tariff.save()
+        prices = {item['id']: item['min_price'] for item in self.get_catalog()}
+        self.assertEqual(prices[self.subscriptions[0].id], 100)
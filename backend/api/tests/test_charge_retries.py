@@ -0,0 +1,129 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+from subscriptions.models import ChargeRetry, TaskOutbox, Transaction
+
+from api.v1 import services
+
+from .utils import create_order, create_subscription, create_user
+
+
+class RetryFailedChargesTests(TestCase):
+    """Повторные списания по заказам после отказа."""
+
+    def setUp(self):
+        self.user = create_user(balance=1000)
+        self.subscription = create_subscription()
+        self.order = self.create_retry(self.subscription)
+
+    def create_retry(self, subscription):
+        order = create_order(
+            self.user,
+            subscription,
+            pay_status=False,
+            due_date=timezone.now() - timedelta(days=1),
+        )
+        Transaction.objects.create(
+            user=self.user,
+            order=order,
+            transaction_type='DEBIT',
+            transaction_date=order.due_date,
+            amount=270,
+        )
+        ChargeRetry.objects.create(
+            order=order,
+            attempts=1,
+            next_attempt_at=timezone.now() - timedelta(minutes=1),
+        )
+        return order
+
+    def set_balance(self, balance):
+        self.user.balance = balance
+        self.user.save(update_fields=['balance'])
+
+    def test_paid(self):
+        stats = services.retry_failed_charges()
+
+        self.assertEqual(stats, {'paid': 1, 'postponed': 0, 'expired': 0})
+        self.order.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertTrue(self.order.pay_status)
+        self.assertGreater(self.order.due_date, timezone.now())
+        self.assertEqual(self.user.balance, 1000 - 270)
+        self.assertFalse(ChargeRetry.objects.exists())
+        self.assertTrue(
+            TaskOutbox.objects.filter(
+                task_id=self.order.task_id_celery
+            ).exists()
+        )
+        pending = Transaction.objects.get(
+            order=self.order, transaction_type='DEBIT', status='PENDING'
+        )
+        self.assertEqual(pending.transaction_date, self.order.due_date)
+
+    def test_postponed(self):
+        self.set_balance(100)
+
+        stats = services.retry_failed_charges()
+
+        self.assertEqual(stats, {'paid': 0, 'postponed': 1, 'expired': 0})
+        retry = ChargeRetry.objects.get(order=self.order)
+        self.assertEqual(retry.attempts, 2)
+        self.assertGreater(retry.next_attempt_at, timezone.now())
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.pay_status)
+        self.assertFalse(TaskOutbox.objects.exists())
+
+    def test_expired(self):
+        self.set_balance(100)
+        ChargeRetry.objects.update(attempts=settings.CHARGE_RETRY_MAX_ATTEMPTS)
+
+        stats = services.retry_failed_charges()
+
+        self.assertEqual(stats, {'paid': 0, 'postponed': 0, 'expired': 1})
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.due_date)
+        self.assertFalse(ChargeRetry.objects.exists())
+        self.assertFalse(
+            Transaction.objects.filter(
+                order=self.order, status='PENDING'
+            ).exists()
+        )
+
+    def test_balance_is_shared_between_orders(self):
+        self.set_balance(300)
+        other = self.create_retry(create_subscription(name='Другой сервис'))
+
+        stats = services.retry_failed_charges()
+
+        self.assertEqual(stats, {'paid': 1, 'postponed': 1, 'expired': 0})
+        self.order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertTrue(self.order.pay_status)
+        self.assertFalse(other.pay_status)
+
+    def test_cancel_during_sweep(self):
+        # На Postgres отмена ждет блокировку заказа, взятую выборкой
+        # пачки. Здесь отмена выполняется между выборкой и списанием, как
+        # если бы заказ не был заблокирован: пачка не должна списаться.
+        charge_retried_orders = services.charge_retried_orders
+
+        def cancel_and_charge(retries, now):
+            services.cancel_user_subscription(self.user, self.subscription.id)
+            charge_retried_orders(retries, now)
+
+        with mock.patch.object(
+            services, 'charge_retried_orders', side_effect=cancel_and_charge
+        ):
+            with self.assertRaises(DatabaseError):
+                services.retry_failed_charges()
+
+        self.order.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertFalse(self.order.pay_status)
+        self.assertEqual(self.user.balance, 1000)
+        self.assertFalse(TaskOutbox.objects.exists())
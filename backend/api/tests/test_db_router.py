@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .utils import (
+    create_order,
+    create_subscription,
+    create_transaction,
+    create_user,
+)
+
+HISTORY_URL = '/api/v1/history/'
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(APITestCase):
+    """Распределение запросов API между основной базой и репликой."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.subscription = create_subscription()
+        # Данные создаются только в основной базе.
+        create_transaction(create_order(self.user, self.subscription), 2025, 3)
+        self.client.force_authenticate(self.user)
+
+    def request(self, method, url):
+        """Выполняет запрос и возвращает SQL основной базы и реплики."""
+        with CaptureQueriesContext(
+            connections['default']
+        ) as default, CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(url)
+        return (
+            response,
+            [query['sql'] for query in default.captured_queries],
+            [query['sql'] for query in replica.captured_queries],
+        )
+
+    def test_safe_request_reads_replica(self):
+        response, default, replica = self.request('get', HISTORY_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [])
+        self.assertEqual(default, [])
+        self.assertTrue(
+            any('subscriptions_transaction' in sql for sql in replica)
+        )
+
+    def test_write_goes_to_default(self):
+        response, default, replica = self.request(
+            'post', f'/api/v1/subscriptions/{self.subscription.id}/favorite/'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replica, [])
+        self.assertTrue(any(sql.startswith('INSERT') for sql in default))
+
+    def test_read_after_write_is_pinned_to_default(self):
+        self.request(
+            'post', f'/api/v1/subscriptions/{self.subscription.id}/favorite/'
+        )
+        response, default, replica = self.request('get', HISTORY_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(replica, [])
+        self.assertTrue(
+            any('subscriptions_transaction' in sql for sql in default)
+        )
@@ -0,0 +1,62 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .utils import (
+    create_order,
+    create_subscription,
+    create_transaction,
+    create_user,
+)
+
+HISTORY_URL = '/api/v1/history/'
+HISTORY_INFO_URL = '/api/v1/history/info/'
+
+
+class HistoryFilterTests(APITestCase):
+    """Фильтр истории транзакций по году и месяцу."""
+
+    def setUp(self):
+        self.user = create_user()
+        order = create_order(self.user, create_subscription())
+        self.march = create_transaction(order, 2025, 3)
+        self.april = create_transaction(order, 2025, 4)
+        self.client.force_authenticate(self.user)
+
+    def test_year_and_month(self):
+        response = self.client.get(HISTORY_URL, {'year': 2025, 'month': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.json()], [self.march.id]
+        )
+
+    def test_year(self):
+        response = self.client.get(HISTORY_URL, {'year': 2025})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_invalid_period(self):
+        invalid_params = (
+            {'year': 2025, 'month': 13},
+            {'year': 2025, 'month': 0},
+            {'year': 2025, 'month': 1.5},
+            {'year': 2025.5},
+            {'year': 0},
+            {'year': 1},
+            {'year': 1, 'month': 1},
+            {'year': 9999},
+            {'month': 13},
+        )
+        for url in (HISTORY_URL, HISTORY_INFO_URL):
+            for params in invalid_params:
+                with self.subTest(url=url, params=params):
+                    response = self.client.get(url, params)
+                    self.assertEqual(
+                        response.status_code, status.HTTP_400_BAD_REQUEST
+                    )
+
+    def test_year_bounds(self):
+        for url in (HISTORY_URL, HISTORY_INFO_URL):
+            for year in (2, 9998):
+                with self.subTest(url=url, year=year):
+                    response = self.client.get(url, {'year': year})
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,185 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from subscriptions.models import TaskOutbox, Transaction
+
+from api.v1 import tasks
+
+from .utils import create_order, create_subscription, create_user
+
+
+class ResumeOrderTests(APITestCase):
+    """Возобновление подписки."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.subscription = create_subscription()
+        self.order = create_order(
+            self.user, self.subscription, pay_status=False
+        )
+        self.url = (
+            f'/api/v1/subscriptions/{self.subscription.id}/resume_order/'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_resume(self):
+        # Заказ с блокировкой, удаление ожидания повторного списания,
+        # исходящая задача, баланс, транзакции и заказ; атомарный блок
+        # внутри транзакции теста добавляет SAVEPOINT и RELEASE.
+        with self.assertNumQueries(8):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.pay_status)
+        self.assertTrue(
+            TaskOutbox.objects.filter(
+                task_id=self.order.task_id_celery
+            ).exists()
+        )
+
+    def test_insufficient_funds(self):
+        self.user.balance = 0
+        self.user.save(update_fields=['balance'])
+        with self.assertLogs('client', 'ERROR') as logs:
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json(), {'error': ['Недостаточно средств на счету.']}
+        )
+        self.assertIn('возобновить подписку', logs.output[-1])
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.pay_status)
+        self.assertFalse(TaskOutbox.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_already_paid(self):
+        self.order.pay_status = True
+        self.order.save(update_fields=['pay_status'])
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderTests(APITestCase):
+    """Оформление подписки."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.subscription = create_subscription()
+        self.tariff = self.subscription.tariffs.get(period=1)
+        self.url = f'/api/v1/subscriptions/{self.subscription.id}/order/'
+        self.data = {
+            'tariff': self.tariff.id,
+            'name': 'Иван',
+            'phone_number': '+79990000000',
+            'email': 'user@example.com',
+        }
+        self.client.force_authenticate(self.user)
+
+    def test_order(self):
+        # Тариф с сервисом, заказ, исходящая задача, баланс и транзакции;
+        # атомарный блок внутри транзакции теста добавляет SAVEPOINT
+        # и RELEASE.
+        with self.assertNumQueries(7):
+            response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = self.user.orders.get()
+        self.assertTrue(order.pay_status)
+        self.assertTrue(
+            TaskOutbox.objects.filter(task_id=order.task_id_celery).exists()
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, 10000 - 270)
+
+    def test_foreign_tariff(self):
+        other = create_subscription(name='Другой сервис')
+        self.data['tariff'] = other.tariffs.get(period=1).id
+        response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TaskOutbox.objects.exists())
+
+
+class NextChargeTaskTests(TestCase):
+    """Задача следующего списания по заказу."""
+
+    def setUp(self):
+        self.user = create_user(balance=1000)
+        self.order = create_order(
+            self.user,
+            create_subscription(),
+            due_date=timezone.now(),
+            task_id_celery='charge-1',
+        )
+        self.debit = Transaction.objects.create(
+            user=self.user,
+            order=self.order,
+            transaction_type='DEBIT',
+            transaction_date=self.order.due_date,
+            amount=270,
+        )
+
+    def run_task(self, task_id='charge-1'):
+        return tasks.next_bank_transaction.apply(
+            args=[self.order.id], task_id=task_id
+        ).get()
+
+    def test_paid(self):
+        self.assertEqual(self.run_task(), 'paid')
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.pay_status)
+        self.assertTrue(
+            TaskOutbox.objects.filter(
+                task_id=self.order.task_id_celery
+            ).exists()
+        )
+
+    def test_stale_task_is_skipped(self):
+        self.assertEqual(self.run_task('charge-0'), 'skipped')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, 1000)
+
+    def test_error_after_outbox_insert_rolls_back(self):
+        def schedule_and_fail(order):
+            schedule_next_charge(order)
+            raise RuntimeError('Ошибка после записи в исходящие')
+
+        schedule_next_charge = tasks.schedule_next_charge
+        with mock.patch.object(
+            tasks, 'schedule_next_charge', side_effect=schedule_and_fail
+        ):
+            self.assertEqual(self.run_task(), 'declined')
+
+        self.order.refresh_from_db()
+        self.user.refresh_from_db()
+        self.debit.refresh_from_db()
+        self.assertFalse(self.order.pay_status)
+        self.assertEqual(self.order.task_id_celery, 'charge-1')
+        self.assertFalse(TaskOutbox.objects.exists())
+        self.assertEqual(self.user.balance, 1000)
+        self.assertEqual(self.debit.status, 'PENDING')
+        self.assertEqual(Transaction.objects.count(), 1)
+
+
+class CancelOrderTaskTests(TestCase):
+    """Задача отключения заказа в конце оплаченного периода."""
+
+    def setUp(self):
+        self.order = create_order(
+            create_user(), create_subscription(), due_date=timezone.now()
+        )
+
+    def test_cancelled_order_is_disabled(self):
+        tasks.cancel_subscription_order.apply(args=[self.order.id])
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.pay_status)
+        self.assertIsNone(self.order.due_date)
+
+    def test_renewed_order_is_kept(self):
+        self.order.task_id_celery = 'charge-2'
+        self.order.save(update_fields=['task_id_celery'])
+        tasks.cancel_subscription_order.apply(args=[self.order.id])
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.pay_status)
+        self.assertIsNotNone(self.order.due_date)
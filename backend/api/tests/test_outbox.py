@@ -0,0 +1,122 @@
+from unittest import mock
+
+from celery.utils import uuid
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from subscriptions.models import TaskOutbox
+
+from api import outbox
+from api.management.commands import relay_outbox as relay_command
+from api.v1.services import schedule_next_charge
+from backend.celery import app as celery_app
+
+from .utils import create_order, create_subscription, create_user
+
+
+class RelayOutboxTests(TestCase):
+    """Публикация исходящих задач в брокер в памяти процесса."""
+
+    def setUp(self):
+        user = create_user()
+        self.orders = []
+        for number in range(5):
+            order = create_order(
+                user,
+                create_subscription(name=f'Сервис {number}'),
+                due_date=timezone.now(),
+                task_id_celery=uuid(),
+            )
+            schedule_next_charge(order)
+            self.orders.append(order)
+
+        connection = celery_app.connection_for_write('memory://')
+        self.addCleanup(connection.release)
+        self.queue = connection.SimpleQueue(celery_app.conf.task_default_queue)
+        self.addCleanup(self.queue.close)
+        self.queue.clear()
+        # Публикация идет через соединение с брокером в памяти вместо
+        # пула соединений с Redis из настроек.
+        producer = connection.Producer()
+        producer_or_acquire = celery_app.producer_or_acquire
+        patcher = mock.patch.object(
+            celery_app,
+            'producer_or_acquire',
+            lambda current=None: producer_or_acquire(current or producer),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_published(self):
+        messages = []
+        while True:
+            try:
+                message = self.queue.get(block=False)
+            except self.queue.Empty:
+                return messages
+            message.ack()
+            messages.append(message)
+
+    def test_relay_in_batches(self):
+        self.assertEqual(
+            [outbox.relay_outbox(2) for _ in range(4)], [2, 2, 1, 0]
+        )
+
+        messages = self.get_published()
+        self.assertEqual(
+            [message.headers['id'] for message in messages],
+            [order.task_id_celery for order in self.orders],
+        )
+        self.assertEqual(
+            [message.headers['task'] for message in messages],
+            ['api.v1.tasks.next_bank_transaction'] * 5,
+        )
+        self.assertEqual(
+            [message.payload[0] for message in messages],
+            [[order.id] for order in self.orders],
+        )
+        self.assertFalse(TaskOutbox.objects.filter(sent_at=None).exists())
+
+    def test_failed_publish_keeps_batch(self):
+        with mock.patch.object(
+            celery_app, 'send_task', side_effect=ConnectionError('broker')
+        ):
+            with self.assertRaises(ConnectionError):
+                outbox.relay_outbox(2)
+
+        self.assertEqual(TaskOutbox.objects.filter(sent_at=None).count(), 5)
+        self.assertEqual(outbox.relay_outbox(), 5)
+        self.assertEqual(len(self.get_published()), 5)
+
+
+class RelayOutboxCommandTests(TestCase):
+    """Цикл ретранслятора переживает ошибки брокера и базы."""
+
+    def test_errors_are_logged_and_retried_with_backoff(self):
+        stop = KeyboardInterrupt()
+        with mock.patch.object(relay_command, 'purge_sent_outbox'):
+            with mock.patch.object(
+                relay_command,
+                'relay_outbox',
+                side_effect=[
+                    ConnectionError('broker'),
+                    ConnectionError('broker'),
+                    0,
+                    ConnectionError('broker'),
+                ],
+            ) as relay:
+                with mock.patch.object(
+                    relay_command.time,
+                    'sleep',
+                    side_effect=[None, None, None, stop],
+                ) as sleep:
+                    with self.assertLogs('celery', 'ERROR') as logs:
+                        with self.assertRaises(KeyboardInterrupt):
+                            call_command('relay_outbox', interval=0.5)
+
+        self.assertEqual(relay.call_count, 4)
+        self.assertEqual(
+            [call.args[0] for call in sleep.call_args_list], [1, 2, 0.5, 1]
+        )
+        self.assertEqual(len(logs.output), 3)
+        self.assertIn('broker', logs.output[0])
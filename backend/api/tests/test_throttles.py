@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.throttles import EndpointThrottle
+from api.v1.views import CategorySubscriptionViewSet
+
+from .utils import create_user
+
+
+class EndpointThrottleTests(APITestCase):
+    """Ограничение частоты запросов к отдельным действиям."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_schema(self):
+        response = self.client.get('/api/v1/schema/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_catalog_list_is_throttled(self):
+        self.client.force_authenticate(create_user())
+        with mock.patch.dict(EndpointThrottle.THROTTLE_RATES, catalog='2/min'):
+            statuses = [
+                self.client.get('/api/v1/subscriptions/').status_code
+                for _ in range(3)
+            ]
+        self.assertEqual(
+            statuses,
+            [
+                status.HTTP_200_OK,
+                status.HTTP_200_OK,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            ],
+        )
+
+    def test_only_scoped_views_use_endpoint_throttle(self):
+        throttles = CategorySubscriptionViewSet().get_throttles()
+        self.assertFalse(
+            any(
+                isinstance(throttle, EndpointThrottle)
+                for throttle in throttles
+            )
+        )
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from django.utils import timezone
+from subscriptions.models import (
+    CategorySubscription,
+    Subscription,
+    SubscriptionUserOrder,
+    Tariff,
+    Transaction,
+)
+from users.models import User
+
+
+def create_user(username='user', balance=10000):
+    return User.objects.create(username=username, balance=balance)
+
+
+def create_subscription(name='Сервис', popular_rate=0, category=None):
+    """Создает сервис с тарифами на 1, 3 и 12 месяцев."""
+    subscription = Subscription.objects.create(
+        name=name,
+        title='Описание',
+        description='Описание',
+        logo='logo.png',
+        cashback=5,
+        popular_rate=popular_rate,
+    )
+    if category is not None:
+        subscription.categories.add(category)
+    for period in (1, 3, 12):
+        Tariff.objects.create(
+            subscription=subscription, period=period, price=300, discount=10
+        )
+    return subscription
+
+
+def create_category(name='Кино', slug='kino'):
+    return CategorySubscription.objects.create(name=name, slug=slug)
+
+
+def create_order(user, subscription, **kwargs):
+    return SubscriptionUserOrder.objects.create(
+        user=user,
+        subscription=subscription,
+        tariff=subscription.tariffs.get(period=1),
+        name='Клиент',
+        phone_number='+79990000000',
+        email='client@example.com',
+        **kwargs,
+    )
+
+
+def create_transaction(order, year, month, amount=270):
+    return Transaction.objects.create(
+        user=order.user,
+        order=order,
+        transaction_type='DEBIT',
+        transaction_date=timezone.make_aware(datetime(year, month, 15)),
+        amount=amount,
+        status='PAID',
+    )
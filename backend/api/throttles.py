@@ -0,0 +1,60 @@
+from rest_framework.throttling import (
+    AnonRateThrottle,
+    SimpleRateThrottle,
+    UserRateThrottle,
+)
+
+from api.cache import incr_stat
+
+
+class ThrottleStatsMixin:
+    """
+    Учитывает пропущенные и отклоненные запросы в счетчиках
+    throttle:<scope>:allowed и throttle:<scope>:throttled общего кеша.
+    """
+
+    def throttle_success(self):
+        incr_stat(f'throttle:{self.scope}:allowed')
+        return super().throttle_success()
+
+    def throttle_failure(self):
+        incr_stat(f'throttle:{self.scope}:throttled')
+        return super().throttle_failure()
+
+
+class AnonThrottle(ThrottleStatsMixin, AnonRateThrottle):
+    """Ограничивает частоту запросов анонимного клиента по IP."""
+
+
+class UserThrottle(ThrottleStatsMixin, UserRateThrottle):
+    """Ограничивает частоту всех запросов пользователя."""
+
+
+class EndpointThrottle(ThrottleStatsMixin, SimpleRateThrottle):
+    """
+    Ограничивает частоту запросов пользователя (анонимного клиента - по
+    IP) к отдельному действию. Scope берется из словаря throttle_scopes
+    представления по имени действия, действия без scope не ограничиваются.
+    Подключается в throttle_classes представлений с throttle_scopes.
+    """
+
+    def __init__(self):
+        # Частота определяется в allow_request по действию представления.
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None)
+        )
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -1,3 +1,6 @@
+from datetime import MAXYEAR, MINYEAR
+
+from django import forms
 from django.db.models import Q
 from django_filters.rest_framework import (
     BooleanFilter,
@@ -8,6 +11,8 @@ from django_filters.rest_framework import (
 )
 from subscriptions.models import Subscription, Transaction
 
+from .services import get_favorite_ids, get_month_range
+
 
 class CaseInsensitiveStartsWithCharFilter(CharFilter):
     """
@@ -24,6 +29,12 @@ class CaseInsensitiveStartsWithCharFilter(CharFilter):
         return qs
 
 
+class IntegerFilter(NumberFilter):
+    """Фильтр по целому числу: дробные значения не проходят валидацию."""
+
+    field_class = forms.IntegerField
+
+
 class SubscriptionFilter(FilterSet):
     """
     Фильтр для подписок с возможностью поиска по категории, имени
@@ -40,9 +51,10 @@ class SubscriptionFilter(FilterSet):
 
     def get_is_favorite(self, queryset, name, value):
         if self.request.user.is_authenticated:
+            favorite_ids = get_favorite_ids(self.request.user)
             if value:
-                return queryset.filter(is_favorite__user=self.request.user)
-            return queryset.exclude(is_favorite__user=self.request.user)
+                return queryset.filter(id__in=favorite_ids)
+            return queryset.exclude(id__in=favorite_ids)
         return queryset
 
 
@@ -52,11 +64,32 @@ class HistoryFilter(FilterSet):
     и диапазону дат.
     """
 
-    year = NumberFilter(field_name='transaction_date__year')
-    month = NumberFilter(field_name='transaction_date__month')
+    # Границы года оставляют место для перевода начала года в UTC
+    # и для конца диапазона года.
+    year = IntegerFilter(
+        method='filter_year', min_value=MINYEAR + 1, max_value=MAXYEAR - 1
+    )
+    month = IntegerFilter(method='filter_month', min_value=1, max_value=12)
     start_date = DateFilter(field_name='transaction_date', lookup_expr='gte')
     end_date = DateFilter(field_name='transaction_date', lookup_expr='lte')
 
     class Meta:
         model = Transaction
         fields = ('year', 'month', 'start_date', 'end_date')
+
+    def filter_year(self, queryset, name, value):
+        """
+        Фильтрует по году через диапазон дат, чтобы запрос использовал
+        индекс по дате транзакции. При указании месяца диапазон
+        сужается до этого месяца.
+        """
+        month = self.form.cleaned_data.get('month')
+        start, end = get_month_range(value, month)
+        return queryset.filter(
+            transaction_date__gte=start, transaction_date__lt=end
+        )
+
+    def filter_month(self, queryset, name, value):
+        if self.form.cleaned_data.get('year'):
+            return queryset
+        return queryset.filter(transaction_date__month=value)
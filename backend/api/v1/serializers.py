@@ -1,24 +1,28 @@
 import logging
 
-from dateutil.relativedelta import relativedelta
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
 from rest_framework import serializers
 from subscriptions.models import (
     BannersSubscription,
     CategorySubscription,
-    IsFavoriteSubscription,
     Subscription,
     SubscriptionUserOrder,
     Tariff,
     Transaction,
 )
 
-from .services import bank_operation
+from .services import (
+    create_subscription_order,
+    get_favorite_ids,
+    update_favorites,
+)
 
 User = get_user_model()
+FAVORITES_BULK_LIMIT = 100
+TARIFFS_BULK_LIMIT = 100
 client_logger = logging.getLogger('client')
 
 
@@ -46,6 +50,45 @@ class TariffSerializer(serializers.ModelSerializer):
         exclude = ['subscription', 'price']
 
 
+class TariffsBulkQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров запроса тарифов нескольких сервисов.
+
+    Поля:
+    - ids (list): id сервисов через запятую.
+    """
+
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        """Разбирает id через запятую и убирает повторы."""
+        field = serializers.ListField(
+            child=serializers.IntegerField(min_value=1),
+            allow_empty=False,
+            max_length=TARIFFS_BULK_LIMIT,
+        )
+        return list(
+            dict.fromkeys(
+                field.run_validation(
+                    [item for item in value.split(',') if item]
+                )
+            )
+        )
+
+
+class SubscriptionTariffsSerializer(serializers.Serializer):
+    """
+    Сериализатор тарифов сервиса в ответе на запрос нескольких сервисов.
+
+    Поля:
+    - subscription (int): id сервиса.
+    - tariffs (list): Тарифы сервиса.
+    """
+
+    subscription = serializers.IntegerField()
+    tariffs = TariffSerializer(many=True)
+
+
 class SubscriptionSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели Subscription.
@@ -75,6 +118,7 @@ class SubscriptionCatalogSerializer(SubscriptionSerializer):
     - description (str): Описание подписки.
     - categories (list): Список категорий подписки.
     - popular_rate (float): Рейтинг популярности подписки.
+    - popularity_score (int): Рейтинг подписки по заказам и избранному.
     - min_price (int): Минимальная цена подписки.
     - is_favorite (bool): Флаг, указывающий, добавлена ли подписка в избранное
       для пользователя.
@@ -89,16 +133,22 @@ class SubscriptionCatalogSerializer(SubscriptionSerializer):
             'description',
             'categories',
             'popular_rate',
+            'popularity_score',
             'min_price',
             'is_favorite',
         )
 
     def get_is_favorite(self, obj) -> bool:
-        """Проверяет, добавлен ли сервис в избранное для пользователя."""
+        """
+        Проверяет, добавлен ли сервис в избранное для пользователя.
+        Избранное читается из кеша один раз на весь список.
+        """
         user = self.context.get('request').user
-        if self.context.get('request').user.is_authenticated:
-            return obj.is_favorite.filter(user=user).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        if 'favorite_ids' not in self.context:
+            self.context['favorite_ids'] = get_favorite_ids(user)
+        return obj.id in self.context['favorite_ids']
 
 
 class SubscriptionDetailSerializer(SubscriptionCatalogSerializer):
@@ -121,6 +171,10 @@ class SubscriptionDetailSerializer(SubscriptionCatalogSerializer):
 class SubscriptionOrderSerializer(serializers.ModelSerializer):
     """Сериализатор для создания заказа подписки."""
 
+    tariff = serializers.PrimaryKeyRelatedField(
+        queryset=Tariff.objects.select_related('subscription')
+    )
+
     class Meta:
         model = SubscriptionUserOrder
         fields = ['name', 'phone_number', 'email', 'tariff', 'due_date']
@@ -130,15 +184,11 @@ class SubscriptionOrderSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = self.context['request'].user
-        sub_id = self.context['sub_id']
-        subscription = get_object_or_404(Subscription, id=sub_id)
-        tariff = validated_data['tariff']
-        due_date = timezone.now() + relativedelta(months=(tariff.period))
+        subscription = validated_data['tariff'].subscription
         try:
-            with transaction.atomic():
-                validated_data['due_date'] = due_date
-                subscription_order = super().create(validated_data)
-                bank_operation(user, subscription, tariff, subscription_order)
+            return create_subscription_order(
+                user, subscription, validated_data
+            )
         except IntegrityError:
             raise serializers.ValidationError(
                 'У пользователя уже существует подписка на этот сервис.'
@@ -152,12 +202,11 @@ class SubscriptionOrderSerializer(serializers.ModelSerializer):
                 'Ошибка при выполнении создании подписки. '
                 'Повторите попытку.'
             )
-        return subscription_order
 
     def validate_tariff(self, value):
         """Валидирует выбранный тариф подписки."""
         sub_id = self.context['sub_id']
-        if value.subscription.id != int(sub_id):
+        if value.subscription_id != int(sub_id):
             raise serializers.ValidationError(
                 'Выбранный тариф не принадлежит указанному сервису подписки.'
             )
@@ -247,39 +296,91 @@ class IsFavoriteSerializer(serializers.Serializer):
         """
         request = self.context.get('request')
         user = request.user
-        sub_id = self.context.get('sub_id')
-        subscription = get_object_or_404(Subscription, id=sub_id)
+        sub_id = int(self.context.get('sub_id'))
+        is_favorite = sub_id in get_favorite_ids(user)
 
         if request.method == 'POST':
-            if IsFavoriteSubscription.objects.filter(
-                user=user, subscription=subscription
-            ).exists():
+            if is_favorite:
                 raise serializers.ValidationError(
                     'Вы уже добавили сервис в избранное'
                 )
+            if not Subscription.objects.filter(id=sub_id).exists():
+                raise Http404
         elif request.method == 'DELETE':
-            if not IsFavoriteSubscription.objects.filter(
-                user=user, subscription=subscription
-            ).exists():
+            if not is_favorite:
+                get_object_or_404(Subscription, id=sub_id)
                 raise serializers.ValidationError(
                     'Вы не добавляли этот сервис в избранное'
                 )
-            else:
-                IsFavoriteSubscription.objects.filter(
-                    user=user, subscription=subscription
-                ).delete()
-                return attrs
+            update_favorites(user, remove=[sub_id])
         return attrs
 
     def save(self, **kwargs):
         """
         Создает связь пользователя с подпиской и добавляет ее в избранное.
         """
-        sub_id = self.context.get('sub_id')
-        subscription = get_object_or_404(Subscription, id=sub_id)
-        IsFavoriteSubscription.objects.create(
-            user=self.context['request'].user, subscription=subscription
+        update_favorites(
+            self.context['request'].user, add=[int(self.context['sub_id'])]
+        )
+
+
+class FavoritesBulkSerializer(serializers.Serializer):
+    """
+    Сериализатор для пакетного изменения избранного.
+
+    Поля:
+    - add (list): id сервисов для добавления в избранное.
+    - remove (list): id сервисов для удаления из избранного.
+    - favorites (list): id сервисов в избранном после изменения.
+    """
+
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        default=list,
+        max_length=FAVORITES_BULK_LIMIT,
+        write_only=True,
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        default=list,
+        max_length=FAVORITES_BULK_LIMIT,
+        write_only=True,
+    )
+    favorites = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+
+    def validate_add(self, value):
+        """Проверяет, что все добавляемые сервисы существуют."""
+        existing = set(
+            Subscription.objects.filter(id__in=value).values_list(
+                'id', flat=True
+            )
+        )
+        missing = sorted(set(value) - existing)
+        if missing:
+            raise serializers.ValidationError(f'Сервисы не найдены: {missing}')
+        return value
+
+    def validate(self, attrs):
+        if not attrs['add'] and not attrs['remove']:
+            raise serializers.ValidationError(
+                'Укажите сервисы для добавления или удаления'
+            )
+        if set(attrs['add']) & set(attrs['remove']):
+            raise serializers.ValidationError(
+                'Сервис не может одновременно добавляться и удаляться'
+            )
+        return attrs
+
+    def save(self, **kwargs):
+        favorite_ids = update_favorites(
+            self.context['request'].user,
+            add=self.validated_data['add'],
+            remove=self.validated_data['remove'],
         )
+        self.instance = {'favorites': sorted(favorite_ids)}
+        return self.instance
 
 
 class MySubscriptionSerializer(serializers.ModelSerializer):
@@ -316,6 +417,70 @@ class MySubscriptionSerializer(serializers.ModelSerializer):
         )
 
 
+class DashboardSubscriptionSerializer(MySubscriptionSerializer):
+    """
+    Сериализатор подписки пользователя для экрана "Мои подписки".
+
+    Дополнительные поля:
+    - cashback_amount (int): Сумма кешбека за период тарифа.
+    """
+
+    cashback_amount = serializers.SerializerMethodField()
+
+    class Meta(MySubscriptionSerializer.Meta):
+        fields = MySubscriptionSerializer.Meta.fields + ('cashback_amount',)
+
+    def get_cashback_amount(self, obj) -> int:
+        """Сумма выплачиваемого кешбека."""
+        return obj.tariff.price_per_period * obj.subscription.cashback // 100
+
+
+class DashboardSerializer(serializers.Serializer):
+    """
+    Сериализатор снимка экрана "Мои подписки".
+
+    Поля:
+    - subscriptions (list): Подписки пользователя с тарифами и датами
+      следующего списания.
+    - total_current_month (int): Сумма списаний за текущий месяц.
+    - total_next_month (int): Сумма списаний за следующий месяц.
+    - total_cashback (int): Сумма кешбека за текущий период выплаты.
+    """
+
+    subscriptions = DashboardSubscriptionSerializer(many=True)
+    total_current_month = serializers.IntegerField()
+    total_next_month = serializers.IntegerField()
+    total_cashback = serializers.IntegerField()
+
+
+class ForecastMonthSerializer(serializers.Serializer):
+    """
+    Сериализатор прогноза списаний за месяц.
+
+    Поля:
+    - month (date): Первый день месяца.
+    - amount (int): Сумма списаний за месяц.
+    - charges (int): Количество списаний за месяц.
+    """
+
+    month = serializers.DateField()
+    amount = serializers.IntegerField()
+    charges = serializers.IntegerField()
+
+
+class ForecastSerializer(serializers.Serializer):
+    """
+    Сериализатор прогноза списаний пользователя.
+
+    Поля:
+    - months (list): Суммы и количество списаний по месяцам.
+    - total (int): Сумма списаний за весь горизонт прогноза.
+    """
+
+    months = ForecastMonthSerializer(many=True)
+    total = serializers.IntegerField()
+
+
 class SubscriptionForHistorySerializer(serializers.ModelSerializer):
     """Сериализатор для подписок в истории транзакций."""
 
@@ -1,64 +1,146 @@
+import csv
+import hashlib
+import json
 import logging
+import math
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time
 
+from celery.utils import uuid
 from dateutil.relativedelta import relativedelta
-from django.db import transaction
-from django.db.models import Sum
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, TruncMonth
 from django.utils import timezone
 from rest_framework import serializers
-from subscriptions.models import Transaction
+from subscriptions.models import (
+    ChargeRetry,
+    IsFavoriteSubscription,
+    Subscription,
+    SubscriptionUserOrder,
+    Tariff,
+    TaskOutbox,
+    Transaction,
+    get_catalog_version,
+    get_tariffs_version,
+)
 
+from api.notifications import get_notification_backend
+from api.outbox import build_task, cancel_outbox_task, enqueue_task
+from backend.db_router import primary_reads
+
+User = get_user_model()
 transaction_logger = logging.getLogger('transaction')
 client_logger = logging.getLogger('client')
 
+EXPORT_FIELDS = (
+    'id',
+    'transaction_date',
+    'transaction_type',
+    'status',
+    'amount',
+    'order__subscription__name',
+    'order__tariff__slug',
+)
+EXPORT_HEADERS = (
+    'id',
+    'transaction_date',
+    'transaction_type',
+    'status',
+    'amount',
+    'subscription',
+    'tariff',
+)
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+EXPORT_CHUNK_SIZE = 2000
+FAVORITES_CACHE_KEY = 'favorites:{user_id}'
+DASHBOARD_CACHE_KEY = 'dashboard:{user_id}:{date}'
+FORECAST_CACHE_KEY = 'forecast:{user_id}:{date}'
+CATALOG_CACHE_KEY = 'catalog:{catalog_version}:{tariffs_version}:{params}'
+HISTORY_INFO_CACHE_KEY = 'history-info:{user_id}:{version}:{date}:{params}'
+HISTORY_INFO_VERSION_KEY = 'history-info-version:{user_id}'
+TARIFFS_CACHE_KEY = 'tariffs:{version}:{subscription_id}'
+RENEWAL_CHUNK_SIZE = 1000
+CHARGE_RETRY_CHUNK_SIZE = 500
+
 
 def bank_operation(user, subscription, tariff, subscription_order):
-    """Симулирует банковскую операцию."""
+    """
+    Симулирует банковскую операцию.
+
+    Баланс списывается условным UPDATE: проверка и списание выполняются
+    одним запросом, поэтому параллельные оплаты не уводят баланс в минус.
+    Вызывается внутри транзакции заказа и не создает точку сохранения.
+    """
     price = tariff.price_per_period
     cashback = subscription.cashback
 
-    if user.balance < price:
-        log_message = (
-            f'У пользователя {user.id} недостаточно средств, чтобы оплатить '
-            f'подписку на сервис {subscription.id} '
-            f'по заказу {subscription_order.id}'
+    with transaction.atomic(savepoint=False):
+        debited = User.objects.filter(id=user.id, balance__gte=price).update(
+            balance=F('balance') - price
         )
-        transaction_logger.error(log_message)
-        client_logger.error(log_message)
-        raise serializers.ValidationError('Недостаточно средств на счету.')
+        if not debited:
+            log_message = (
+                f'У пользователя {user.id} недостаточно средств, чтобы '
+                f'оплатить подписку на сервис {subscription.id} '
+                f'по заказу {subscription_order.id}'
+            )
+            transaction_logger.error(log_message)
+            client_logger.error(log_message)
+            raise serializers.ValidationError('Недостаточно средств на счету.')
 
-    try:
-        with transaction.atomic():
+        try:
             user.balance -= price
-            user.save(update_fields=['balance'])
-
+            Transaction.objects.bulk_create(
+                build_current_transactions(
+                    user, subscription_order, price, cashback
+                )
+                + [build_future_transaction(user, subscription_order, price)]
+            )
+        except Exception as e:
             log_message = (
-                f'Пользователь {user.id} оплатил подписку на сервис '
-                f'{subscription.id} по заказу {subscription_order.id}'
+                f'У пользователя {user.id} возникла ошибка {e} '
+                f'при попытке оплатить подписку на сервис {subscription.id} '
+                f'по заказу {subscription_order.id}'
+            )
+            transaction_logger.error(log_message)
+            client_logger.error(log_message)
+            raise serializers.ValidationError(
+                'Ошибка при выполнении банковской операции. '
+                'Проверьте данные и повторите попытку.'
             )
-            transaction_logger.info(log_message)
-            client_logger.info(log_message)
-
-            current_transaction(user, subscription_order, price, cashback)
-            future_transaction(user, subscription_order, price)
 
-    except Exception as e:
-        log_message = (
-            f'У пользователя {user.id} возникла ошибка {e} '
-            f'при попытке оплатить подписку на сервис {subscription.id} '
-            f'по заказу {subscription_order.id}'
-        )
-        transaction_logger.error(log_message)
-        client_logger.error(log_message)
-        raise serializers.ValidationError(
-            'Ошибка при выполнении банковской операции. '
-            'Проверьте данные и повторите попытку.'
-        )
+    log_message = (
+        f'Пользователь {user.id} оплатил подписку на сервис '
+        f'{subscription.id} по заказу {subscription_order.id}'
+    )
+    transaction_logger.info(log_message)
+    client_logger.info(log_message)
 
 
-def current_transaction(user, subscription_order, price, cashback):
+def build_current_transactions(user, subscription_order, price, cashback):
     """
-    Создает запись о текущей транзакции списания пользователя и
-    создает будущую транзакцию начисления кэшбэка.
+    Возвращает несохраненные транзакции текущего списания пользователя
+    и будущего начисления кэшбэка.
 
     Args:
         user: Пользователь, выполняющий транзакцию.
@@ -67,25 +149,63 @@ def current_transaction(user, subscription_order, price, cashback):
         price: Сумма транзакции.
         cashback: Процент кэшбэка.
     """
-    Transaction.objects.create(
+    return [
+        Transaction(
+            user=user,
+            order=subscription_order,
+            amount=price,
+            transaction_type='DEBIT',
+            transaction_date=timezone.now(),
+            status='PAID',
+        ),
+        Transaction(
+            user=user,
+            order=subscription_order,
+            amount=price * cashback // 100,
+            transaction_type='CASHBACK',
+            transaction_date=timezone.now(),
+            status='PENDING',
+        ),
+    ]
+
+
+def build_future_transaction(user, subscription_order, price):
+    """
+    Возвращает несохраненную транзакцию будущего списания пользователя.
+
+    Args:
+        user: Пользователь, выполняющий транзакцию.
+        subscription_order: Заказ подписки,
+        для которого выполняется транзакция.
+        price: Сумма транзакции.
+    """
+    return Transaction(
         user=user,
         order=subscription_order,
         amount=price,
         transaction_type='DEBIT',
-        transaction_date=timezone.now(),
-        status='PAID',
-    )
-    cashback = price * cashback // 100
-    Transaction.objects.create(
-        user=user,
-        order=subscription_order,
-        amount=cashback,
-        transaction_type='CASHBACK',
-        transaction_date=timezone.now(),
+        transaction_date=subscription_order.due_date,
         status='PENDING',
     )
 
 
+def current_transaction(user, subscription_order, price, cashback):
+    """
+    Создает запись о текущей транзакции списания пользователя и
+    создает будущую транзакцию начисления кэшбэка.
+
+    Args:
+        user: Пользователь, выполняющий транзакцию.
+        subscription_order: Заказ подписки,
+        для которого выполняется транзакция.
+        price: Сумма транзакции.
+        cashback: Процент кэшбэка.
+    """
+    Transaction.objects.bulk_create(
+        build_current_transactions(user, subscription_order, price, cashback)
+    )
+
+
 def future_transaction(user, subscription_order, price):
     """
     Создает запись о будущей транзакции списания пользователя.
@@ -96,14 +216,330 @@ def future_transaction(user, subscription_order, price):
         для которого выполняется транзакция.
         price: Сумма транзакции.
     """
-    Transaction.objects.create(
+    build_future_transaction(user, subscription_order, price).save()
+
+
+def build_next_charge(order):
+    """
+    Возвращает несохраненную исходящую задачу следующего списания по
+    заказу с идентификатором order.task_id_celery.
+
+    Идентификатор назначается заказу заранее, поэтому он сохраняется
+    вместе с заказом без отдельного UPDATE.
+    """
+    from .tasks import next_bank_transaction
+
+    if settings.TEST_CELERY:
+        eta = timezone.now() + relativedelta(seconds=10)
+    else:
+        eta = order.due_date
+    return build_task(
+        next_bank_transaction, [order.id], eta, order.task_id_celery
+    )
+
+
+def schedule_next_charge(order):
+    """
+    Записывает задачу следующего списания по заказу в исходящие в
+    текущей транзакции: при откате транзакции задача не публикуется.
+    """
+    build_next_charge(order).save(force_insert=True)
+
+
+def create_subscription_order(user, subscription, validated_data):
+    """
+    Создает и оплачивает заказ подписки в одной транзакции.
+
+    Запросы к базе: INSERT заказа, условный UPDATE баланса, один INSERT
+    транзакций и INSERT задачи следующего списания в исходящие.
+    """
+    order = SubscriptionUserOrder(
         user=user,
-        order=subscription_order,
-        amount=price,
-        transaction_type='DEBIT',
-        transaction_date=subscription_order.due_date,
-        status='PENDING',
+        subscription=subscription,
+        due_date=timezone.now()
+        + relativedelta(months=validated_data['tariff'].period),
+        task_id_celery=uuid(),
+        **validated_data,
     )
+    with transaction.atomic():
+        order.save(force_insert=True)
+        schedule_next_charge(order)
+        bank_operation(user, subscription, order.tariff, order)
+    invalidate_dashboard(user.id)
+    return order
+
+
+def resume_subscription_order(user, subscription_id):
+    """
+    Возобновляет оплату подписки пользователя в одной транзакции.
+
+    Запросы к базе: выборка заказа с подпиской и тарифом с блокировкой
+    строки заказа, условный UPDATE баланса, один INSERT транзакций,
+    INSERT задачи следующего списания в исходящие и UPDATE заказа.
+    Блокировка исключает повторное возобновление параллельным запросом.
+    Ошибки (подписка уже оплачена, недостаточно средств) выбрасываются
+    как django.core.exceptions.ValidationError.
+    """
+    with transaction.atomic():
+        order = (
+            SubscriptionUserOrder.objects.select_related(
+                'subscription', 'tariff'
+            )
+            .select_for_update(of=('self',))
+            .get(user=user, subscription_id=subscription_id)
+        )
+        if order.pay_status:
+            raise ValidationError(
+                'Подписка уже оплачена и не может быть возобновлена'
+            )
+        if ChargeRetry.objects.filter(order=order).delete()[0]:
+            # Списание после отказа еще ожидалось: оплата выполняется
+            # сейчас, ожидающее списание больше не нужно.
+            Transaction.objects.filter(
+                order=order, transaction_type='DEBIT', status='PENDING'
+            ).delete()
+        order.due_date = timezone.now() + relativedelta(
+            months=order.tariff.period
+        )
+        order.pay_status = True
+        order.task_id_celery = uuid()
+        schedule_next_charge(order)
+        try:
+            bank_operation(user, order.subscription, order.tariff, order)
+        except serializers.ValidationError as e:
+            raise ValidationError(e.detail) from e
+        order.save(update_fields=['due_date', 'pay_status', 'task_id_celery'])
+    invalidate_dashboard(user.id)
+    return order
+
+
+def cancel_user_subscription(user, subscription_id):
+    """
+    Отменяет подписку пользователя в одной транзакции.
+
+    Ожидающее списание удаляется, а задача следующего списания
+    отвязывается от заказа и будет пропущена (еще не опубликованная
+    удаляется из исходящих). Статус оплаты и дата списания сбрасываются
+    задачей cancel_subscription_order в конце оплаченного периода.
+    Заказ из очереди повторных списаний отменяется сразу.
+    """
+    from .tasks import cancel_subscription_order
+
+    with transaction.atomic():
+        order = (
+            SubscriptionUserOrder.objects.select_related('subscription')
+            .select_for_update(of=('self',))
+            .get(user=user, subscription_id=subscription_id)
+        )
+        # Заказ в очереди повторных списаний не оплачен, но еще
+        # не отменен.
+        if (
+            not order.pay_status
+            and not ChargeRetry.objects.filter(order=order).delete()[0]
+        ):
+            raise ValidationError(
+                'Подписка уже отменена и не может быть отменена повторно.'
+            )
+        if order.task_id_celery:
+            cancel_outbox_task(order.task_id_celery)
+        Transaction.objects.get(
+            user=user,
+            order=order,
+            transaction_type='DEBIT',
+            status='PENDING',
+        ).delete()
+        order.task_id_celery = None
+        order.save(update_fields=['task_id_celery'])
+        if settings.TEST_CELERY:
+            eta = timezone.now() + relativedelta(seconds=10)
+        else:
+            eta = order.due_date
+        enqueue_task(cancel_subscription_order, [order.id], eta)
+    invalidate_dashboard(user.id)
+    return order
+
+
+def get_retry_slot(attempts, now=None):
+    """
+    Возвращает время следующей попытки списания после attempts неудачных:
+    задержка CHARGE_RETRY_DELAY удваивается с каждой попыткой, время
+    округляется вверх до начала слота CHARGE_RETRY_SLOT, чтобы попытки
+    собирались в общие слоты.
+    """
+    now = now or timezone.now()
+    delay = settings.CHARGE_RETRY_DELAY * 2 ** (attempts - 1)
+    slot = settings.CHARGE_RETRY_SLOT
+    return datetime.fromtimestamp(
+        math.ceil((now.timestamp() + delay) / slot) * slot, tz=timezone.utc
+    )
+
+
+def schedule_charge_retry(order):
+    """Ставит заказ в очередь повторных списаний после первого отказа."""
+    return ChargeRetry.objects.update_or_create(
+        order=order,
+        defaults={'attempts': 1, 'next_attempt_at': get_retry_slot(1)},
+    )[0]
+
+
+def charge_retried_orders(retries, now):
+    """
+    Списывает оплату по заказам повторных попыток, для которых баланс
+    пользователя уже проверен: удаление попыток, один UPDATE балансов,
+    удаление ожидавших списаний, один INSERT транзакций, один INSERT
+    задач следующих списаний в исходящие и один UPDATE заказов.
+
+    Если часть попыток уже удалена параллельно (отмена или возобновление
+    подписки), выбрасывается DatabaseError, и списание пачки должно
+    быть отменено откатом транзакции.
+    """
+    deleted = ChargeRetry.objects.filter(
+        id__in=[retry.id for retry in retries]
+    ).delete()[0]
+    if deleted != len(retries):
+        raise DatabaseError(
+            f'Удалено {deleted} из {len(retries)} повторных попыток: '
+            'очередь изменена параллельно.'
+        )
+    amounts = defaultdict(int)
+    orders = []
+    transactions = []
+    next_charges = []
+    for retry in retries:
+        order = retry.order
+        price = order.tariff.price_per_period
+        amounts[order.user_id] += price
+        order.due_date = now + relativedelta(months=order.tariff.period)
+        order.pay_status = True
+        order.task_id_celery = uuid()
+        next_charges.append(build_next_charge(order))
+        orders.append(order)
+        transactions += build_current_transactions(
+            order.user, order, price, order.subscription.cashback
+        )
+        transactions.append(build_future_transaction(order.user, order, price))
+
+    User.objects.filter(id__in=amounts).update(
+        balance=F('balance')
+        - Case(
+            *(
+                When(id=user_id, then=Value(amount))
+                for user_id, amount in amounts.items()
+            ),
+            output_field=IntegerField(),
+        )
+    )
+    Transaction.objects.filter(
+        order__in=orders, transaction_type='DEBIT', status='PENDING'
+    ).delete()
+    Transaction.objects.bulk_create(transactions)
+    TaskOutbox.objects.bulk_create(next_charges)
+    SubscriptionUserOrder.objects.bulk_update(
+        orders, ['due_date', 'pay_status', 'task_id_celery']
+    )
+
+
+def postpone_charge_retries(retries, now):
+    """
+    Переносит неудачные повторные попытки в следующий слот. Заказы,
+    исчерпавшие CHARGE_RETRY_MAX_ATTEMPTS попыток, отключаются до ручного
+    возобновления: ожидавшее списание удаляется, дата списания
+    сбрасывается.
+
+    Возвращает количество отключенных заказов.
+    """
+    by_attempts = defaultdict(list)
+    expired = []
+    for retry in retries:
+        if retry.attempts >= settings.CHARGE_RETRY_MAX_ATTEMPTS:
+            expired.append(retry)
+        else:
+            by_attempts[retry.attempts + 1].append(retry.id)
+    for attempts, ids in by_attempts.items():
+        ChargeRetry.objects.filter(id__in=ids).update(
+            attempts=attempts, next_attempt_at=get_retry_slot(attempts, now)
+        )
+    if expired:
+        order_ids = [retry.order_id for retry in expired]
+        Transaction.objects.filter(
+            order_id__in=order_ids,
+            transaction_type='DEBIT',
+            status='PENDING',
+        ).delete()
+        SubscriptionUserOrder.objects.filter(id__in=order_ids).update(
+            due_date=None
+        )
+        ChargeRetry.objects.filter(
+            id__in=[retry.id for retry in expired]
+        ).delete()
+    return len(expired)
+
+
+def retry_failed_charges(chunk_size=CHARGE_RETRY_CHUNK_SIZE):
+    """
+    Выполняет повторные списания, время которых наступило.
+
+    Попытки обрабатываются пачками по chunk_size, каждая пачка - в одной
+    транзакции. Балансы пользователей пачки выбираются одним запросом с
+    блокировкой строк и распределяются по заказам в порядке постановки
+    в очередь, поэтому списание выполняется только по заказам, которые
+    пользователь может оплатить, без отдельных задач и заведомо
+    неудачных транзакций по каждому заказу.
+
+    Попытки выбираются с блокировкой строк попыток и заказов, поэтому
+    отмена или возобновление подписки ждет окончания пачки. Попытки,
+    заказы которых уже заблокированы отменой или возобновлением,
+    пропускаются и обрабатываются следующим запуском, если еще остались
+    в очереди.
+
+    Возвращает количество оплаченных, перенесенных и отключенных заказов.
+    """
+    now = timezone.now()
+    stats = {'paid': 0, 'postponed': 0, 'expired': 0}
+    users = set()
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            retries = list(
+                ChargeRetry.objects.select_related(
+                    'order__user', 'order__subscription', 'order__tariff'
+                )
+                .select_for_update(skip_locked=True, of=('self', 'order'))
+                .filter(next_attempt_at__lte=now, id__gt=last_id)
+                .order_by('id')[:chunk_size]
+            )
+            if not retries:
+                break
+            last_id = retries[-1].id
+            balances = dict(
+                User.objects.select_for_update()
+                .filter(id__in={retry.order.user_id for retry in retries})
+                .values_list('id', 'balance')
+            )
+            paid = []
+            declined = []
+            for retry in retries:
+                price = retry.order.tariff.price_per_period
+                balance = balances[retry.order.user_id]
+                if balance is not None and balance >= price:
+                    balances[retry.order.user_id] = balance - price
+                    paid.append(retry)
+                else:
+                    declined.append(retry)
+            if paid:
+                charge_retried_orders(paid, now)
+            expired = postpone_charge_retries(declined, now)
+        users.update(retry.order.user_id for retry in paid)
+        stats['paid'] += len(paid)
+        stats['postponed'] += len(declined) - expired
+        stats['expired'] += expired
+        for retry in paid:
+            transaction_logger.info(
+                f'Повторное списание по заказу {retry.order_id} выполнено'
+            )
+    for user_id in users:
+        invalidate_dashboard(user_id)
+    return stats
 
 
 def get_cashback_transactions_period():
@@ -118,12 +554,53 @@ def get_cashback_transactions_period():
     return start_date, end_date
 
 
+def get_month_range(year, month=None):
+    """
+    Возвращает границы [начало, конец) года или месяца
+    в текущей временной зоне.
+    """
+    start = timezone.make_aware(datetime(year, month or 1, 1))
+    end = start + relativedelta(months=1 if month else 12)
+    return start, end
+
+
+def get_archive_boundary():
+    """
+    Возвращает начало самого раннего месяца, транзакции которого
+    хранятся в основной таблице. Завершенные транзакции более ранних
+    месяцев могут находиться в архиве.
+    """
+    month_start = timezone.localtime().replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+    return month_start - relativedelta(
+        months=settings.TRANSACTION_ARCHIVE_MONTHS
+    )
+
+
+def get_history_period_start(params):
+    """
+    Возвращает нижнюю границу периода по очищенным параметрам
+    фильтра истории или None, если период не ограничен снизу.
+    """
+    bounds = []
+    if params.get('year'):
+        start, _ = get_month_range(params['year'], params.get('month'))
+        bounds.append(start)
+    if params.get('start_date'):
+        bounds.append(
+            timezone.make_aware(datetime.combine(params['start_date'], time()))
+        )
+    return max(bounds) if bounds else None
+
+
 def get_transaction_totals(
     queryset_filtered,
     queryset,
     queryset_cashback,
     current_date,
     next_month_date,
+    queryset_archive_filtered=None,
 ):
     """
     Вычисляет общие суммы транзакций для различных категорий.
@@ -134,6 +611,8 @@ def get_transaction_totals(
     - queryset_cashback (QuerySet): QuerySet транзакций кешбека.
     - current_date (datetime): Текущая дата.
     - next_month_date (datetime): Дата следующего месяца.
+    - queryset_archive_filtered (QuerySet, optional): Фильтрованный QuerySet
+      архивных транзакций списания, учитывается в total_param.
 
     Возвращает:
     - total_current_month (int): Общая сумма транзакций списания пользователя за текущий месяц.
@@ -145,6 +624,12 @@ def get_transaction_totals(
     total_param = queryset_filtered.aggregate(total_param=Sum('amount'))[
         'total_param'
     ]
+    if queryset_archive_filtered is not None:
+        total_archive = queryset_archive_filtered.aggregate(
+            total_archive=Sum('amount')
+        )['total_archive']
+        if total_archive is not None:
+            total_param = (total_param or 0) + total_archive
 
     total_next_month = queryset.filter(
         transaction_date__month=next_month_date.month
@@ -164,3 +649,459 @@ def get_transaction_totals(
         'total_param': total_param,
         'total_cashback': total_cashback,
     }
+
+
+def get_dashboard_totals(user):
+    """
+    Вычисляет суммы для экрана "Мои подписки" одним запросом.
+
+    Возвращает:
+    - total_current_month (int): Сумма списаний за текущий месяц.
+    - total_next_month (int): Сумма списаний за следующий месяц.
+    - total_cashback (int): Сумма кешбека за текущий период выплаты.
+    """
+    today = timezone.localdate()
+    current_start, current_end = get_month_range(today.year, today.month)
+    next_start, next_end = get_month_range(current_end.year, current_end.month)
+    cashback_start, cashback_end = get_cashback_transactions_period()
+    return Transaction.objects.filter(user=user).aggregate(
+        total_current_month=Coalesce(
+            Sum(
+                'amount',
+                filter=Q(
+                    transaction_type='DEBIT',
+                    transaction_date__gte=current_start,
+                    transaction_date__lt=current_end,
+                ),
+            ),
+            0,
+        ),
+        total_next_month=Coalesce(
+            Sum(
+                'amount',
+                filter=Q(
+                    transaction_type='DEBIT',
+                    transaction_date__gte=next_start,
+                    transaction_date__lt=next_end,
+                ),
+            ),
+            0,
+        ),
+        total_cashback=Coalesce(
+            Sum(
+                'amount',
+                filter=Q(
+                    transaction_type='CASHBACK',
+                    transaction_date__gte=cashback_start,
+                    transaction_date__lte=cashback_end,
+                ),
+            ),
+            0,
+        ),
+    )
+
+
+def get_dashboard_cache_key(user_id):
+    """
+    Возвращает ключ снимка экрана "Мои подписки". Ключ включает
+    текущую дату, поэтому со сменой месяца и периода кешбека снимок
+    пересчитывается.
+    """
+    return DASHBOARD_CACHE_KEY.format(
+        user_id=user_id, date=timezone.localdate().isoformat()
+    )
+
+
+def get_forecast_cache_key(user_id):
+    """Возвращает ключ прогноза списаний пользователя на текущую дату."""
+    return FORECAST_CACHE_KEY.format(
+        user_id=user_id, date=timezone.localdate().isoformat()
+    )
+
+
+def get_params_hash(params):
+    """Возвращает хеш параметров запроса, не зависящий от их порядка."""
+    return hashlib.md5(json.dumps(sorted(params.lists())).encode()).hexdigest()
+
+
+def get_catalog_cache_key(params):
+    """
+    Возвращает ключ кеша списка каталога для параметров запроса. Ключ
+    включает версии каталога и тарифов, поэтому изменения сервисов,
+    импорт и изменение цен сразу сбрасывают кеш списка.
+    """
+    return CATALOG_CACHE_KEY.format(
+        catalog_version=get_catalog_version(),
+        tariffs_version=get_tariffs_version(),
+        params=get_params_hash(params),
+    )
+
+
+def get_history_info_cache_key(user_id, params):
+    """
+    Возвращает ключ кеша сумм операций пользователя для параметров
+    запроса. Ключ включает версию, которая меняется при сбросе кеша
+    пользователя, поэтому сбрасываются суммы для всех параметров.
+    """
+    version = cache.get_or_set(
+        HISTORY_INFO_VERSION_KEY.format(user_id=user_id), uuid, timeout=None
+    )
+    return HISTORY_INFO_CACHE_KEY.format(
+        user_id=user_id,
+        version=version,
+        date=timezone.localdate().isoformat(),
+        params=get_params_hash(params),
+    )
+
+
+def invalidate_dashboard(user_id):
+    """
+    Сбрасывает снимок экрана "Мои подписки", прогноз списаний и суммы
+    операций пользователя после фиксации текущей транзакции.
+    """
+    transaction.on_commit(
+        lambda: cache.delete_many(
+            [
+                get_dashboard_cache_key(user_id),
+                get_forecast_cache_key(user_id),
+                HISTORY_INFO_VERSION_KEY.format(user_id=user_id),
+            ]
+        )
+    )
+
+
+def get_subscription_tariffs(subscription_ids):
+    """
+    Возвращает тарифы существующих сервисов из subscription_ids в виде
+    {subscription_id: [Tariff, ...]}.
+
+    Тарифы каждого сервиса хранятся в кеше под ключом с версией тарифов
+    и читаются одним обращением к кешу. Тарифы сервисов, которых нет в
+    кеше, загружаются из основной базы одним запросом, для сервисов без
+    тарифов дополнительно проверяется их существование.
+    """
+    version = get_tariffs_version()
+    keys = {
+        subscription_id: TARIFFS_CACHE_KEY.format(
+            version=version, subscription_id=subscription_id
+        )
+        for subscription_id in subscription_ids
+    }
+    cached = cache.get_many(keys.values())
+    tariffs = {
+        subscription_id: cached[key]
+        for subscription_id, key in keys.items()
+        if key in cached
+    }
+    missing = set(keys) - set(tariffs)
+    if not missing:
+        return tariffs
+
+    loaded = defaultdict(list)
+    with primary_reads():
+        for tariff in Tariff.objects.filter(
+            subscription_id__in=missing
+        ).order_by('id'):
+            loaded[tariff.subscription_id].append(tariff)
+        without_tariffs = missing - set(loaded)
+        if without_tariffs:
+            for subscription_id in Subscription.objects.filter(
+                id__in=without_tariffs
+            ).values_list('id', flat=True):
+                loaded[subscription_id] = []
+    cache.set_many(
+        {
+            keys[subscription_id]: subscription_tariffs
+            for subscription_id, subscription_tariffs in loaded.items()
+        },
+        settings.TARIFFS_CACHE_TIMEOUT,
+    )
+    tariffs.update(loaded)
+    return tariffs
+
+
+def get_active_orders():
+    """
+    Возвращает действующие заказы: оплаченные и с запланированным
+    списанием. После отмены подписки ожидающее списание удаляется,
+    хотя статус оплаты сохраняется до конца оплаченного периода.
+    """
+    return SubscriptionUserOrder.objects.filter(
+        Exists(
+            Transaction.objects.filter(
+                order=OuterRef('pk'),
+                transaction_type='DEBIT',
+                status='PENDING',
+            )
+        ),
+        pay_status=True,
+        due_date__isnull=False,
+    )
+
+
+def get_active_charges(user=None):
+    """
+    Возвращает действующие заказы, сгруппированные по пользователю,
+    месяцу следующего списания и периоду тарифа, с суммой и количеством
+    списаний в группе.
+    """
+    orders = get_active_orders()
+    if user is not None:
+        orders = orders.filter(user=user)
+    return (
+        orders.annotate(due_month=TruncMonth('due_date'))
+        .values('user_id', 'due_month', 'tariff__period')
+        .annotate(amount=Sum('tariff__price_per_period'), charges=Count('id'))
+        .order_by()
+    )
+
+
+def get_renewal_messages(orders):
+    """
+    Группирует заказы по пользователю в сообщения напоминания.
+
+    Возвращает список словарей с полями user_id, email и orders.
+    """
+    messages = {}
+    for order in orders:
+        message = messages.setdefault(
+            order['user_id'],
+            {
+                'user_id': order['user_id'],
+                'email': order['email'],
+                'orders': [],
+            },
+        )
+        message['orders'].append(
+            {
+                'order_id': order['id'],
+                'subscription': order['subscription__name'],
+                'amount': order['tariff__price_per_period'],
+                'due_date': timezone.localtime(order['due_date']),
+            }
+        )
+    return list(messages.values())
+
+
+def send_renewal_reminders(
+    days=None, chunk_size=RENEWAL_CHUNK_SIZE, backend=None
+):
+    """
+    Отправляет напоминания о списаниях в ближайшие days дней.
+
+    Заказы выбираются пачками по chunk_size пользователей по индексу
+    (пользователь, дата списания), поэтому все заказы пользователя
+    попадают в одно сообщение. Сообщения пачки отправляются бэкендом
+    RENEWAL_NOTIFICATION_BACKEND в RENEWAL_NOTIFICATION_WORKERS потоков,
+    отметка об отправке ставится доставленным заказам одним UPDATE на
+    пачку. Напоминание по заказу отправляется один раз для каждой даты
+    списания, недоставленные напоминания повторяются при следующем
+    запуске.
+
+    Возвращает количество пользователей, заказов и недоставленных
+    сообщений.
+    """
+    now = timezone.now()
+    days = settings.RENEWAL_REMINDER_DAYS if days is None else days
+    orders = (
+        get_active_orders()
+        .filter(due_date__gte=now, due_date__lt=now + relativedelta(days=days))
+        .exclude(reminder_due_date=F('due_date'))
+    )
+    backend = backend or get_notification_backend()
+    stats = {'users': 0, 'orders': 0, 'failed': 0}
+
+    backend.open()
+    try:
+        with ThreadPoolExecutor(
+            max_workers=settings.RENEWAL_NOTIFICATION_WORKERS
+        ) as executor:
+            last_user_id = 0
+            while True:
+                user_ids = list(
+                    orders.filter(user_id__gt=last_user_id)
+                    .order_by('user_id')
+                    .values_list('user_id', flat=True)
+                    .distinct()[:chunk_size]
+                )
+                if not user_ids:
+                    break
+                last_user_id = user_ids[-1]
+
+                messages = get_renewal_messages(
+                    orders.filter(user_id__in=user_ids).values(
+                        'id',
+                        'user_id',
+                        'email',
+                        'due_date',
+                        'subscription__name',
+                        'tariff__price_per_period',
+                    )
+                )
+                delivered = []
+                for message, sent in zip(
+                    messages, executor.map(backend.send, messages)
+                ):
+                    if sent:
+                        delivered.extend(
+                            order['order_id'] for order in message['orders']
+                        )
+                    else:
+                        stats['failed'] += 1
+                SubscriptionUserOrder.objects.filter(id__in=delivered).update(
+                    reminder_due_date=F('due_date')
+                )
+                stats['users'] += len(messages)
+                stats['orders'] += len(delivered)
+    finally:
+        backend.close()
+    return stats
+
+
+def get_charges_forecast(months, user=None):
+    """
+    Прогнозирует списания по месяцам на months месяцев, начиная с
+    текущего.
+
+    Заказы выбираются одним запросом, сгруппированными по месяцу
+    следующего списания и периоду тарифа. Каждая группа повторяется
+    через период тарифа до конца горизонта, поэтому объем вычислений
+    зависит от количества групп, а не заказов. Просроченные списания
+    относятся к текущему месяцу.
+
+    Возвращает словарь {user_id: [[amount, charges], ...]} с суммой и
+    количеством списаний по месяцам горизонта.
+    """
+    today = timezone.localdate()
+    forecast = defaultdict(lambda: [[0, 0] for _ in range(months)])
+    for row in get_active_charges(user).iterator():
+        due_month = timezone.localtime(row['due_month'])
+        offset = max(
+            (due_month.year - today.year) * 12 + due_month.month - today.month,
+            0,
+        )
+        buckets = forecast[row['user_id']]
+        for index in range(offset, months, row['tariff__period']):
+            buckets[index][0] += row['amount']
+            buckets[index][1] += row['charges']
+    return forecast
+
+
+def get_forecast_months(months):
+    """Возвращает первые дни месяцев горизонта прогноза."""
+    start = timezone.localdate().replace(day=1)
+    return [start + relativedelta(months=index) for index in range(months)]
+
+
+def get_user_forecast(user):
+    """
+    Возвращает прогноз списаний пользователя на FORECAST_MONTHS месяцев:
+    суммы и количество списаний по месяцам и итог за горизонт.
+    """
+    buckets = get_charges_forecast(settings.FORECAST_MONTHS, user).get(
+        user.id, [[0, 0]] * settings.FORECAST_MONTHS
+    )
+    return {
+        'months': [
+            {'month': month, 'amount': amount, 'charges': charges}
+            for month, (amount, charges) in zip(
+                get_forecast_months(settings.FORECAST_MONTHS), buckets
+            )
+        ],
+        'total': sum(amount for amount, _ in buckets),
+    }
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_transactions(rows, file_format):
+    """
+    Построчно формирует выгрузку транзакций в формате CSV или JSONL.
+
+    Аргументы:
+    - rows (iterable): Кортежи значений в порядке EXPORT_FIELDS.
+    - file_format (str): Формат выгрузки, ключ EXPORT_FORMATS.
+    """
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        row = list(row)
+        row[1] = timezone.localtime(row[1]).isoformat()
+        if file_format == 'csv':
+            yield writer.writerow(row)
+        else:
+            record = dict(zip(EXPORT_HEADERS, row))
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def _cache_favorite_ids(user_id):
+    """
+    Читает избранное пользователя из основной базы и записывает его
+    в кеш.
+    """
+    with primary_reads():
+        favorite_ids = frozenset(
+            IsFavoriteSubscription.objects.filter(user_id=user_id).values_list(
+                'subscription_id', flat=True
+            )
+        )
+    cache.set(
+        FAVORITES_CACHE_KEY.format(user_id=user_id),
+        favorite_ids,
+        settings.FAVORITES_CACHE_TIMEOUT,
+    )
+    return favorite_ids
+
+
+def get_favorite_ids(user):
+    """
+    Возвращает множество id сервисов в избранном пользователя.
+
+    Множество хранится в кеше и при промахе заполняется из БД.
+    """
+    favorite_ids = cache.get(FAVORITES_CACHE_KEY.format(user_id=user.id))
+    if favorite_ids is None:
+        favorite_ids = _cache_favorite_ids(user.id)
+    return favorite_ids
+
+
+def update_favorites(user, add=(), remove=()):
+    """
+    Добавляет и удаляет сервисы из избранного пользователя.
+
+    Изменения записываются в таблицу в одной транзакции. После ее
+    фиксации кеш избранного перечитывается из БД, поэтому параллельные
+    изменения из разных процессов не теряются.
+
+    Аргументы:
+    - user (User): Пользователь.
+    - add (iterable): id существующих сервисов для добавления.
+    - remove (iterable): id сервисов для удаления.
+
+    Возвращает:
+    - frozenset: id сервисов в избранном после изменения.
+    """
+    add, remove = set(add), set(remove)
+    with transaction.atomic():
+        if add:
+            IsFavoriteSubscription.objects.bulk_create(
+                [
+                    IsFavoriteSubscription(
+                        user_id=user.id, subscription_id=subscription_id
+                    )
+                    for subscription_id in add
+                ],
+                ignore_conflicts=True,
+            )
+        if remove:
+            IsFavoriteSubscription.objects.filter(
+                user_id=user.id, subscription_id__in=remove
+            ).delete()
+        transaction.on_commit(lambda: _cache_favorite_ids(user.id))
+    return get_favorite_ids(user)
@@ -1,18 +1,29 @@
 import logging
+from datetime import timedelta
 
 from celery import shared_task
 from celery.schedules import crontab
+from celery.utils import uuid
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import F, Sum
 from django.utils import timezone
 from subscriptions.models import SubscriptionUserOrder, Transaction
+from subscriptions.services import recalculate_popularity
 
 from backend.celery import app as celery_app
 
-from .services import current_transaction, future_transaction
+from .services import (
+    current_transaction,
+    future_transaction,
+    invalidate_dashboard,
+    retry_failed_charges,
+    schedule_charge_retry,
+    schedule_next_charge,
+    send_renewal_reminders,
+)
 
 User = get_user_model()
 TEST_CELERY = settings.TEST_CELERY
@@ -21,53 +32,106 @@ celery_logger = logging.getLogger('celery')
 
 @shared_task
 def next_bank_transaction(order_id):
-    """Задача для обработки следующей банковской транзакции."""
+    """
+    Задача для обработки следующей банковской транзакции.
+
+    Списание, транзакции и задача следующего списания в исходящих
+    фиксируются в одной транзакции. Задача выполняется, только если ее
+    идентификатор совпадает с task_id_celery заказа: повторная доставка
+    из исходящих и задачи отмененных заказов пропускаются.
+
+    При недостаточном балансе заказ отключается и ставится в очередь
+    повторных списаний. Возвращает результат списания для метрик задач:
+    paid, declined или skipped.
+
+    При ошибке транзакция откатывается целиком, и у заказа, если задача
+    еще актуальна, отключается только статус оплаты.
+    """
+    task_id = next_bank_transaction.request.id
     try:
         celery_logger.info(
             f'Начало выполнения транзакции списания по заказу {order_id}'
         )
-        order = SubscriptionUserOrder.objects.get(id=order_id)
-        user = order.user
-        price = order.tariff.price_per_period
-        cashback = order.subscription.cashback
         with transaction.atomic():
-            user.balance -= price
-            user.save(update_fields=['balance'])
-            trans = Transaction.objects.get(
-                user=user,
-                order=order,
-                transaction_type='DEBIT',
-                status='PENDING',
+            order = (
+                SubscriptionUserOrder.objects.select_related(
+                    'user', 'subscription', 'tariff'
+                )
+                .select_for_update(of=('self',))
+                .get(id=order_id)
             )
-            trans.status = 'PAID'
-            trans.save()
-        current_transaction(user, order, price, cashback)
-        new_due_date = timezone.now() + relativedelta(
-            months=order.tariff.period
-        )
-        order.due_date = new_due_date
-        future_transaction(user, order, price)
-
-        if TEST_CELERY:
-            task = next_bank_transaction.apply_async(
-                args=[order_id], eta=timezone.now() + relativedelta(seconds=10)
-            )
-        else:
-            task = next_bank_transaction.apply_async(
-                args=[order_id], eta=new_due_date
+            if task_id and order.task_id_celery != task_id:
+                celery_logger.info(
+                    f'Задача {task_id} списания по заказу {order_id} '
+                    f'неактуальна и пропущена'
+                )
+                return 'skipped'
+            user = order.user
+            price = order.tariff.price_per_period
+            cashback = order.subscription.cashback
+            charged = User.objects.filter(
+                id=user.id, balance__gte=price
+            ).update(balance=F('balance') - price)
+            if charged:
+                trans = Transaction.objects.get(
+                    user=user,
+                    order=order,
+                    transaction_type='DEBIT',
+                    status='PENDING',
+                )
+                trans.status = 'PAID'
+                trans.save()
+                current_transaction(user, order, price, cashback)
+                order.due_date = timezone.now() + relativedelta(
+                    months=order.tariff.period
+                )
+                future_transaction(user, order, price)
+                order.task_id_celery = uuid()
+                schedule_next_charge(order)
+                order.save()
+            else:
+                order.pay_status = False
+                order.save(update_fields=['pay_status'])
+                retry = schedule_charge_retry(order)
+        invalidate_dashboard(order.user_id)
+        if not charged:
+            celery_logger.info(
+                f'Недостаточно средств для списания по заказу {order_id}, '
+                f'повторная попытка {retry.next_attempt_at}'
             )
-        order.task_id_celery = task.id
-        order.save()
+            return 'declined'
         celery_logger.info(
             f'Успешная транзакции списания по заказу {order_id}'
         )
+        return 'paid'
 
     except Exception as e:
         celery_logger.error(
             f'Ошибка при попытке списания по заказу {order_id}: {e}'
         )
-        order.pay_status = False
-        order.save()
+        orders = SubscriptionUserOrder.objects.filter(id=order_id)
+        if task_id:
+            orders = orders.filter(task_id_celery=task_id)
+        if orders.update(pay_status=False):
+            invalidate_dashboard(
+                orders.values_list('user_id', flat=True).first()
+            )
+        return 'declined'
+
+
+@shared_task
+def retry_charges():
+    """Выполняет повторные списания, время которых наступило."""
+    try:
+        celery_logger.info('Начало повторных списаний')
+        stats = retry_failed_charges()
+        celery_logger.info(
+            f'Повторные списания: оплачено {stats["paid"]}, '
+            f'перенесено {stats["postponed"]}, '
+            f'отключено {stats["expired"]}'
+        )
+    except Exception as e:
+        celery_logger.error(f'Ошибка при повторных списаниях: {e}')
 
 
 @shared_task
@@ -81,10 +145,14 @@ def cancel_subscription_order(order_id):
             f'Начало выполнения обновления статуса оплаты и '
             f'даты следующего списания по заказу {order_id} после отмены'
         )
-        order = SubscriptionUserOrder.objects.get(id=order_id)
-        order.pay_status = False
-        order.due_date = None
-        order.save()
+        # Заказ с новой задачей списания после отмены уже возобновлен.
+        orders = SubscriptionUserOrder.objects.filter(
+            id=order_id, task_id_celery__isnull=True
+        )
+        if orders.update(pay_status=False, due_date=None):
+            invalidate_dashboard(
+                orders.values_list('user_id', flat=True).first()
+            )
         celery_logger.info(
             f'Успешное выполнение обновления статуса оплаты и '
             f'даты следующего списания по заказу {order_id} после отмены'
@@ -118,19 +186,60 @@ def pay_cashback():
                 user.balance += cashback_amount
                 user.save(update_fields=['balance'])
                 transactions.filter(user=user).update(status='CREDITED')
+                invalidate_dashboard(user.id)
         celery_logger.info(f'Весь кешбек успешно выплачен {timezone.now}')
     except Exception as e:
         celery_logger.info(f'При выплате кешбека произошла ошибка: {e}')
 
 
-if TEST_CELERY:
-    from datetime import timedelta
+@shared_task
+def update_popularity():
+    """Пересчитывает рейтинг сервисов по активности."""
+    try:
+        celery_logger.info('Начало пересчета рейтинга по активности')
+        changed = recalculate_popularity()
+        celery_logger.info(
+            f'Рейтинг по активности пересчитан, изменен у {changed} сервисов'
+        )
+    except Exception as e:
+        celery_logger.error(f'Ошибка при пересчете рейтинга: {e}')
 
+
+@shared_task
+def send_reminders():
+    """
+    Отправляет напоминания о списаниях в ближайшие
+    RENEWAL_REMINDER_DAYS дней пачками, сгруппированными по пользователям.
+    """
+    try:
+        celery_logger.info('Начало отправки напоминаний о списаниях')
+        stats = send_renewal_reminders()
+        celery_logger.info(
+            f'Напоминания отправлены: пользователей {stats["users"]}, '
+            f'заказов {stats["orders"]}, не доставлено {stats["failed"]}'
+        )
+    except Exception as e:
+        celery_logger.error(f'Ошибка при отправке напоминаний: {e}')
+
+
+if TEST_CELERY:
     celery_app.conf.beat_schedule = {
         'pay_cashback': {
             'task': 'api.v1.tasks.pay_cashback',
             'schedule': timedelta(seconds=30),
         },
+        'update_popularity': {
+            'task': 'api.v1.tasks.update_popularity',
+            'schedule': timedelta(seconds=60),
+        },
+        'send_reminders': {
+            'task': 'api.v1.tasks.send_reminders',
+            'schedule': timedelta(seconds=60),
+        },
+        'retry_charges': {
+            'task': 'api.v1.tasks.retry_charges',
+            'schedule': timedelta(seconds=30),
+        },
     }
 else:
     celery_app.conf.beat_schedule = {
@@ -138,4 +247,16 @@ else:
             'task': 'api.v1.tasks.pay_cashback',
             'schedule': crontab(day_of_month=25, hour=0, minute=0),
         },
+        'update_popularity': {
+            'task': 'api.v1.tasks.update_popularity',
+            'schedule': crontab(minute=0, hour=3),
+        },
+        'send_reminders': {
+            'task': 'api.v1.tasks.send_reminders',
+            'schedule': crontab(minute=0, hour=10),
+        },
+        'retry_charges': {
+            'task': 'api.v1.tasks.retry_charges',
+            'schedule': timedelta(seconds=settings.CHARGE_RETRY_SLOT),
+        },
     }
@@ -1,14 +1,11 @@
 from django.urls import include, path
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularRedocView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
 from rest_framework.routers import DefaultRouter
 
 from .views import (
     CategorySubscriptionViewSet,
     HistoryViewSet,
+    SchemaView,
     SubscriptionViewSet,
 )
 
@@ -21,7 +18,7 @@ router.register('history', HistoryViewSet, basename='history')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('schema/', SchemaView.as_view(), name='schema'),
     path(
         'docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='docs'
     ),
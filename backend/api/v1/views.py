@@ -1,11 +1,15 @@
 import logging
+from functools import lru_cache
+from heapq import merge
+from operator import attrgetter, itemgetter
 
-from celery.result import AsyncResult
+import yaml
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db import transaction
 from django.db.models import Min
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
@@ -15,20 +19,36 @@ from drf_spectacular.utils import (
     extend_schema,
     extend_schema_view,
 )
+from drf_spectacular.views import SpectacularAPIView
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
 from subscriptions.models import (
     CategorySubscription,
     Subscription,
     SubscriptionUserOrder,
-    Tariff,
     Transaction,
+    TransactionArchive,
+)
+
+from api.cache import single_flight
+from api.catalog_index import get_catalog_index
+from api.throttles import EndpointThrottle
+from backend.db_router import (
+    is_pinned_to_primary,
+    pin_to_primary,
+    primary_reads,
+    replica_reads,
 )
 
 from .filters import HistoryFilter, SubscriptionFilter
 from .serializers import (
+    TARIFFS_BULK_LIMIT,
     CategorySubscriptionSerializer,
+    DashboardSerializer,
+    ForecastSerializer,
+    FavoritesBulkSerializer,
     HistoryTransactionSerializator,
     InfoTransactionSerializator,
     IsFavoriteSerializer,
@@ -39,19 +59,91 @@ from .serializers import (
     SubscriptionDetailSerializer,
     SubscriptionOrderSerializer,
     SubscriptionSerializer,
+    SubscriptionTariffsSerializer,
+    TariffsBulkQuerySerializer,
     TariffSerializer,
 )
 from .services import (
-    bank_operation,
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FIELDS,
+    EXPORT_FORMATS,
+    cancel_user_subscription,
+    export_transactions,
+    get_archive_boundary,
     get_cashback_transactions_period,
+    get_dashboard_cache_key,
+    get_dashboard_totals,
+    get_catalog_cache_key,
+    get_favorite_ids,
+    get_forecast_cache_key,
+    get_history_info_cache_key,
+    get_history_period_start,
+    get_subscription_tariffs,
     get_transaction_totals,
+    get_user_forecast,
+    invalidate_dashboard,
+    resume_subscription_order,
 )
-from .tasks import cancel_subscription_order, next_bank_transaction
 
-TEST_CELERY = settings.TEST_CELERY
+# Общие ограничения частоты и ограничения действий из throttle_scopes.
+ENDPOINT_THROTTLE_CLASSES = (
+    *viewsets.GenericViewSet.throttle_classes,
+    EndpointThrottle,
+)
 client_logger = logging.getLogger('client')
 
 
+@lru_cache(maxsize=None)
+def load_pregenerated_schema():
+    """
+    Читает схему API, сгенерированную при сборке образа, или возвращает
+    None, если файла нет.
+    """
+    schema_file = settings.OPENAPI_SCHEMA_FILE
+    if not schema_file.exists():
+        return None
+    with open(schema_file, encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+class SchemaView(SpectacularAPIView):
+    """
+    Отдает схему API из файла OPENAPI_SCHEMA_FILE, если он есть,
+    иначе генерирует ее при запросе.
+    """
+
+    def _get_schema_response(self, request):
+        schema = load_pregenerated_schema()
+        if schema is None or request.GET.get('lang'):
+            return super()._get_schema_response(request)
+        return Response(
+            data=schema,
+            headers={
+                'Content-Disposition': (
+                    f'inline; filename="{self._get_filename(request, None)}"'
+                )
+            },
+        )
+
+
+class ReplicaReadMixin:
+    """
+    Выполняет чтения безопасных запросов на реплике, если пользователь
+    не изменял свои данные последние REPLICA_PIN_SECONDS секунд.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with primary_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not is_pinned_to_primary(
+            request.user.id
+        ):
+            replica_reads.set(True)
+
+
 @extend_schema(tags=['Сервисы подписок'])
 @extend_schema_view(
     list=extend_schema(
@@ -63,7 +155,7 @@ client_logger = logging.getLogger('client')
                 required=False,
                 description='Поля для сортировки',
                 type=str,
-                enum=['name', 'popular_rate'],
+                enum=['name', 'popular_rate', 'popularity_score'],
             ),
         ],
     ),
@@ -72,7 +164,10 @@ client_logger = logging.getLogger('client')
     ),
 )
 class SubscriptionViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    ReplicaReadMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
     """Позволяет просматривать список доступных подписок."""
 
@@ -80,8 +175,10 @@ class SubscriptionViewSet(
     serializer_class = SubscriptionSerializer
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     filterset_class = SubscriptionFilter
-    ordering_fields = ('name', 'popular_rate')
+    ordering_fields = ('name', 'popular_rate', 'popularity_score')
     ordering = ('-name',)
+    throttle_classes = ENDPOINT_THROTTLE_CLASSES
+    throttle_scopes = {'list': 'catalog'}
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -105,6 +202,95 @@ class SubscriptionViewSet(
             )
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """
+        Возвращает список сервисов. Список без признака избранного
+        хранится в общем кеше CATALOG_CACHE_TIMEOUT секунд или до изменения
+        версии каталога или тарифов, одновременные
+        промахи по одному ключу вычисляются одним запросом к базе.
+        Избранное пользователя накладывается на список из кеша. Фильтр
+        по избранному зависит от пользователя и не кешируется. При
+        CATALOG_INDEX список отдается из индекса каталога в памяти.
+        """
+        if settings.CATALOG_INDEX:
+            response = self.list_from_index(request)
+            if response is not None:
+                return response
+        if 'is_favorite' in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        def get_catalog():
+            # Ключ включает версии каталога и тарифов, которые меняются
+            # после фиксации изменений: реплика может их еще не содержать.
+            with primary_reads():
+                serializer = self.get_serializer(
+                    self.filter_queryset(self.get_queryset()), many=True
+                )
+                serializer.context['favorite_ids'] = frozenset()
+                return [dict(item) for item in serializer.data]
+
+        data = single_flight(
+            get_catalog_cache_key(request.query_params),
+            get_catalog,
+            settings.CATALOG_CACHE_TIMEOUT,
+            'catalog',
+        )
+        if request.user.is_authenticated:
+            favorite_ids = get_favorite_ids(request.user)
+            if favorite_ids:
+                data = [
+                    {**item, 'is_favorite': item['id'] in favorite_ids}
+                    for item in data
+                ]
+        return Response(data)
+
+    def get_index_items(self):
+        """
+        Возвращает сериализованный каталог без признака избранного,
+        упорядоченный по имени, для индекса каталога. Читает основную
+        базу: версия каталога меняется после фиксации изменений, и
+        реплика может еще не содержать их.
+        """
+        with primary_reads():
+            serializer = self.get_serializer(
+                self.get_queryset().order_by('name', 'id'), many=True
+            )
+            serializer.context['favorite_ids'] = frozenset()
+            return [dict(item) for item in serializer.data]
+
+    def list_from_index(self, request):
+        """
+        Возвращает список сервисов из индекса каталога в памяти процесса
+        (CATALOG_INDEX) с теми же параметрами фильтрации и сортировки,
+        что и SubscriptionFilter и OrderingFilter. При ошибках в
+        параметрах возвращает None, и запрос выполняется через базу.
+        """
+        filterset = self.filterset_class(
+            request.query_params, queryset=self.get_queryset(), request=request
+        )
+        if not filterset.is_valid():
+            return None
+        params = filterset.form.cleaned_data
+        index = get_catalog_index(self.get_index_items)
+        favorite_ids = None
+        if request.user.is_authenticated:
+            favorite_ids = get_favorite_ids(request.user)
+        data = index.query(
+            filters.OrderingFilter().get_ordering(
+                request, self.get_queryset(), self
+            ),
+            name=params.get('name'),
+            category=params.get('category'),
+            favorite_ids=favorite_ids,
+            is_favorite=params.get('is_favorite'),
+        )
+        if favorite_ids:
+            data = [
+                {**item, 'is_favorite': item['id'] in favorite_ids}
+                for item in data
+            ]
+        return Response(data)
+
     @extend_schema(
         responses={status.HTTP_200_OK: TariffSerializer(many=True)},
         summary='Получить все тарифы подписки',
@@ -112,8 +298,62 @@ class SubscriptionViewSet(
     @action(detail=True, methods=['get'], filterset_class=None)
     def tariffs(self, request, pk):
         """Получить все тарифы сервиса подписок."""
-        tariffs = Tariff.objects.filter(subscription=pk)
-        serializer = TariffSerializer(tariffs, many=True)
+        try:
+            subscription_id = int(pk)
+        except ValueError:
+            raise Http404
+        tariffs = get_subscription_tariffs([subscription_id])
+        if subscription_id not in tariffs:
+            raise Http404
+        serializer = TariffSerializer(tariffs[subscription_id], many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        responses={
+            status.HTTP_200_OK: SubscriptionTariffsSerializer(many=True)
+        },
+        summary='Получить тарифы нескольких сервисов',
+        parameters=[
+            OpenApiParameter(
+                location=OpenApiParameter.QUERY,
+                name='ids',
+                required=True,
+                type=str,
+                description=(
+                    'id сервисов через запятую (не больше '
+                    f'{TARIFFS_BULK_LIMIT}). Несуществующие сервисы '
+                    'в ответ не попадают.'
+                ),
+            )
+        ],
+    )
+    @action(
+        detail=False,
+        methods=['get'],
+        filterset_class=None,
+        url_path='tariffs',
+        url_name='bulk-tariffs',
+    )
+    def bulk_tariffs(self, request):
+        """
+        Возвращает тарифы нескольких сервисов одним запросом. Тарифы
+        берутся из того же кеша, что и тарифы одного сервиса.
+        """
+        query = TariffsBulkQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ids = query.validated_data['ids']
+        tariffs = get_subscription_tariffs(ids)
+        serializer = SubscriptionTariffsSerializer(
+            [
+                {
+                    'subscription': subscription_id,
+                    'tariffs': tariffs[subscription_id],
+                }
+                for subscription_id in ids
+                if subscription_id in tariffs
+            ],
+            many=True,
+        )
         return Response(serializer.data)
 
     @extend_schema(
@@ -153,6 +393,7 @@ class SubscriptionViewSet(
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        pin_to_primary(request.user.id)
         return Response(status=status.HTTP_201_CREATED)
 
     @extend_schema(
@@ -167,8 +408,28 @@ class SubscriptionViewSet(
             data={}, context={'request': request, 'sub_id': pk}
         )
         serializer.is_valid(raise_exception=True)
+        pin_to_primary(request.user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @extend_schema(
+        request=FavoritesBulkSerializer,
+        responses={status.HTTP_200_OK: FavoritesBulkSerializer},
+        summary='Изменить избранное списком сервисов',
+    )
+    @action(detail=False, methods=['post'], url_path='favorites')
+    def favorites(self, request):
+        """
+        Добавляет и удаляет несколько сервисов в избранном текущего
+        пользователя одним запросом.
+        """
+        serializer = FavoritesBulkSerializer(
+            data=request.data, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        pin_to_primary(request.user.id)
+        return Response(serializer.data)
+
     @extend_schema(
         request={
             'items': {
@@ -196,24 +457,12 @@ class SubscriptionViewSet(
             data=request.data, context={'request': request, 'sub_id': pk}
         )
         serializer.is_valid(raise_exception=True)
-        subscription = Subscription.objects.get(id=pk)
-        order = serializer.save(
-            user=self.request.user, subscription=subscription
-        )
-        if TEST_CELERY:
-            task = next_bank_transaction.apply_async(
-                args=[order.id], eta=timezone.now() + relativedelta(seconds=10)
-            )
-        else:
-            task = next_bank_transaction.apply_async(
-                args=[order.id], eta=order.due_date
-            )
-        order.task_id_celery = task.id
-        order.save()
+        order = serializer.save()
+        pin_to_primary(request.user.id)
 
         client_logger.info(
             f'Клиент {self.request.user.id} оформил подписку'
-            f'на сервис с id {subscription.id} - номер заказа {order.id}'
+            f'на сервис с id {order.subscription_id} - номер заказа {order.id}'
         )
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -233,45 +482,24 @@ class SubscriptionViewSet(
     def resume_order(self, request, pk):
         """Возобновляет подписку уже существовавшую ранее у пользователя."""
         try:
-            subscription = get_object_or_404(Subscription, id=pk)
-            order = SubscriptionUserOrder.objects.select_related(
-                'subscription'
-            ).get(user=request.user, subscription=subscription)
-            if order.pay_status:
-                raise ValidationError(
-                    'Подписка уже оплачена и не может быть возобновлена'
-                )
-            with transaction.atomic():
-                order.due_date = timezone.now() + relativedelta(
-                    months=(order.tariff.period)
-                )
-                bank_operation(
-                    self.request.user, subscription, order.tariff, order
-                )
-                order.pay_status = True
-            if TEST_CELERY:
-                task = next_bank_transaction.apply_async(
-                    args=[order.id],
-                    eta=(timezone.now() + relativedelta(seconds=10)),
-                )
-            else:
-                task = next_bank_transaction.apply_async(
-                    args=[order.id], eta=order.due_date
-                )
-            order.task_id_celery = task.id
-            order.save()
-            client_logger.info(
-                f'Клиент {self.request.user.id} возобновил подписку'
-                f'на сервис с id {subscription.id} - номер заказа {order.id}'
+            order = resume_subscription_order(request.user, pk)
+        except SubscriptionUserOrder.DoesNotExist:
+            return Response(
+                {'error': 'Подписка у пользователя не найдена.'},
+                status=status.HTTP_404_NOT_FOUND,
             )
-            return Response(status=status.HTTP_200_OK)
         except ValidationError as e:
             client_logger.error(
-                f'При попытке возобновить подписку на {subscription.id} '
+                f'При попытке возобновить подписку на {pk} '
                 f'у клиента {self.request.user.id} возникла ошибка {e}'
-                f'по номеру заказа {order.id}'
             )
             return Response({'error': e}, status=status.HTTP_400_BAD_REQUEST)
+        pin_to_primary(request.user.id)
+        client_logger.info(
+            f'Клиент {self.request.user.id} возобновил подписку'
+            f'на сервис с id {pk} - номер заказа {order.id}'
+        )
+        return Response(status=status.HTTP_200_OK)
 
     @extend_schema(
         tags=['Мои подписки'],
@@ -314,6 +542,93 @@ class SubscriptionViewSet(
         serializer = MySubscriptionSerializer(orders, many=True)
         return Response(serializer.data)
 
+    @extend_schema(
+        tags=['Мои подписки'],
+        summary='Получить снимок экрана "Мои подписки"',
+        responses={status.HTTP_200_OK: DashboardSerializer},
+    )
+    @action(detail=False, methods=['get'], filterset_class=None)
+    def dashboard(self, request):
+        """
+        Возвращает подписки пользователя с тарифами, датами и суммами
+        следующих списаний, а также суммы списаний за текущий и следующий
+        месяц и кешбек за текущий период.
+
+        Снимок хранится в кеше и сбрасывается при оформлении, отмене,
+        возобновлении подписки, смене тарифа и списаниях. Снимок строится
+        по основной базе, чтобы не закешировать данные отстающей реплики.
+        """
+        cache_key = get_dashboard_cache_key(request.user.id)
+        data = cache.get(cache_key)
+        if data is None:
+            with primary_reads():
+                orders = SubscriptionUserOrder.objects.filter(
+                    user=request.user
+                ).select_related('subscription', 'tariff')
+                data = DashboardSerializer(
+                    {
+                        'subscriptions': orders,
+                        **get_dashboard_totals(request.user),
+                    }
+                ).data
+            cache.set(cache_key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+        return Response(data)
+
+    @extend_schema(
+        tags=['Мои подписки'],
+        summary='Получить прогноз списаний по месяцам',
+        responses={status.HTTP_200_OK: ForecastSerializer},
+        parameters=[
+            OpenApiParameter(
+                location=OpenApiParameter.QUERY,
+                name='months',
+                required=False,
+                type=int,
+                description=(
+                    'Количество месяцев прогноза, начиная с текущего '
+                    f'(не больше {settings.FORECAST_MONTHS}).'
+                ),
+            )
+        ],
+    )
+    @action(detail=False, methods=['get'], filterset_class=None)
+    def forecast(self, request):
+        """
+        Возвращает прогноз списаний пользователя по месяцам по датам
+        следующих списаний и периодам тарифов действующих подписок.
+
+        Прогноз на весь горизонт хранится в кеше и сбрасывается вместе
+        со снимком экрана "Мои подписки".
+        """
+        months = request.query_params.get('months', settings.FORECAST_MONTHS)
+        try:
+            months = int(months)
+            if not 1 <= months <= settings.FORECAST_MONTHS:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {
+                    'error': 'Количество месяцев должно быть от 1 до '
+                    f'{settings.FORECAST_MONTHS}.'
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        cache_key = get_forecast_cache_key(request.user.id)
+        data = cache.get(cache_key)
+        if data is None:
+            with primary_reads():
+                data = ForecastSerializer(get_user_forecast(request.user)).data
+            cache.set(cache_key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+        if months < settings.FORECAST_MONTHS:
+            data = {
+                'months': data['months'][:months],
+                'total': sum(
+                    month['amount'] for month in data['months'][:months]
+                ),
+            }
+        return Response(data)
+
     @extend_schema(
         tags=['Мои подписки'],
         summary='Изменить тариф моей подписки',
@@ -359,6 +674,8 @@ class SubscriptionViewSet(
         )
         transaction_order.amount = order.tariff.price_per_period
         transaction_order.save()
+        invalidate_dashboard(request.user.id)
+        pin_to_primary(request.user.id)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -370,39 +687,9 @@ class SubscriptionViewSet(
     @action(detail=True, methods=['delete'])
     def cancel(self, request, pk):
         """Отменяет подписку пользователя на указанный сервис."""
+        subscription = get_object_or_404(Subscription, id=pk)
         try:
-            subscription = get_object_or_404(Subscription, id=pk)
-            order = SubscriptionUserOrder.objects.select_related(
-                'subscription'
-            ).get(user=request.user, subscription=subscription)
-            if not order.pay_status:
-                raise ValidationError(
-                    'Подписка уже отменена и не может быть отменена повторно.'
-                )
-            task_id = order.task_id_celery
-            if task_id:
-                AsyncResult(task_id).revoke(terminate=True)
-            Transaction.objects.get(
-                user=self.request.user,
-                order=order,
-                transaction_type='DEBIT',
-                status='PENDING',
-            ).delete()
-
-            if TEST_CELERY:
-                cancel_subscription_order.apply_async(
-                    args=[order.id],
-                    eta=timezone.now() + relativedelta(seconds=10),
-                )
-            else:
-                cancel_subscription_order.apply_async(
-                    args=[order.id], eta=order.due_date
-                )
-            client_logger.info(
-                f'Клиент {self.request.user.id} отменил подписку'
-                f'на сервис с id {subscription.id} - номер заказа {order.id}'
-            )
-            return Response(status=status.HTTP_200_OK)
+            order = cancel_user_subscription(request.user, subscription.id)
         except ObjectDoesNotExist:
             return Response(
                 {'error': 'Подписка у пользователя не найдена.'},
@@ -411,23 +698,20 @@ class SubscriptionViewSet(
         except ValidationError as e:
             client_logger.error(
                 f'У клиента {self.request.user.id} возникла ошибка {e} при '
-                f'попытке отменить подписку '
-                f'на сервис с id {subscription.id} - номер заказа {order.id}'
+                f'попытке отменить подписку на сервис с id {subscription.id}'
             )
             return Response({'error': e}, status=status.HTTP_400_BAD_REQUEST)
-
-    # def dispatch(self, request, *args, **kwargs):
-    #     res = super().dispatch(request, *args, **kwargs)
-    #     from django.db import connection
-    #     print(len(connection.queries))
-    #     for q in connection.queries:
-    #         print('>>>>>>', q['sql'])
-    #     return res
+        pin_to_primary(request.user.id)
+        client_logger.info(
+            f'Клиент {self.request.user.id} отменил подписку'
+            f'на сервис с id {subscription.id} - номер заказа {order.id}'
+        )
+        return Response(status=status.HTTP_200_OK)
 
 
 @extend_schema(tags=['Категории сервисов'], summary='Список всех категорий')
 class CategorySubscriptionViewSet(
-    mixins.ListModelMixin, viewsets.GenericViewSet
+    ReplicaReadMixin, mixins.ListModelMixin, viewsets.GenericViewSet
 ):
     """Возвращает список доступных категорий сервисов."""
 
@@ -436,13 +720,17 @@ class CategorySubscriptionViewSet(
 
 
 @extend_schema(tags=['История операций'], summary='Список всех операций')
-class HistoryViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class HistoryViewSet(
+    ReplicaReadMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
     """Позволяет просматривать истории транзакций."""
 
     serializer_class = HistoryTransactionSerializator
     filter_backends = (DjangoFilterBackend,)
     filterset_class = HistoryFilter
     queryset = Transaction.objects.all()
+    throttle_classes = ENDPOINT_THROTTLE_CLASSES
+    throttle_scopes = {'info': 'history_info'}
 
     def get_queryset(self):
         qs = Transaction.objects.filter(user=self.request.user)
@@ -452,6 +740,95 @@ class HistoryViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
             )
         return qs
 
+    def get_archive_queryset(self):
+        """
+        Возвращает архивные транзакции пользователя с учетом параметров
+        фильтрации. Если запрошенный период начинается позже границы
+        архива, запрос к архиву не выполняется.
+        """
+        filterset = self.filterset_class(
+            self.request.query_params,
+            queryset=TransactionArchive.objects.filter(user=self.request.user),
+            request=self.request,
+        )
+        if not filterset.is_valid():
+            return TransactionArchive.objects.none()
+        start = get_history_period_start(filterset.form.cleaned_data)
+        if start is not None and start >= get_archive_boundary():
+            return TransactionArchive.objects.none()
+        return filterset.qs
+
+    def list(self, request, *args, **kwargs):
+        """
+        Возвращает транзакции из основной таблицы и архива,
+        упорядоченные по убыванию даты.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        archive = (
+            self.get_archive_queryset()
+            .select_related('order')
+            .prefetch_related('order__subscription__categories')
+        )
+        transactions = merge(
+            queryset,
+            archive,
+            key=attrgetter('transaction_date'),
+            reverse=True,
+        )
+        serializer = self.get_serializer(transactions, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        tags=['История операций'],
+        summary='Выгрузить историю операций в CSV или JSONL',
+        responses={status.HTTP_200_OK: OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                name='file_format',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                enum=tuple(EXPORT_FORMATS),
+                description='Формат выгрузки (по умолчанию csv)',
+            ),
+        ],
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        """
+        Потоково выгружает историю транзакций пользователя с учетом
+        параметров фильтрации. Строки читаются из БД курсором частями
+        по EXPORT_CHUNK_SIZE, поэтому расход памяти не зависит
+        от количества транзакций.
+        """
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': 'Неподдерживаемый формат выгрузки'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        querysets = (
+            self.filter_queryset(self.get_queryset()),
+            self.get_archive_queryset(),
+        )
+        rows = merge(
+            *(
+                queryset.order_by('-transaction_date')
+                .values_list(*EXPORT_FIELDS)
+                .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+                for queryset in querysets
+            ),
+            key=itemgetter(1),
+            reverse=True,
+        )
+        response = StreamingHttpResponse(
+            export_transactions(rows, file_format),
+            content_type=EXPORT_FORMATS[file_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="history.{file_format}"'
+        )
+        return response
+
     @extend_schema(
         tags=['История операций'],
         summary='Траты за текущий и будущий месяц и по параметрам',
@@ -498,37 +875,47 @@ class HistoryViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         с учетом параметров фильтрации.
         - total_cashback (int): Сумма транзакций кешбека пользователя
         с 25 числа прошлого месяца до 25 числа текущего месяца.
+
+        Суммы хранятся в общем кеше и сбрасываются вместе со снимком
+        экрана "Мои подписки", одновременные промахи по одному ключу
+        вычисляются одним запросом к базе.
         """
-        queryset_filtered = self.filter_queryset(self.get_queryset()).filter(
-            transaction_type='DEBIT'
-        )
-        queryset = self.get_queryset().filter(transaction_type='DEBIT')
 
-        current_date = timezone.now()
-        next_month_date = current_date + relativedelta(months=1)
+        def get_info():
+            with primary_reads():
+                queryset_filtered = self.filter_queryset(
+                    self.get_queryset()
+                ).filter(transaction_type='DEBIT')
+                queryset = self.get_queryset().filter(transaction_type='DEBIT')
+                queryset_archive_filtered = self.get_archive_queryset().filter(
+                    transaction_type='DEBIT'
+                )
 
-        start_date, end_date = get_cashback_transactions_period()
-        queryset_cashback = self.get_queryset().filter(
-            transaction_date__gte=start_date,
-            transaction_date__lte=end_date,
-            transaction_type='CASHBACK',
-        )
+                current_date = timezone.now()
+                next_month_date = current_date + relativedelta(months=1)
 
-        totals = get_transaction_totals(
-            queryset_filtered,
-            queryset,
-            queryset_cashback,
-            current_date,
-            next_month_date,
-        )
+                start_date, end_date = get_cashback_transactions_period()
+                queryset_cashback = self.get_queryset().filter(
+                    transaction_date__gte=start_date,
+                    transaction_date__lte=end_date,
+                    transaction_type='CASHBACK',
+                )
 
-        serializer = InfoTransactionSerializator(totals)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+                totals = get_transaction_totals(
+                    queryset_filtered,
+                    queryset,
+                    queryset_cashback,
+                    current_date,
+                    next_month_date,
+                    queryset_archive_filtered,
+                )
 
-    # def dispatch(self, request, *args, **kwargs):
-    #     res = super().dispatch(request, *args, **kwargs)
-    #     from django.db import connection
-    #     print(len(connection.queries))
-    #     for q in connection.queries:
-    #         print('>>>>>>', q['sql'])
-    #     return res
+                return InfoTransactionSerializator(totals).data
+
+        data = single_flight(
+            get_history_info_cache_key(request.user.id, request.query_params),
+            get_info,
+            settings.DASHBOARD_CACHE_TIMEOUT,
+            'history_info',
+        )
+        return Response(data, status=status.HTTP_200_OK)
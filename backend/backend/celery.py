@@ -1,8 +1,11 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown
 from django.conf import settings
 
+from .log_handlers import stop_queued_handlers
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 VERSION_API = settings.VERSION_API
@@ -11,3 +14,18 @@ app = Celery('backend', include=[f'api.v{VERSION_API}.tasks'])
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.conf.broker_connection_retry_on_startup = True
 app.autodiscover_tasks()
+
+
+@worker_process_shutdown.connect
+def flush_queued_logs(**kwargs):
+    """Дописывает логи из очередей перед завершением процесса пула."""
+    stop_queued_handlers()
+
+
+# Обработчики сигналов, собирающие метрики задач.
+from . import task_metrics  # noqa: E402, F401
+
+if settings.PROFILE_TASKS:
+    from .profiling import connect_task_profiling  # noqa: E402
+
+    connect_task_profiling()
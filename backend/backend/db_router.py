@@ -0,0 +1,69 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA_PIN_CACHE_KEY = 'replica-pin:{user_id}'
+
+# Флаг устанавливается только на время безопасных запросов API
+# (ReplicaReadMixin), поэтому задачи Celery и все записи работают
+# с основной базой.
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Направляет чтения внутри блока в основную базу. Используется для
+    данных, которые сохраняются в кеш и не должны браться с отстающей
+    реплики.
+    """
+    token = replica_reads.set(False)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def pin_to_primary(user_id):
+    """
+    Направляет чтения пользователя в основную базу на время
+    REPLICA_PIN_SECONDS, чтобы после изменения он сразу видел свои
+    данные, даже если реплика отстает.
+    """
+    if settings.DATABASE_REPLICAS:
+        cache.set(
+            REPLICA_PIN_CACHE_KEY.format(user_id=user_id),
+            True,
+            settings.REPLICA_PIN_SECONDS,
+        )
+
+
+def is_pinned_to_primary(user_id):
+    """Проверяет, должен ли пользователь читать из основной базы."""
+    if not settings.DATABASE_REPLICAS or user_id is None:
+        return True
+    return bool(cache.get(REPLICA_PIN_CACHE_KEY.format(user_id=user_id)))
+
+
+class ReplicaRouter:
+    """
+    Роутер БД: чтения безопасных запросов API уходят на случайную
+    реплику из DATABASE_REPLICAS, остальные запросы - в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        if replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
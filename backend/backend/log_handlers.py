@@ -0,0 +1,75 @@
+"""
+Запись логов в файл из фонового потока: поток запроса только кладет
+запись в очередь, форматирование и запись в файл выполняет поток
+QueueListener.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import weakref
+from logging.handlers import QueueHandler, QueueListener
+
+_handlers = weakref.WeakSet()
+
+
+class QueuedFileHandler(QueueHandler):
+    """
+    Обработчик логов, который пишет записи в файл в фоновом потоке.
+
+    Поток запускается при первой записи в каждом процессе: процессы
+    gunicorn с preload_app и воркеры Celery создаются через fork, и
+    поток родительского процесса в них не работает. Записи, оставшиеся
+    в очереди, дописываются при завершении процесса; процессы пула
+    Celery завершаются через os._exit без atexit, поэтому для них
+    очередь дописывается по сигналу worker_process_shutdown.
+    """
+
+    def __init__(self, filename, encoding=None):
+        super().__init__(queue.SimpleQueue())
+        self.file_handler = logging.FileHandler(
+            filename, encoding=encoding, delay=True
+        )
+        self.listener = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+        _handlers.add(self)
+
+    def setFormatter(self, fmt):
+        self.file_handler.setFormatter(fmt)
+
+    def start(self):
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, self.file_handler)
+            self.listener.start()
+            self.pid = os.getpid()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Дописывает записи из очереди и останавливает поток."""
+        with self.start_lock:
+            if self.pid != os.getpid():
+                return
+            self.listener.stop()
+            self.pid = None
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def close(self):
+        self.stop()
+        self.file_handler.close()
+        super().close()
+
+
+def stop_queued_handlers():
+    """Дописывает очереди всех QueuedFileHandler текущего процесса."""
+    for handler in list(_handlers):
+        handler.stop()
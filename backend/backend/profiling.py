@@ -0,0 +1,136 @@
+"""
+Профилирование отдельных запросов и задач Celery по требованию: профиль
+Python (cProfile или семплирующий pyinstrument) и список SQL-запросов
+со временем выполнения сохраняются в файлы в PROFILE_DIR.
+
+Запросы профилируются по заголовку X-Profile с токеном PROFILING_TOKEN
+(api.middleware.ProfilingMiddleware), задачи - из списка PROFILE_TASKS.
+Без этих настроек middleware не подключается и обработчики сигналов
+не регистрируются.
+"""
+
+import cProfile
+import json
+import os
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.db import connections
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+active_tasks = {}
+
+
+class QueryRecorder:
+    """Обертка выполнения SQL, записывающая запросы и их время."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                {
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'params': repr(params),
+                    'duration_ms': round(
+                        (time.perf_counter() - start) * 1000, 3
+                    ),
+                }
+            )
+
+
+def get_profile_path(kind, name):
+    """Возвращает путь к файлам профиля без расширения."""
+    slug = re.sub(r'[^\w.-]+', '_', name).strip('_')
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    return os.path.join(settings.PROFILE_DIR, f'{kind}-{slug}-{stamp}')
+
+
+@contextmanager
+def profile(kind, name):
+    """
+    Профилирует код внутри блока и сохраняет профиль в <путь>.prof
+    (cProfile, для pstats и snakeviz) или <путь>.html (pyinstrument при
+    PROFILER=sampling), а SQL-запросы всех баз - в <путь>.sql.json.
+
+    Возвращает путь к файлам профиля без расширения.
+    """
+    path = get_profile_path(kind, name)
+    recorder = QueryRecorder()
+    sampling = settings.PROFILER == 'sampling' and SamplingProfiler
+    profiler = SamplingProfiler() if sampling else cProfile.Profile()
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        if sampling:
+            profiler.start()
+        else:
+            profiler.enable()
+        try:
+            yield path
+        finally:
+            if sampling:
+                profiler.stop()
+            else:
+                profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    if sampling:
+        with open(f'{path}.html', 'w', encoding='utf-8') as file:
+            file.write(profiler.output_html())
+    else:
+        profiler.dump_stats(f'{path}.prof')
+    with open(f'{path}.sql.json', 'w', encoding='utf-8') as file:
+        json.dump(
+            {
+                'kind': kind,
+                'name': name,
+                'duration_ms': round(elapsed * 1000, 3),
+                'query_count': len(recorder.queries),
+                'sql_ms': round(
+                    sum(query['duration_ms'] for query in recorder.queries),
+                    3,
+                ),
+                'queries': recorder.queries,
+            },
+            file,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+def start_task_profile(task_id=None, task=None, **kwargs):
+    if '*' not in settings.PROFILE_TASKS and (
+        task.name not in settings.PROFILE_TASKS
+    ):
+        return
+    stack = ExitStack()
+    stack.enter_context(profile('task', task.name))
+    active_tasks[task_id] = stack
+
+
+def finish_task_profile(task_id=None, **kwargs):
+    stack = active_tasks.pop(task_id, None)
+    if stack is not None:
+        stack.close()
+
+
+def connect_task_profiling():
+    """Включает профилирование задач из PROFILE_TASKS."""
+    task_prerun.connect(start_task_profile, weak=False)
+    task_postrun.connect(finish_task_profile, weak=False)
@@ -1,5 +1,6 @@
 # flake8: noqa
 import os
+import sys
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -23,6 +24,17 @@ VERSION_API = os.getenv('VERSION_API', '1')
 # В противном случае используем запланированное время выполнения для даты следующего списания.
 TEST_CELERY = os.getenv('TEST_CELERY', 'False').lower() == 'true'
 
+# Количество последних месяцев, транзакции которых хранятся в основной таблице.
+# Завершенные транзакции более ранних месяцев переносятся в архив командой archive_transactions.
+TRANSACTION_ARCHIVE_MONTHS = int(os.getenv('TRANSACTION_ARCHIVE_MONTHS', 12))
+
+# Значение True включает JSON-рендерер на orjson.
+FAST_JSON_RENDERER = os.getenv('FAST_JSON_RENDERER', 'False').lower() == 'true'
+
+# Значение True включает сжатие ответов (brotli или gzip) в приложении.
+# За nginx ответы сжимает nginx.
+COMPRESS_RESPONSES = os.getenv('COMPRESS_RESPONSES', 'False').lower() == 'true'
+
 DEFAULT_REDIS_HOST = os.getenv('DEFAULT_REDIS_HOST', 'redis')
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost').split(',')
@@ -59,6 +71,21 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if COMPRESS_RESPONSES:
+    MIDDLEWARE.insert(1, 'api.middleware.CompressionMiddleware')
+
+# Профилирование запросов по заголовку X-Profile с этим токеном
+# и задач Celery из списка через запятую (* - все задачи). Профиль:
+# cprofile или sampling (pyinstrument, если установлен).
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+PROFILE_TASKS = [
+    name for name in os.getenv('PROFILE_TASKS', '').split(',') if name
+]
+PROFILER = os.getenv('PROFILER', 'cprofile')
+
+if PROFILING_TOKEN:
+    MIDDLEWARE.insert(0, 'api.middleware.ProfilingMiddleware')
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -99,6 +126,33 @@ else:
         }
     }
 
+# Реплики для чтения через запятую: хосты Postgres или файлы SQLite
+# (для SQLite - заглушки реплик при локальном запуске и тестах).
+# В тестах реплики подменяются основной базой.
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(','))
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if USE_SQLITE:
+        DATABASES[alias]['NAME'] = BASE_DIR / location
+    else:
+        DATABASES[alias]['HOST'] = location
+    DATABASE_REPLICAS.append(alias)
+
+# Реплика для тестов роутера: отдельная тестовая база, включается
+# в DATABASE_REPLICAS через override_settings.
+if sys.argv[1:2] == ['test']:
+    DATABASES['replica'] = {**DATABASES['default']}
+    if not USE_SQLITE:
+        DATABASES['replica']['TEST'] = {'NAME': 'test_replica'}
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+
+# Сколько секунд после изменения данных пользователь читает из основной базы.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -147,8 +201,29 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer'
+        if FAST_JSON_RENDERER
+        else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Счетчики ограничений хранятся в общем кеше (CACHES).
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttles.AnonThrottle',
+        'api.throttles.UserThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_ANON_RATE', '300/min'),
+        'user': os.getenv('THROTTLE_USER_RATE', '600/min'),
+        # Частые запросы мобильных клиентов при каждом открытии экрана.
+        'catalog': os.getenv('THROTTLE_CATALOG_RATE', '60/min'),
+        'history_info': os.getenv('THROTTLE_HISTORY_INFO_RATE', '60/min'),
+    },
 }
 
+# Схема API, сгенерированная при сборке образа (manage.py spectacular).
+OPENAPI_SCHEMA_FILE = BASE_DIR / 'openapi-schema.yml'
+
 # Spectacular settings (API documentation)
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Список эндпоинтов API',
@@ -160,6 +235,42 @@ SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
 
+# Значение locmem хранит кеш в памяти процесса (локальный запуск и тесты),
+# иначе кеш хранится в Redis и общий для всех процессов приложения.
+if os.getenv('CACHE_BACKEND', 'redis').lower() == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': f'redis://{DEFAULT_REDIS_HOST}:6379/1',
+        }
+    }
+
+# Время жизни кеша избранного пользователя в секундах.
+FAVORITES_CACHE_TIMEOUT = int(os.getenv('FAVORITES_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Время жизни снимка экрана "Мои подписки" в секундах.
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv('DASHBOARD_CACHE_TIMEOUT', 60 * 60))
+
+# Время жизни кеша списка каталога в секундах.
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 60))
+
+# Список каталога из индекса в памяти процесса вместо запросов к базе.
+CATALOG_INDEX = os.getenv('CATALOG_INDEX', 'false').lower() == 'true'
+
+# Время жизни кеша тарифов сервиса в секундах. Кеш сбрасывается при
+# изменении тарифов, время жизни ограничивает устаревание при удалении
+# сервисов.
+TARIFFS_CACHE_TIMEOUT = int(os.getenv('TARIFFS_CACHE_TIMEOUT', 60 * 60))
+
+# Горизонт прогноза списаний в месяцах.
+FORECAST_MONTHS = int(os.getenv('FORECAST_MONTHS', 12))
+
 BROKER_TRANSPORT = 'redis'
 CELERY_BROKER_URL = f'redis://{DEFAULT_REDIS_HOST}:6379/0'
 CELERY_RESULT_BACKEND = f'redis://{DEFAULT_REDIS_HOST}:6379/0'
@@ -175,6 +286,50 @@ LOGGING_DIR = os.path.join(BASE_DIR, 'logs')
 if not os.path.exists(LOGGING_DIR):
     os.makedirs(LOGGING_DIR)
 
+# Каталог снапшотов метрик задач Celery и интервал их записи в секундах.
+TASK_METRICS_DIR = LOGGING_DIR
+TASK_METRICS_INTERVAL = int(os.getenv('TASK_METRICS_INTERVAL', 30))
+
+# Каталог файлов профилей запросов и задач.
+PROFILE_DIR = os.path.join(LOGGING_DIR, 'profiles')
+
+# Напоминания о списаниях: за сколько дней до списания, бэкенд отправки
+# (api.notifications.FileBackend или api.notifications.ConsoleBackend),
+# файл для FileBackend и количество параллельных отправок.
+RENEWAL_REMINDER_DAYS = int(os.getenv('RENEWAL_REMINDER_DAYS', 3))
+RENEWAL_NOTIFICATION_BACKEND = os.getenv(
+    'RENEWAL_NOTIFICATION_BACKEND', 'api.notifications.FileBackend'
+)
+RENEWAL_NOTIFICATION_FILE = os.path.join(
+    LOGGING_DIR, 'renewal-notifications.jsonl'
+)
+RENEWAL_NOTIFICATION_WORKERS = int(
+    os.getenv('RENEWAL_NOTIFICATION_WORKERS', 8)
+)
+
+# Повторные списания после отказа: задержка первой попытки в секундах,
+# удваиваемая с каждой неудачной попыткой, длительность слота, до начала
+# которого округляется время попытки (с тем же периодом запускается
+# задача повторных списаний), и количество попыток до отключения заказа.
+CHARGE_RETRY_DELAY = int(os.getenv('CHARGE_RETRY_DELAY', 3600))
+CHARGE_RETRY_SLOT = int(os.getenv('CHARGE_RETRY_SLOT', 3600))
+CHARGE_RETRY_MAX_ATTEMPTS = int(os.getenv('CHARGE_RETRY_MAX_ATTEMPTS', 5))
+
+# Исходящие задачи Celery: размер пачки публикации, интервал опроса
+# таблицы ретранслятором в секундах и срок хранения опубликованных
+# задач в секундах.
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 500))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 1))
+OUTBOX_RETENTION = int(os.getenv('OUTBOX_RETENTION', 86400))
+
+# Запись логов клиентов и транзакций в файл из фонового потока.
+QUEUED_LOGGING = os.getenv('QUEUED_LOGGING', 'true').lower() == 'true'
+REQUEST_LOG_HANDLER = (
+    'backend.log_handlers.QueuedFileHandler'
+    if QUEUED_LOGGING
+    else 'logging.FileHandler'
+)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -194,14 +349,14 @@ LOGGING = {
         },
         'client': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': REQUEST_LOG_HANDLER,
             'filename': os.path.join(LOGGING_DIR, 'client.log'),
             'formatter': 'verbose',
             'encoding': 'utf-8',
         },
         'transaction': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': REQUEST_LOG_HANDLER,
             'filename': os.path.join(LOGGING_DIR, 'transaction.log'),
             'formatter': 'verbose',
             'encoding': 'utf-8'
@@ -0,0 +1,151 @@
+"""
+Метрики задач Celery на сигналах: длительность выполнения, отставание
+запуска от ETA (для списаний - от даты следующего списания) или от
+публикации, повторы и результаты по имени задачи.
+
+Метрики накапливаются в памяти процесса воркера и периодически
+сохраняются в файл TASK_METRICS_DIR/task-metrics-<pid>.json. Команда
+manage.py task_metrics объединяет файлы всех процессов.
+"""
+
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_process_shutdown,
+)
+from django.conf import settings
+
+# Верхние границы интервалов гистограмм в секундах.
+DURATION_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+LAG_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600)
+PUBLISHED_AT_HEADER = 'published_at'
+SNAPSHOT_FILE = 'task-metrics-{pid}.json'
+
+
+def new_task_stats():
+    return {
+        'count': 0,
+        'retries': 0,
+        'outcomes': Counter(),
+        'duration_sum': 0.0,
+        'duration_max': 0.0,
+        'duration_buckets': [0] * (len(DURATION_BUCKETS) + 1),
+        'lag_count': 0,
+        'lag_sum': 0.0,
+        'lag_max': 0.0,
+        'lag_buckets': [0] * (len(LAG_BUCKETS) + 1),
+    }
+
+
+stats = defaultdict(new_task_stats)
+started = {}
+last_snapshot = time.monotonic()
+
+
+def get_lag(request, now):
+    """
+    Возвращает отставание запуска задачи в секундах от ETA, а без ETA -
+    от публикации задачи, или None, если время публикации неизвестно.
+    """
+    if request.eta:
+        eta = request.eta
+        if isinstance(eta, str):
+            eta = datetime.fromisoformat(eta)
+        return now - eta.timestamp()
+    published_at = getattr(request, PUBLISHED_AT_HEADER, None)
+    if published_at is None:
+        return None
+    return now - published_at
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+@task_prerun.connect
+def record_start(task_id=None, task=None, **kwargs):
+    started[task_id] = (
+        time.perf_counter(),
+        get_lag(task.request, time.time()),
+    )
+
+
+@task_retry.connect
+def record_retry(sender=None, **kwargs):
+    stats[sender.name]['retries'] += 1
+
+
+@task_postrun.connect
+def record_finish(task_id=None, task=None, retval=None, state=None, **kwargs):
+    start = started.pop(task_id, None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start[0]
+    lag = start[1]
+
+    task_stats = stats[task.name]
+    task_stats['count'] += 1
+    # Задача может вернуть строку с бизнес-результатом (например,
+    # отказ в списании), иначе учитывается состояние Celery.
+    outcome = retval if isinstance(retval, str) else state
+    task_stats['outcomes'][outcome] += 1
+    task_stats['duration_sum'] += duration
+    task_stats['duration_max'] = max(task_stats['duration_max'], duration)
+    task_stats['duration_buckets'][
+        bisect_left(DURATION_BUCKETS, duration)
+    ] += 1
+    if lag is not None:
+        lag = max(lag, 0)
+        task_stats['lag_count'] += 1
+        task_stats['lag_sum'] += lag
+        task_stats['lag_max'] = max(task_stats['lag_max'], lag)
+        task_stats['lag_buckets'][bisect_left(LAG_BUCKETS, lag)] += 1
+
+    if time.monotonic() - last_snapshot >= settings.TASK_METRICS_INTERVAL:
+        write_snapshot()
+
+
+@worker_process_shutdown.connect
+def write_snapshot(**kwargs):
+    """Сохраняет метрики процесса в файл снапшота атомарной заменой."""
+    global last_snapshot
+    last_snapshot = time.monotonic()
+    if not stats:
+        return
+    path = os.path.join(
+        settings.TASK_METRICS_DIR, SNAPSHOT_FILE.format(pid=os.getpid())
+    )
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+        json.dump(
+            {
+                'pid': os.getpid(),
+                'updated_at': datetime.now(timezone.utc).isoformat(),
+                'tasks': stats,
+            },
+            file,
+        )
+    os.replace(f'{path}.tmp', path)
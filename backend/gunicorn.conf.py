@@ -0,0 +1,22 @@
+import os
+
+bind = '0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+# Приложение загружается в мастер-процессе один раз, воркеры получают
+# его при fork и разделяют память импортированных модулей.
+preload_app = True
+
+
+def when_ready(server):
+    """
+    Загружает URL-конфигурацию и схему API в мастер-процессе до запуска
+    воркеров.
+    """
+    from importlib import import_module
+
+    from django.conf import settings
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    views = import_module(f'api.v{settings.VERSION_API}.views')
+    views.load_pregenerated_schema()
@@ -1,17 +1,31 @@
 #!/bin/sh
-echo "Running migrations..."
-python manage.py makemigrations;
-python manage.py migrate;
+if [ "$STARTUP_FULL" = "true" ]; then
+    echo "Running migrations..."
+    python manage.py makemigrations;
+    python manage.py migrate;
 
-echo "Collecting static files..."
-python manage.py collectstatic --noinput;
+    echo "Collecting static files..."
+    python manage.py collectstatic --noinput;
 
-echo "Loading initial data..."
-python manage.py loaddata users.json;
+    echo "Loading initial data..."
+    python manage.py loaddata users.json;
+else
+    echo "Preparing application..."
+    python manage.py startup;
+fi
+
+if [ "$PROFILE_IMPORTS" = "true" ]; then
+    echo "Profiling imports..."
+    python manage.py profile_imports web --output logs/importtime-web.log;
+    python manage.py profile_imports worker --output logs/importtime-worker.log;
+fi
 
 echo "Starting Celery worker..."
 celery -A backend worker -l info --pool=solo --without-mingle --without-gossip &
 
+echo "Starting outbox relay..."
+python manage.py relay_outbox &
+
 echo "Starting Celery beat..."
 celery -A backend beat --loglevel=info &
 
@@ -19,4 +33,4 @@ echo "Copying static files..."
 cp -r /app/collected_static/. /backend_static/static/
 
 echo "Starting Gunicorn..."
-gunicorn --bind 0:8000 backend.wsgi;
\ No newline at end of file
+gunicorn --config gunicorn.conf.py backend.wsgi;
\ No newline at end of file
@@ -1,14 +1,82 @@
+import io
+import zipfile
+from functools import partial
+from pathlib import Path
+
+from django import forms
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.shortcuts import redirect, render
+from django.urls import path
+from django.utils.functional import cached_property
 from subscriptions.models import (
     BannersSubscription,
     CategorySubscription,
+    ChargeRetry,
     IsFavoriteSubscription,
     Subscription,
     SubscriptionUserOrder,
     Tariff,
+    TaskOutbox,
     Transaction,
+    TransactionArchive,
+)
+from subscriptions.services import (
+    CATALOG_FORMATS,
+    import_catalog,
+    load_catalog,
 )
 
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц. Для списка без фильтров на Postgres
+    берет оценку количества строк из статистики планировщика вместо
+    полного COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self.get_estimated_count()
+        if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+    def get_estimated_count(self):
+        """
+        Возвращает оценку количества строк таблицы или None, если
+        оценка недоступна: база не Postgres или список отфильтрован.
+        """
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Базовая админка для быстрорастущих таблиц."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class CatalogImportForm(forms.Form):
+    catalog = forms.FileField(label='Файл каталога (CSV или JSON)')
+    images = forms.FileField(
+        label='ZIP-архив с логотипами и баннерами', required=False
+    )
+
 
 class LinkInlines(admin.StackedInline):
     model = Tariff
@@ -31,6 +99,77 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'description',
         'categories_list',
     )
+    search_fields = ('name',)
+    change_list_template = 'admin/subscriptions/subscription/change_list.html'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('categories')
+
+    def get_urls(self):
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_catalog_view),
+                name='subscriptions_subscription_import',
+            ),
+        ] + super().get_urls()
+
+    def import_catalog_view(self, request):
+        """Импортирует каталог сервисов из загруженного файла."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            catalog = form.cleaned_data['catalog']
+            file_format = Path(catalog.name).suffix.lstrip('.').lower()
+            try:
+                if file_format not in CATALOG_FORMATS:
+                    raise ValueError('поддерживаются только CSV и JSON')
+                readers = {}
+                if form.cleaned_data['images']:
+                    archive = zipfile.ZipFile(form.cleaned_data['images'])
+                    readers = {
+                        Path(name).name: partial(archive.read, name)
+                        for name in archive.namelist()
+                    }
+                result = import_catalog(
+                    load_catalog(
+                        io.TextIOWrapper(catalog, encoding='utf-8'),
+                        file_format,
+                    ),
+                    lambda filename: readers[filename](),
+                )
+            except ValidationError as e:
+                form.add_error(
+                    None,
+                    [
+                        f'Ошибка импорта каталога: {message}'
+                        for message in e.messages
+                    ],
+                )
+            except (KeyError, ValueError, zipfile.BadZipFile) as e:
+                form.add_error(None, f'Ошибка импорта каталога: {e}')
+            else:
+                self.message_user(
+                    request,
+                    f'Создано сервисов: {result["subscriptions"]}, '
+                    f'тарифов: {result["tariffs"]}, '
+                    f'баннеров: {result["banners"]}. '
+                    f'Пропущено существующих и повторов: '
+                    f'{result["skipped"]}',
+                )
+                return redirect('admin:subscriptions_subscription_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': 'Импорт каталога',
+        }
+        return render(
+            request,
+            'admin/subscriptions/subscription/import_catalog.html',
+            context,
+        )
 
     @admin.display(description='Категории')
     def categories_list(self, row):
@@ -53,19 +192,33 @@ class TariffAdmin(admin.ModelAdmin):
         'subscription',
         'period',
     )
+    list_select_related = ('subscription',)
+    search_fields = ('subscription__name',)
+    autocomplete_fields = ('subscription',)
 
 
 @admin.register(SubscriptionUserOrder)
-class SubscriptionUserOrderAdmin(admin.ModelAdmin):
+class SubscriptionUserOrderAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'subscription', 'tariff', 'pay_status')
+    list_select_related = ('user', 'subscription', 'tariff__subscription')
+    autocomplete_fields = ('user', 'subscription', 'tariff')
+
+
+@admin.register(ChargeRetry)
+class ChargeRetryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'attempts', 'next_attempt_at')
+    list_select_related = ('order__user', 'order__subscription')
+    raw_id_fields = ('order',)
 
 
 @admin.register(IsFavoriteSubscription)
-class IsFavoriteSubscriptionAdmin(admin.ModelAdmin):
+class IsFavoriteSubscriptionAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'subscription',
     )
+    list_select_related = ('user', 'subscription')
+    autocomplete_fields = ('user', 'subscription')
 
 
 @admin.register(CategorySubscription)
@@ -77,7 +230,7 @@ class CategorySubscriptionAdmin(admin.ModelAdmin):
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin):
     list_display = (
         'id',
         'user',
@@ -87,4 +240,19 @@ class TransactionAdmin(admin.ModelAdmin):
         'amount',
         'status',
     )
-    list_filter = ('user', 'status', 'transaction_type')
+    list_filter = ('status', 'transaction_type')
+    list_select_related = ('user', 'order__user', 'order__subscription')
+    search_fields = ('=user__username',)
+    autocomplete_fields = ('user',)
+    raw_id_fields = ('order',)
+
+
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(TransactionAdmin):
+    pass
+
+
+@admin.register(TaskOutbox)
+class TaskOutboxAdmin(LargeTableAdmin):
+    list_display = ('id', 'task', 'args', 'eta', 'created_at', 'sent_at')
+    search_fields = ('=task_id',)
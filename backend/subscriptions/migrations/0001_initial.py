@@ -0,0 +1,162 @@
+# Generated by Django 3.2 on 2026-10-19 06:23
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import subscriptions.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BannersSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to=subscriptions.models.subscription_images_path, verbose_name='Картинка сервиса')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategorySubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='Название')),
+                ('slug', models.SlugField(max_length=64, unique=True, verbose_name='Слаг категории')),
+            ],
+            options={
+                'verbose_name': 'Категория сервиса',
+                'verbose_name_plural': 'Категории сервисов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChargeRetry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveSmallIntegerField(default=1, verbose_name='Количество неудачных попыток')),
+                ('next_attempt_at', models.DateTimeField(db_index=True, verbose_name='Время следующей попытки')),
+            ],
+            options={
+                'verbose_name': 'Повторное списание',
+                'verbose_name_plural': 'Повторные списания',
+            },
+        ),
+        migrations.CreateModel(
+            name='IsFavoriteSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Подписка в избранном',
+                'verbose_name_plural': 'Подписки в избранном',
+                'default_related_name': 'is_favorite',
+            },
+        ),
+        migrations.CreateModel(
+            name='Subscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, verbose_name='Название')),
+                ('title', models.CharField(max_length=64, verbose_name='Краткое описание')),
+                ('description', models.TextField(verbose_name='Детальное описание')),
+                ('logo', models.ImageField(upload_to=subscriptions.models.subscription_images_path, verbose_name='Логотип сервиса')),
+                ('cashback', models.PositiveIntegerField(verbose_name='Процент кешбека')),
+                ('popular_rate', models.PositiveIntegerField(validators=[django.core.validators.MaxValueValidator(100)], verbose_name='Рейтинг популярности')),
+                ('popularity_score', models.PositiveIntegerField(default=0, editable=False, help_text='Пересчитывается по заказам и избранному задачей update_popularity.', verbose_name='Рейтинг по активности')),
+            ],
+            options={
+                'verbose_name': 'Сервис подписки',
+                'verbose_name_plural': 'Сервисы подписок',
+            },
+        ),
+        migrations.CreateModel(
+            name='SubscriptionUserOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('name', models.CharField(max_length=64, verbose_name='Имя клиента')),
+                ('phone_number', models.CharField(max_length=12, verbose_name='Номер телефона')),
+                ('email', models.EmailField(max_length=254, verbose_name='Почтовый адрес')),
+                ('due_date', models.DateTimeField(blank=True, null=True, verbose_name='Дата следующего списания')),
+                ('pay_status', models.BooleanField(default=True, verbose_name='Статус оплаты')),
+                ('task_id_celery', models.CharField(blank=True, max_length=64, null=True, verbose_name='Хранит id запланированной задачи селери')),
+                ('reminder_due_date', models.DateTimeField(blank=True, null=True, verbose_name='Дата списания, о которой отправлено напоминание')),
+            ],
+            options={
+                'verbose_name': 'Заказ пользователя',
+                'verbose_name_plural': 'Заказы пользователя',
+                'default_related_name': 'orders',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tariff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.IntegerField(choices=[(1, 1), (3, 3), (6, 6), (12, 12)], verbose_name='Продолжительность подписки')),
+                ('price', models.PositiveIntegerField(verbose_name='Стоимость за месяц без скидки')),
+                ('discount', models.PositiveIntegerField(verbose_name='Скидка')),
+                ('price_per_month', models.PositiveIntegerField(blank=True, null=True, verbose_name='Стоимость за месяц с учетом скидки')),
+                ('price_per_period', models.PositiveIntegerField(blank=True, null=True, verbose_name='Стоимость за весь период с учетом скидки')),
+                ('slug', models.SlugField(blank=True, max_length=64, null=True, verbose_name='Слаг тарифа')),
+            ],
+            options={
+                'verbose_name': 'Тариф подписки',
+                'verbose_name_plural': 'Тарифы подписок',
+            },
+        ),
+        migrations.CreateModel(
+            name='TaskOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=255, verbose_name='Имя задачи')),
+                ('args', models.JSONField(default=list, verbose_name='Аргументы задачи')),
+                ('eta', models.DateTimeField(blank=True, null=True, verbose_name='Время выполнения задачи')),
+                ('task_id', models.CharField(max_length=64, unique=True, verbose_name='Id задачи селери')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата публикации в брокер')),
+            ],
+            options={
+                'verbose_name': 'Исходящая задача',
+                'verbose_name_plural': 'Исходящие задачи',
+            },
+        ),
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(choices=[('DEBIT', 'Списание'), ('CASHBACK', 'Начисление кешбека')], max_length=64, verbose_name='Тип транзакции')),
+                ('transaction_date', models.DateTimeField(verbose_name='Дата транзакции')),
+                ('amount', models.IntegerField(verbose_name='Сумма транзакции')),
+                ('status', models.CharField(choices=[('PENDING', 'Ожидается'), ('CREDITED', 'Зачислено'), ('PAID', 'Оплачено')], default='PENDING', max_length=64, verbose_name='Статус транзакции')),
+            ],
+            options={
+                'verbose_name': 'Транзакция',
+                'verbose_name_plural': 'Транзакции',
+                'ordering': ('-transaction_date',),
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('transaction_type', models.CharField(choices=[('DEBIT', 'Списание'), ('CASHBACK', 'Начисление кешбека')], max_length=64, verbose_name='Тип транзакции')),
+                ('transaction_date', models.DateTimeField(verbose_name='Дата транзакции')),
+                ('amount', models.IntegerField(verbose_name='Сумма транзакции')),
+                ('status', models.CharField(choices=[('PENDING', 'Ожидается'), ('CREDITED', 'Зачислено'), ('PAID', 'Оплачено')], default='PENDING', max_length=64, verbose_name='Статус транзакции')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to='subscriptions.subscriptionuserorder', verbose_name='Подписка на сервис')),
+            ],
+            options={
+                'verbose_name': 'Архивная транзакция',
+                'verbose_name_plural': 'Архивные транзакции',
+                'ordering': ('-transaction_date',),
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 3.2 on 2026-10-19 06:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('subscriptions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to=settings.AUTH_USER_MODEL, verbose_name='Клиент'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='subscriptions.subscriptionuserorder', verbose_name='Подписка на сервис'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Клиент'),
+        ),
+        migrations.AddIndex(
+            model_name='taskoutbox',
+            index=models.Index(condition=models.Q(sent_at__isnull=True), fields=['id'], name='outbox_unsent_idx'),
+        ),
+        migrations.AddField(
+            model_name='tariff',
+            name='subscription',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tariffs', to='subscriptions.subscription', verbose_name='Сервис подписки'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionuserorder',
+            name='subscription',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='subscriptions.subscription', verbose_name='Сервис подписки'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionuserorder',
+            name='tariff',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='subscriptions.tariff', verbose_name='Тариф'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionuserorder',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to=settings.AUTH_USER_MODEL, verbose_name='Клиент'),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='categories',
+            field=models.ManyToManyField(to='subscriptions.CategorySubscription', verbose_name='Категории'),
+        ),
+        migrations.AddField(
+            model_name='isfavoritesubscription',
+            name='subscription',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='is_favorite', to='subscriptions.subscription', verbose_name='Сервис подписки'),
+        ),
+        migrations.AddField(
+            model_name='isfavoritesubscription',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='is_favorite', to=settings.AUTH_USER_MODEL, verbose_name='Клиент'),
+        ),
+        migrations.AddField(
+            model_name='chargeretry',
+            name='order',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='charge_retry', to='subscriptions.subscriptionuserorder', verbose_name='Заказ пользователя'),
+        ),
+        migrations.AddField(
+            model_name='bannerssubscription',
+            name='subscription',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='banners', to='subscriptions.subscription', verbose_name='Сервис подписки'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionarchive',
+            index=models.Index(fields=['user', '-transaction_date'], name='transaction_archive_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-transaction_date'], name='transaction_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptionuserorder',
+            index=models.Index(fields=['user', 'due_date'], name='order_user_due_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscriptionuserorder',
+            constraint=models.UniqueConstraint(fields=('user', 'subscription'), name='unique_orders'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['popular_rate'], name='subscription_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['popularity_score'], name='subscription_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='isfavoritesubscription',
+            constraint=models.UniqueConstraint(fields=('user', 'subscription'), name='unique_isfavorite'),
+        ),
+    ]
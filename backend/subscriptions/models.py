@@ -1,14 +1,28 @@
-import math
+import time
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, ExpressionWrapper, F, Q, Value, When
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
 
 User = get_user_model()
 
 MAX_LENGTH = 64
 MAX_VALUE_POPULAR = 100
+TARIFF_PERIOD_SLUGS = {
+    1: 'monthly',
+    3: 'quarterly',
+    6: 'semiannually',
+    12: 'annually',
+}
+TARIFF_DERIVED_FIELDS = ('price_per_month', 'price_per_period', 'slug')
+TARIFFS_VERSION_KEY = 'tariffs-version'
+CATALOG_VERSION_KEY = 'catalog-version'
 
 
 def subscription_images_path(instance, filename):
@@ -32,6 +46,23 @@ class BannersSubscription(models.Model):
     )
 
 
+class SubscriptionQuerySet(models.QuerySet):
+    """
+    QuerySet сервисов, массовые изменения меняют версию каталога.
+    Удаление сервисов каскадно удаляет их тарифы, поэтому меняет
+    и версию тарифов.
+    """
+
+    def update(self, **kwargs):
+        bump_catalog_version()
+        return super().update(**kwargs)
+
+    def delete(self):
+        bump_catalog_version()
+        bump_tariffs_version()
+        return super().delete()
+
+
 class Subscription(models.Model):
     """Модель сервиса подписки."""
 
@@ -53,14 +84,43 @@ class Subscription(models.Model):
         ],
         verbose_name='Рейтинг популярности',
     )
+    popularity_score = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг по активности',
+        help_text=(
+            'Пересчитывается по заказам и избранному задачей '
+            'update_popularity.'
+        ),
+    )
+
+    objects = SubscriptionQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Сервис подписки'
         verbose_name_plural = 'Сервисы подписок'
+        indexes = [
+            models.Index(
+                fields=['popular_rate'], name='subscription_popular_idx'
+            ),
+            models.Index(
+                fields=['popularity_score'],
+                name='subscription_score_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):
+        bump_catalog_version()
+        bump_tariffs_version()
+        return super().delete(*args, **kwargs)
+
 
 class CategorySubscription(models.Model):
     """Модель категории сервиса подписки."""
@@ -79,6 +139,136 @@ class CategorySubscription(models.Model):
     def __str__(self):
         return f'{self.name}'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):
+        bump_catalog_version()
+        return super().delete(*args, **kwargs)
+
+
+@receiver(m2m_changed, sender=Subscription.categories.through)
+def categories_changed(**kwargs):
+    """Меняет версию каталога при изменении категорий сервиса."""
+    if kwargs['action'].startswith('post_'):
+        bump_catalog_version()
+
+
+def get_cache_version(key):
+    """
+    Возвращает версию данных, которая входит в ключи кеша. Начальное
+    значение берется из текущего времени, поэтому после вытеснения ключа
+    из кеша версия не повторяет прежнюю.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    """Увеличивает версию данных после фиксации текущей транзакции."""
+
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            get_cache_version(key)
+
+    transaction.on_commit(bump)
+
+
+def get_tariffs_version():
+    """Возвращает версию тарифов, которая входит в ключи кеша тарифов."""
+    return get_cache_version(TARIFFS_VERSION_KEY)
+
+
+def bump_tariffs_version():
+    """
+    Увеличивает версию тарифов, после чего закешированные тарифы всех
+    сервисов не используются.
+    """
+    bump_cache_version(TARIFFS_VERSION_KEY)
+
+
+def get_catalog_version():
+    """
+    Возвращает версию каталога (сервисы, категории и их связи), по
+    которой обновляется индекс каталога в памяти процесса.
+    """
+    return get_cache_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Увеличивает версию каталога после его изменения."""
+    bump_cache_version(CATALOG_VERSION_KEY)
+
+
+class TariffQuerySet(models.QuerySet):
+    """QuerySet тарифов с пересчетом вычисляемых полей на стороне БД."""
+
+    @staticmethod
+    def derived_fields_expressions():
+        """
+        Возвращает SQL-выражения вычисляемых полей тарифа. Правило
+        совпадает с Tariff.calculate_price_per_month: цена со скидкой
+        округляется до десятков, половина округляется вверх.
+        """
+        price_per_month = ExpressionWrapper(
+            (F('price') * (100 - F('discount')) + 500) / 1000 * 10,
+            output_field=models.IntegerField(),
+        )
+        return {
+            'price_per_month': price_per_month,
+            'price_per_period': ExpressionWrapper(
+                price_per_month * F('period'),
+                output_field=models.IntegerField(),
+            ),
+            'slug': Case(
+                *[
+                    When(period=period, then=Value(slug))
+                    for period, slug in TARIFF_PERIOD_SLUGS.items()
+                ],
+                output_field=models.SlugField(),
+            ),
+        }
+
+    def with_expected_prices(self):
+        """Добавляет ожидаемые значения вычисляемых полей (expected_*)."""
+        expressions = self.derived_fields_expressions()
+        return self.annotate(
+            **{
+                f'expected_{name}': expression
+                for name, expression in expressions.items()
+            }
+        )
+
+    def drifted(self):
+        """Возвращает тарифы, вычисляемые поля которых устарели."""
+        condition = Q()
+        for name in TARIFF_DERIVED_FIELDS:
+            condition |= Q(**{f'{name}__isnull': True}) | ~Q(
+                **{name: F(f'expected_{name}')}
+            )
+        return self.with_expected_prices().filter(condition)
+
+    def recalculate_prices(self):
+        """
+        Пересчитывает вычисляемые поля всех тарифов QuerySet одним UPDATE.
+        Возвращает количество обновленных строк.
+        """
+        return self.update(**self.derived_fields_expressions())
+
+    def update(self, **kwargs):
+        bump_tariffs_version()
+        return super().update(**kwargs)
+
+    def delete(self):
+        bump_tariffs_version()
+        return super().delete()
+
 
 class Tariff(models.Model):
     """Модель тарифа сервиса подписки."""
@@ -120,21 +310,20 @@ class Tariff(models.Model):
         verbose_name='Слаг тарифа',
     )
 
+    objects = TariffQuerySet.as_manager()
+
     def get_slug(self):
         """Возвращает слаг в зависимости от выбранного периода."""
-        period_slug_mapping = {
-            1: 'monthly',
-            3: 'quarterly',
-            6: 'semiannually',
-            12: 'annually',
-        }
-        return period_slug_mapping.get(self.period)
+        return TARIFF_PERIOD_SLUGS.get(self.period)
 
     def calculate_price_per_month(self):
-        """Вычисляет стоимость подписки в месяц с учетом скидки."""
+        """
+        Вычисляет стоимость подписки в месяц с учетом скидки.
+        Считается в целых числах, чтобы результат совпадал
+        с TariffQuerySet.derived_fields_expressions.
+        """
         if self.discount is not None:
-            discount_rate = 1 - self.discount / 100
-            return math.floor(self.price * discount_rate / 10 + 0.5) * 10
+            return (self.price * (100 - self.discount) + 500) // 1000 * 10
         else:
             return None
 
@@ -144,11 +333,23 @@ class Tariff(models.Model):
             return self.price_per_month * self.period
         return None
 
-    def save(self, *args, **kwargs):
+    def fill_derived_fields(self):
+        """
+        Заполняет вычисляемые поля тарифа. Используется при сохранении
+        и при массовом создании тарифов через bulk_create.
+        """
         self.price_per_month = self.calculate_price_per_month()
         self.price_per_period = self.calculate_price_per_period()
         self.slug = self.get_slug()
+
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
         super().save(*args, **kwargs)
+        bump_tariffs_version()
+
+    def delete(self, *args, **kwargs):
+        bump_tariffs_version()
+        return super().delete(*args, **kwargs)
 
     class Meta:
         verbose_name = 'Тариф подписки'
@@ -172,6 +373,9 @@ class UserSubscription(models.Model):
     subscription = models.ForeignKey(
         Subscription, on_delete=models.CASCADE, verbose_name='Сервис подписки'
     )
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name='Дата создания'
+    )
 
     class Meta:
         abstract = True
@@ -203,6 +407,11 @@ class SubscriptionUserOrder(UserSubscription):
         null=True,
         verbose_name='Хранит id запланированной задачи селери',
     )
+    reminder_due_date = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Дата списания, о которой отправлено напоминание',
+    )
 
     class Meta:
         default_related_name = 'orders'
@@ -214,12 +423,18 @@ class SubscriptionUserOrder(UserSubscription):
                 name='unique_orders',
             )
         ]
+        indexes = [
+            # Выборка заказов пачками пользователей для напоминаний.
+            models.Index(
+                fields=['user', 'due_date'], name='order_user_due_date_idx'
+            )
+        ]
 
     def __str__(self) -> str:
         return f'{self.user} - {self.subscription}'
 
     def clean(self):
-        if self.subscription != self.tariff.subscription:
+        if self.subscription_id != self.tariff.subscription_id:
             raise ValidationError(
                 'Выбранный тариф не принадлежит указанной подписке'
             )
@@ -229,6 +444,33 @@ class SubscriptionUserOrder(UserSubscription):
         super().save(*args, **kwargs)
 
 
+class ChargeRetry(models.Model):
+    """
+    Модель повторной попытки списания по заказу после отказа
+    из-за недостаточного баланса.
+    """
+
+    order = models.OneToOneField(
+        SubscriptionUserOrder,
+        on_delete=models.CASCADE,
+        related_name='charge_retry',
+        verbose_name='Заказ пользователя',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=1, verbose_name='Количество неудачных попыток'
+    )
+    next_attempt_at = models.DateTimeField(
+        db_index=True, verbose_name='Время следующей попытки'
+    )
+
+    class Meta:
+        verbose_name = 'Повторное списание'
+        verbose_name_plural = 'Повторные списания'
+
+    def __str__(self) -> str:
+        return f'{self.order} - попытка {self.attempts + 1}'
+
+
 class IsFavoriteSubscription(UserSubscription):
     """Создает связь пользователь-подписка избранное"""
 
@@ -244,7 +486,8 @@ class IsFavoriteSubscription(UserSubscription):
         ]
 
 
-class Transaction(models.Model):
+class BaseTransaction(models.Model):
+    """Абстрактная модель транзакции."""
 
     TRANSACTION_TYPES = [
         ('DEBIT', 'Списание'),
@@ -256,9 +499,6 @@ class Transaction(models.Model):
         ('PAID', 'Оплачено'),
     ]
 
-    user = models.ForeignKey(
-        User, on_delete=models.CASCADE, verbose_name='Клиент'
-    )
     transaction_type = models.CharField(
         max_length=MAX_LENGTH,
         choices=TRANSACTION_TYPES,
@@ -266,6 +506,24 @@ class Transaction(models.Model):
     )
     transaction_date = models.DateTimeField(verbose_name='Дата транзакции')
     amount = models.IntegerField(verbose_name='Сумма транзакции')
+    status = models.CharField(
+        max_length=MAX_LENGTH,
+        choices=STATUS_TYPES,
+        default='PENDING',
+        verbose_name='Статус транзакции',
+    )
+
+    class Meta:
+        abstract = True
+        ordering = ('-transaction_date',)
+
+
+class Transaction(BaseTransaction):
+    """Модель транзакции пользователя."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name='Клиент'
+    )
     order = models.ForeignKey(
         SubscriptionUserOrder,
         on_delete=models.CASCADE,
@@ -274,14 +532,89 @@ class Transaction(models.Model):
         related_name='transactions',
         verbose_name='Подписка на сервис',
     )
-    status = models.CharField(
-        max_length=MAX_LENGTH,
-        choices=STATUS_TYPES,
-        default='PENDING',
-        verbose_name='Статус транзакции',
-    )
 
-    class Meta:
+    class Meta(BaseTransaction.Meta):
         verbose_name = 'Транзакция'
         verbose_name_plural = 'Транзакции'
-        ordering = ('-transaction_date',)
+        indexes = [
+            models.Index(
+                fields=['user', '-transaction_date'],
+                name='transaction_user_date_idx',
+            ),
+        ]
+
+
+class TransactionArchive(BaseTransaction):
+    """
+    Модель архивной транзакции.
+
+    Хранит завершенные транзакции закрытых месяцев, перенесенные
+    из основной таблицы командой archive_transactions. Идентификатор
+    сохраняется прежним, чтобы история операций не менялась.
+    """
+
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_transactions',
+        verbose_name='Клиент',
+    )
+    order = models.ForeignKey(
+        SubscriptionUserOrder,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='archived_transactions',
+        verbose_name='Подписка на сервис',
+    )
+
+    class Meta(BaseTransaction.Meta):
+        verbose_name = 'Архивная транзакция'
+        verbose_name_plural = 'Архивные транзакции'
+        indexes = [
+            models.Index(
+                fields=['user', '-transaction_date'],
+                name='transaction_archive_user_idx',
+            ),
+        ]
+
+
+class TaskOutbox(models.Model):
+    """
+    Модель исходящей задачи Celery.
+
+    Запись создается в той же транзакции, что и изменения, для которых
+    ставится задача, и публикуется в брокер командой relay_outbox после
+    фиксации. При откате транзакции задача не публикуется.
+    """
+
+    task = models.CharField(max_length=255, verbose_name='Имя задачи')
+    args = models.JSONField(default=list, verbose_name='Аргументы задачи')
+    eta = models.DateTimeField(
+        blank=True, null=True, verbose_name='Время выполнения задачи'
+    )
+    task_id = models.CharField(
+        max_length=MAX_LENGTH, unique=True, verbose_name='Id задачи селери'
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name='Дата создания'
+    )
+    sent_at = models.DateTimeField(
+        blank=True, null=True, verbose_name='Дата публикации в брокер'
+    )
+
+    class Meta:
+        verbose_name = 'Исходящая задача'
+        verbose_name_plural = 'Исходящие задачи'
+        indexes = [
+            # Выборка неопубликованных задач ретранслятором.
+            models.Index(
+                fields=['id'],
+                name='outbox_unsent_idx',
+                condition=Q(sent_at__isnull=True),
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.task} {self.task_id}'
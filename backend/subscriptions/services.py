@@ -0,0 +1,424 @@
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import (
+    Case,
+    FloatField,
+    Max,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    MAX_VALUE_POPULAR,
+    BannersSubscription,
+    CategorySubscription,
+    IsFavoriteSubscription,
+    Subscription,
+    SubscriptionUserOrder,
+    Tariff,
+    bump_catalog_version,
+)
+
+CATALOG_FORMATS = ('csv', 'json')
+CATALOG_REQUIRED_FIELDS = (
+    'name',
+    'title',
+    'description',
+    'logo',
+    'cashback',
+    'popular_rate',
+)
+MAX_DISCOUNT = 100
+CSV_LIST_SEPARATOR = ';'
+CSV_ITEM_SEPARATOR = ':'
+IMAGE_UPLOAD_WORKERS = 8
+IMPORT_BATCH_SIZE = 1000
+# Вес активности по ее давности: (не старше дней, вес). Более старая
+# активность учитывается с весом POPULARITY_DECAY_TAIL.
+POPULARITY_DECAY = ((7, 1.0), (30, 0.5), (90, 0.25))
+POPULARITY_DECAY_TAIL = 0.1
+POPULARITY_CANCELLED_ORDER_WEIGHT = 0.5
+POPULARITY_FAVORITE_WEIGHT = 0.3
+
+
+def _split(value):
+    return [item.strip() for item in (value or '').split(CSV_LIST_SEPARATOR)]
+
+
+def parse_catalog_csv(lines):
+    """
+    Преобразует CSV каталога в список записей формата JSON.
+
+    Одна строка CSV описывает один сервис. Списочные колонки разделяются
+    символом ';', элементы списков - символом ':':
+    - categories: slug:Название;slug:Название
+    - tariffs: период:цена:скидка;период:цена:скидка
+    - banners: файл;файл
+    """
+    records = []
+    for row in csv.DictReader(lines):
+        records.append(
+            {
+                'name': row['name'],
+                'title': row['title'],
+                'description': row['description'],
+                'logo': row['logo'],
+                'cashback': int(row['cashback']),
+                'popular_rate': int(row['popular_rate']),
+                'categories': [
+                    dict(zip(('slug', 'name'), item.split(CSV_ITEM_SEPARATOR)))
+                    for item in _split(row.get('categories'))
+                    if item
+                ],
+                'tariffs': [
+                    dict(
+                        zip(
+                            ('period', 'price', 'discount'),
+                            map(int, item.split(CSV_ITEM_SEPARATOR)),
+                        )
+                    )
+                    for item in _split(row.get('tariffs'))
+                    if item
+                ],
+                'banners': [
+                    item for item in _split(row.get('banners')) if item
+                ],
+            }
+        )
+    return records
+
+
+def load_catalog(file, file_format):
+    """Читает каталог из текстового файла в формате CSV или JSON."""
+    if file_format == 'csv':
+        return parse_catalog_csv(file)
+    return json.load(file)
+
+
+def _check_number(errors, name, field, value, max_value=None):
+    """Добавляет в errors ошибку, если value не целое число в границах."""
+    if (
+        not isinstance(value, int)
+        or isinstance(value, bool)
+        or value < 0
+        or (max_value is not None and value > max_value)
+    ):
+        limit = f'от 0 до {max_value}' if max_value is not None else '>= 0'
+        errors.append(
+            f'{name}: {field} должно быть целым числом {limit}, '
+            f'получено {value!r}'
+        )
+
+
+def validate_catalog(records):
+    """
+    Проверяет записи каталога до загрузки картинок и записи в БД.
+
+    Выбрасывает ValidationError со списком ошибок по всем записям:
+    отсутствующие поля, период тарифа вне Tariff.PERIOD_CHOICES, скидка
+    больше MAX_DISCOUNT процентов, рейтинг популярности больше
+    MAX_VALUE_POPULAR и отрицательные или нечисловые значения.
+    """
+    periods = dict(Tariff.PERIOD_CHOICES)
+    errors = []
+    for number, record in enumerate(records, start=1):
+        missing = [
+            field for field in CATALOG_REQUIRED_FIELDS if field not in record
+        ]
+        name = record.get('name', f'Запись {number}')
+        if missing:
+            errors.append(f'{name}: нет полей {", ".join(missing)}')
+            continue
+        _check_number(errors, name, 'cashback', record['cashback'])
+        _check_number(
+            errors,
+            name,
+            'popular_rate',
+            record['popular_rate'],
+            MAX_VALUE_POPULAR,
+        )
+        for tariff in record.get('tariffs', []):
+            if tariff.get('period') not in periods:
+                errors.append(
+                    f'{name}: период тарифа должен быть одним из '
+                    f'{", ".join(map(str, periods))}, '
+                    f'получено {tariff.get("period")!r}'
+                )
+            _check_number(errors, name, 'price', tariff.get('price'))
+            _check_number(
+                errors, name, 'discount', tariff.get('discount'), MAX_DISCOUNT
+            )
+    if errors:
+        raise ValidationError(errors)
+
+
+def _save_image(instance, field_name, filename, read_image):
+    """Сохраняет картинку в хранилище по правилам поля модели."""
+    field = instance._meta.get_field(field_name)
+    name = field.generate_filename(instance, filename)
+    return field.storage.save(name, ContentFile(read_image(filename)))
+
+
+def _delete_images(uploaded):
+    """Удаляет из хранилища загруженные картинки [(поле, имя), ...]."""
+    for field, name in uploaded:
+        field.storage.delete(name)
+
+
+def _upload_images(uploads, read_image):
+    """
+    Параллельно загружает картинки [(объект, поле, файл), ...] и
+    проставляет объектам имена файлов в хранилище.
+
+    Возвращает список загруженных картинок [(поле, имя), ...]. Если
+    какая-то картинка не загрузилась, уже загруженные удаляются.
+    """
+    with ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_WORKERS) as executor:
+        futures = [
+            executor.submit(_save_image, *upload, read_image)
+            for upload in uploads
+        ]
+    uploaded = []
+    error = None
+    for (instance, field_name, _), future in zip(uploads, futures):
+        if future.exception() is not None:
+            error = error or future.exception()
+            continue
+        name = future.result()
+        setattr(instance, field_name, name)
+        uploaded.append((instance._meta.get_field(field_name), name))
+    if error is not None:
+        _delete_images(uploaded)
+        raise error
+    return uploaded
+
+
+def bulk_create_with_ids(model, objs, batch_size):
+    """
+    Выполняет bulk_create и проставляет объектам первичные ключи,
+    в том числе на бэкендах, которые не возвращают их после вставки.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+    last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    ids = (
+        model.objects.filter(id__gt=last_id)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    for obj, pk in zip(objs, ids):
+        obj.pk = pk
+    return objs
+
+
+def _get_categories(records, batch_size):
+    """Возвращает категории каталога по слагу, создавая недостающие."""
+    names = {
+        category['slug']: category.get('name', category['slug'])
+        for record in records
+        for category in record.get('categories', [])
+    }
+    CategorySubscription.objects.bulk_create(
+        [
+            CategorySubscription(slug=slug, name=name)
+            for slug, name in names.items()
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+    return CategorySubscription.objects.in_bulk(list(names), field_name='slug')
+
+
+def import_catalog(records, read_image, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Импортирует каталог сервисов с тарифами, категориями и баннерами.
+
+    Записи проверяются validate_catalog до загрузки картинок. Сервисы,
+    название которых уже есть в базе или повторяется в файле,
+    пропускаются, поэтому повторный импорт того же файла ничего не
+    дублирует. Картинки загружаются в хранилище параллельно, записи в
+    БД создаются через bulk_create в одной транзакции; если она не
+    выполнилась, загруженные картинки удаляются. Вычисляемые поля
+    тарифов заполняются так же, как в Tariff.save.
+
+    Аргументы:
+    - records (list): Записи каталога в формате JSON.
+    - read_image (callable): Возвращает содержимое картинки по имени файла.
+    - batch_size (int): Размер пачки для bulk_create.
+
+    Возвращает:
+    - dict: Количество созданных сервисов, тарифов и баннеров и
+      пропущенных записей.
+    """
+    validate_catalog(records)
+    existing = set(
+        Subscription.objects.filter(
+            name__in=[record['name'] for record in records]
+        ).values_list('name', flat=True)
+    )
+    new_records = {}
+    for record in records:
+        if record['name'] not in existing:
+            new_records.setdefault(record['name'], record)
+    skipped = len(records) - len(new_records)
+    records = list(new_records.values())
+
+    subscriptions = [
+        Subscription(
+            name=record['name'],
+            title=record['title'],
+            description=record['description'],
+            cashback=record['cashback'],
+            popular_rate=record['popular_rate'],
+        )
+        for record in records
+    ]
+    banners = [
+        (BannersSubscription(subscription=subscription), filename)
+        for subscription, record in zip(subscriptions, records)
+        for filename in record.get('banners', [])
+    ]
+
+    uploads = [
+        (subscription, 'logo', record['logo'])
+        for subscription, record in zip(subscriptions, records)
+    ] + [(banner, 'image', filename) for banner, filename in banners]
+    uploaded = _upload_images(uploads, read_image)
+    try:
+        tariffs = _create_catalog(subscriptions, banners, records, batch_size)
+    except BaseException:
+        _delete_images(uploaded)
+        raise
+
+    return {
+        'subscriptions': len(subscriptions),
+        'tariffs': len(tariffs),
+        'banners': len(banners),
+        'skipped': skipped,
+    }
+
+
+def _create_catalog(subscriptions, banners, records, batch_size):
+    """
+    Создает в одной транзакции сервисы, их категории, тарифы и баннеры.
+    Возвращает созданные тарифы.
+    """
+    with transaction.atomic():
+        bulk_create_with_ids(Subscription, subscriptions, batch_size)
+        categories = _get_categories(records, batch_size)
+
+        through = Subscription.categories.through
+        through.objects.bulk_create(
+            [
+                through(
+                    subscription_id=subscription.id,
+                    categorysubscription_id=categories[category['slug']].id,
+                )
+                for subscription, record in zip(subscriptions, records)
+                for category in record.get('categories', [])
+                if category['slug'] in categories
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+        tariffs = []
+        for subscription, record in zip(subscriptions, records):
+            for data in record.get('tariffs', []):
+                tariff = Tariff(
+                    subscription=subscription,
+                    period=data['period'],
+                    price=data['price'],
+                    discount=data['discount'],
+                )
+                tariff.fill_derived_fields()
+                tariffs.append(tariff)
+        Tariff.objects.bulk_create(tariffs, batch_size=batch_size)
+
+        BannersSubscription.objects.bulk_create(
+            [banner for banner, _ in banners], batch_size=batch_size
+        )
+        bump_catalog_version()
+    return tariffs
+
+
+def _decayed_activity(model, weight):
+    """
+    Возвращает подзапрос суммарной активности по сервису с весом,
+    убывающим с давностью записи.
+    """
+    now = timezone.now()
+    decay = Case(
+        *[
+            When(created_at__gte=now - timedelta(days=days), then=Value(w))
+            for days, w in POPULARITY_DECAY
+        ],
+        default=Value(POPULARITY_DECAY_TAIL),
+        output_field=FloatField(),
+    )
+    activity = (
+        model.objects.filter(subscription=OuterRef('pk'))
+        .values('subscription')
+        .annotate(score=Sum(decay * weight, output_field=FloatField()))
+        .values('score')
+    )
+    return Coalesce(Subquery(activity), Value(0.0))
+
+
+def recalculate_popularity(batch_size=IMPORT_BATCH_SIZE):
+    """
+    Пересчитывает рейтинг сервисов по активности: заказам и избранному.
+
+    Активность всех сервисов считается одним запросом: каждый заказ
+    и добавление в избранное дают вклад, убывающий с давностью.
+    Отмененные заказы и избранное учитываются с меньшим весом. Рейтинг
+    нормируется к шкале 0-MAX_VALUE_POPULAR относительно самого
+    популярного сервиса и записывается в popularity_score. Рейтинг
+    популярности popular_rate, заданный вручную или импортом каталога,
+    не меняется.
+
+    Возвращает:
+    - int: Количество сервисов с изменившимся рейтингом.
+    """
+    order_weight = Case(
+        When(pay_status=True, then=Value(1.0)),
+        default=Value(POPULARITY_CANCELLED_ORDER_WEIGHT),
+        output_field=FloatField(),
+    )
+    subscriptions = list(
+        Subscription.objects.only('id', 'popularity_score').annotate(
+            score=_decayed_activity(SubscriptionUserOrder, order_weight)
+            + _decayed_activity(
+                IsFavoriteSubscription, Value(POPULARITY_FAVORITE_WEIGHT)
+            )
+        )
+    )
+    max_score = max(
+        (subscription.score for subscription in subscriptions), default=0
+    )
+    changed = []
+    for subscription in subscriptions:
+        score = (
+            round(MAX_VALUE_POPULAR * subscription.score / max_score)
+            if max_score
+            else 0
+        )
+        if score != subscription.popularity_score:
+            subscription.popularity_score = score
+            changed.append(subscription)
+    Subscription.objects.bulk_update(
+        changed, ['popularity_score'], batch_size=batch_size
+    )
+    return len(changed)
@@ -0,0 +1,355 @@
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from users.models import User
+
+from .admin import ESTIMATED_COUNT_THRESHOLD, EstimatedCountPaginator
+from .models import (
+    MAX_VALUE_POPULAR,
+    BannersSubscription,
+    CategorySubscription,
+    IsFavoriteSubscription,
+    Subscription,
+    SubscriptionUserOrder,
+    Tariff,
+    Transaction,
+)
+from .services import import_catalog, recalculate_popularity
+
+TRANSACTION_CHANGELIST_URL = '/admin/subscriptions/transaction/'
+
+
+class LargeTableAdminTests(TestCase):
+    """Запросы списка админки быстрорастущих таблиц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', password='password'
+        )
+        now = timezone.now()
+        Transaction.objects.bulk_create(
+            Transaction(
+                user=cls.admin,
+                transaction_type='DEBIT',
+                transaction_date=now - timedelta(days=number),
+                amount=100,
+            )
+            for number in range(150)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def get_changelist(self, num_queries):
+        with CaptureQueriesContext(connection) as context:
+            with self.assertNumQueries(num_queries):
+                response = self.client.get(TRANSACTION_CHANGELIST_URL)
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql']
+            for query in context.captured_queries
+            if 'COUNT(' in query['sql'].upper()
+        ]
+
+    def test_estimated_count(self):
+        with mock.patch.object(
+            EstimatedCountPaginator,
+            'get_estimated_count',
+            return_value=ESTIMATED_COUNT_THRESHOLD,
+        ):
+            counts = self.get_changelist(3)
+        self.assertEqual(counts, [])
+
+    def test_fallback_count(self):
+        counts = self.get_changelist(4)
+        self.assertEqual(len(counts), 1)
+
+    def test_filtered_list_is_not_estimated(self):
+        paginator = EstimatedCountPaginator(
+            Transaction.objects.filter(status='PAID'), 100
+        )
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertNumQueries(0):
+                self.assertIsNone(paginator.get_estimated_count())
+
+
+class ChangelistQueriesTests(TestCase):
+    """
+    Количество запросов списков админки не зависит от числа строк:
+    у каждой строки свои пользователь, сервис, тариф и категории.
+    """
+
+    ROWS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', password='password'
+        )
+        for number in range(cls.ROWS):
+            user = User.objects.create(username=f'user{number}')
+            subscription = Subscription.objects.create(
+                name=f'Сервис {number}',
+                title='Описание',
+                description='Описание',
+                logo='logo.png',
+                cashback=5,
+                popular_rate=0,
+            )
+            subscription.categories.set(
+                CategorySubscription.objects.create(
+                    name=f'Категория {number}-{index}',
+                    slug=f'category-{number}-{index}',
+                )
+                for index in range(2)
+            )
+            tariff = Tariff.objects.create(
+                subscription=subscription, period=1, price=300, discount=10
+            )
+            SubscriptionUserOrder.objects.create(
+                user=user,
+                subscription=subscription,
+                tariff=tariff,
+                name=user.username,
+                phone_number='+79990000000',
+                email='user@example.com',
+            )
+            IsFavoriteSubscription.objects.create(
+                user=user, subscription=subscription
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertChangelistQueries(self, url, num_queries):
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), self.ROWS)
+
+    def test_subscription_changelist(self):
+        # Сессия и пользователь, два COUNT (второй - полное количество),
+        # сервисы и категории всех сервисов одним запросом.
+        self.assertChangelistQueries('/admin/subscriptions/subscription/', 6)
+
+    def test_tariff_changelist(self):
+        # Сессия и пользователь, сервисы для фильтра, два COUNT и тарифы
+        # вместе с сервисами.
+        self.assertChangelistQueries('/admin/subscriptions/tariff/', 6)
+
+    def test_order_changelist(self):
+        # Сессия и пользователь, COUNT и заказы вместе с пользователями,
+        # сервисами и тарифами.
+        self.assertChangelistQueries(
+            '/admin/subscriptions/subscriptionuserorder/', 4
+        )
+
+    def test_favorite_changelist(self):
+        # Сессия и пользователь, COUNT и избранное вместе с пользователями
+        # и сервисами.
+        self.assertChangelistQueries(
+            '/admin/subscriptions/isfavoritesubscription/', 4
+        )
+
+
+class PopularityTests(TestCase):
+    """Пересчет рейтинга сервисов по активности."""
+
+    def test_popular_rate_is_not_overwritten(self):
+        user = User.objects.create(username='user')
+        popular, other = (
+            Subscription.objects.create(
+                name=name,
+                title='Описание',
+                description='Описание',
+                logo='logo.png',
+                cashback=5,
+                popular_rate=popular_rate,
+            )
+            for name, popular_rate in (('Первый', 10), ('Второй', 70))
+        )
+        IsFavoriteSubscription.objects.create(user=user, subscription=popular)
+
+        self.assertEqual(recalculate_popularity(), 1)
+
+        popular.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(
+            (popular.popular_rate, popular.popularity_score),
+            (10, MAX_VALUE_POPULAR),
+        )
+        self.assertEqual((other.popular_rate, other.popularity_score), (70, 0))
+
+
+class CatalogImportTests(TestCase):
+    """Импорт каталога командой import_catalog и из админки."""
+
+    IMAGES = ('kino.png', 'kino-banner.png', 'music.png')
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.images = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.images)
+        for filename in self.IMAGES:
+            (self.images / filename).write_bytes(b'image')
+        self.records = [
+            self.record('Кино', 'kino.png', banners=['kino-banner.png']),
+            self.record('Музыка', 'music.png'),
+        ]
+
+    def record(self, name, logo, banners=(), discount=10):
+        return {
+            'name': name,
+            'title': 'Подписка',
+            'description': 'Описание',
+            'logo': logo,
+            'cashback': 5,
+            'popular_rate': 10,
+            'categories': [{'slug': 'media', 'name': 'Медиа'}],
+            'tariffs': [
+                {'period': 1, 'price': 300, 'discount': discount},
+                {'period': 12, 'price': 250, 'discount': 0},
+            ],
+            'banners': list(banners),
+        }
+
+    def write_catalog(self):
+        path = self.images / 'catalog.json'
+        path.write_text(json.dumps(self.records), encoding='utf-8')
+        return path
+
+    def import_command(self):
+        out = io.StringIO()
+        call_command(
+            'import_catalog',
+            str(self.write_catalog()),
+            images=str(self.images),
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def stored_files(self):
+        return [path for path in Path(self.media).rglob('*') if path.is_file()]
+
+    def test_command(self):
+        Subscription.objects.create(
+            name='Музыка',
+            title='Подписка',
+            description='Описание',
+            logo='logo.png',
+            cashback=5,
+            popular_rate=0,
+        )
+        self.records.append(self.record('Кино', 'kino.png'))
+
+        output = self.import_command()
+
+        self.assertIn('Создано сервисов: 1, тарифов: 2, баннеров: 1', output)
+        self.assertIn('Пропущено существующих и повторов: 2', output)
+        kino = Subscription.objects.get(name='Кино')
+        self.assertEqual(
+            list(kino.categories.values_list('slug', flat=True)), ['media']
+        )
+        self.assertEqual(
+            kino.tariffs.get(period=1).price_per_month,
+            kino.tariffs.get(period=1).calculate_price_per_month(),
+        )
+        self.assertEqual(BannersSubscription.objects.count(), 1)
+        self.assertEqual(len(self.stored_files()), 2)
+
+    def test_invalid_records_are_rejected_before_upload(self):
+        self.records[0]['popular_rate'] = MAX_VALUE_POPULAR + 1
+        self.records[1]['tariffs'][0].update(period=2, discount=150)
+
+        with self.assertRaises(CommandError) as context:
+            self.import_command()
+
+        message = str(context.exception)
+        self.assertIn('Кино: popular_rate', message)
+        self.assertIn('Музыка: период тарифа', message)
+        self.assertIn('Музыка: discount', message)
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_uploaded_images_are_deleted_on_error(self):
+        (self.images / 'music.png').unlink()
+
+        with self.assertRaises(CommandError):
+            self.import_command()
+
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_uploaded_images_are_deleted_on_rollback(self):
+        with mock.patch.object(
+            Tariff.objects, 'bulk_create', side_effect=RuntimeError('БД')
+        ):
+            with self.assertRaises(RuntimeError):
+                import_catalog(
+                    self.records,
+                    lambda filename: (self.images / filename).read_bytes(),
+                )
+
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def admin_import(self):
+        admin = User.objects.create_superuser(
+            username='admin', password='password'
+        )
+        self.client.force_login(admin)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as images:
+            for filename in self.IMAGES:
+                images.writestr(f'images/{filename}', b'image')
+        return self.client.post(
+            '/admin/subscriptions/subscription/import/',
+            {
+                'catalog': SimpleUploadedFile(
+                    'catalog.json', json.dumps(self.records).encode()
+                ),
+                'images': SimpleUploadedFile('images.zip', archive.getvalue()),
+            },
+            follow=True,
+        )
+
+    def test_admin_import(self):
+        response = self.admin_import()
+
+        self.assertRedirects(response, '/admin/subscriptions/subscription/')
+        self.assertIn(
+            'Создано сервисов: 2, тарифов: 4, баннеров: 1',
+            str(list(response.context['messages'])[0]),
+        )
+        self.assertEqual(Subscription.objects.count(), 2)
+        self.assertEqual(len(self.stored_files()), 3)
+
+    def test_admin_import_invalid_discount(self):
+        self.records[0]['tariffs'][0]['discount'] = 150
+
+        response = self.admin_import()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'Ошибка импорта каталога: Кино: discount',
+            str(response.context['form'].non_field_errors()),
+        )
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(self.stored_files(), [])